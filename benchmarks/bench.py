@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+'''
+Benchmark the parser hot paths against a set of databases.
+
+each benchmark prepares its state outside of the timed region, such as opening the database,
+ and then times the operation over a number of rounds.
+the state is prepared afresh for each round, so derived indexes are rebuilt, and the timings
+ reflect the first query against a newly opened database.
+
+results are written as JSON, so runs can be compared across releases::
+
+    $ python benchmarks/bench.py --output before.json
+    $ git checkout ...
+    $ python benchmarks/bench.py --output after.json --compare before.json
+
+by default, this uses the 32- and 64-bit ELF fixtures from the test suite.
+the setup only uses the APIs of earlier releases, like `idautils.Functions` and the `id0` cursors,
+ and newer fast paths, like `ID0.iterate` and `ID1.get_flags_range`, are used only where they exist,
+ so the same suite runs against older checkouts.
+to measure how the index scales, generate larger databases with `idb.synth`::
+
+    $ python -m idb.synth big.idb --records 10000000
+    $ python benchmarks/bench.py -b open -b 'id0 scan' -b supval big.idb
+'''
+import os
+import gc
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+
+import idb
+import idb.netnode
+import idb.analysis
+import idb.fileformat
+
+
+logger = logging.getLogger(__name__)
+
+
+CD = os.path.dirname(__file__)
+DEFAULT_IDBS = [
+    os.path.join(CD, '..', 'tests', 'data', 'elf', 'ls.idb'),
+    os.path.join(CD, '..', 'tests', 'data', 'elf', 'ls.i64'),
+]
+
+# the number of random queries made by the lookup benchmarks.
+SAMPLE_SIZE = 1000
+SEED = 0x1337
+
+
+def iter_id0(db, start=None, end=None):
+    '''
+    generate the entries of the id0 b-tree with keys in the range [start, end), in key order.
+    uses `ID0.iterate`, if available, otherwise walks a cursor, like releases without it.
+    '''
+    if hasattr(db.id0, 'iterate'):
+        for entry in db.id0.iterate(start=start, end=end):
+            yield entry
+        return
+
+    if start is None:
+        cursor = db.id0.get_min()
+    else:
+        try:
+            cursor = db.id0.find(start, strategy=idb.fileformat.ROUND_DOWN_MATCH)
+        except KeyError:
+            cursor = db.id0.get_min()
+        else:
+            if bytes(cursor.key) < start:
+                try:
+                    cursor.next()
+                except IndexError:
+                    return
+
+    while True:
+        if end is not None and bytes(cursor.key) >= end:
+            return
+        yield cursor.entry
+
+        try:
+            cursor.next()
+        except IndexError:
+            return
+
+
+def get_flags_range(db, start, end):
+    '''
+    fetch the flags for the range [start, end).
+    uses `ID1.get_flags_range`, if available, otherwise fetches each address.
+    '''
+    if hasattr(db.id1, 'get_flags_range'):
+        return db.id1.get_flags_range(start, end)
+    return [db.id1.get_flags(ea) for ea in range(start, end)]
+
+
+def get_code_heads(db):
+    api = idb.IDAPython(db)
+    eas = []
+    for fva in api.idautils.Functions():
+        try:
+            func = api.ida_funcs.get_func(fva)
+            flags = get_flags_range(db, func.startEA, func.endEA)
+        except (KeyError, IndexError):
+            continue
+        for i, f in enumerate(flags):
+            if api.ida_bytes.isCode(f):
+                eas.append(func.startEA + i)
+    return eas
+
+
+# each benchmark is a pair of functions:
+#   - setup(buf) -> state, which is not timed, and
+#   - run(state) -> number of items processed, which is timed.
+
+
+def setup_open(buf):
+    return buf
+
+
+def run_open(buf):
+    idb.from_buffer(buf)
+    return 1
+
+
+def setup_db(buf):
+    return idb.from_buffer(buf)
+
+
+def run_id0_scan(db):
+    n = 0
+    for _ in iter_id0(db):
+        n += 1
+    return n
+
+
+def setup_supval(buf):
+    db = idb.from_buffer(buf)
+    keys = []
+    for entry in iter_id0(db, start=b'.', end=b'/'):
+        key = bytes(entry.key)
+        if len(key) == 2 + 2 * db.wordsize and key[1 + db.wordsize:2 + db.wordsize] == b'S':
+            keys.append(idb.netnode.parse_key(key, wordsize=db.wordsize))
+
+    r = random.Random(SEED)
+    keys = [r.choice(keys) for _ in range(SAMPLE_SIZE)]
+    # open again, so that the b-tree page cache is cold.
+    return idb.from_buffer(buf), keys
+
+
+def run_supval(state):
+    db, keys = state
+    for key in keys:
+        idb.netnode.Netnode(db, key.nodeid).supval(key.index)
+    return len(keys)
+
+
+def run_functions(db):
+    return len(list(idb.analysis.Functions(db).functions.items()))
+
+
+def setup_get_func(buf):
+    db = idb.from_buffer(buf)
+    api = idb.IDAPython(db)
+    segs = [(start, api.idc.SegEnd(start)) for start in api.idautils.Segments()]
+    r = random.Random(SEED)
+    eas = []
+    for _ in range(SAMPLE_SIZE):
+        start, end = r.choice(segs)
+        eas.append(r.randrange(start, end))
+    return idb.from_buffer(buf), eas
+
+
+def run_get_func(state):
+    db, eas = state
+    api = idb.IDAPython(db)
+    for ea in eas:
+        try:
+            api.ida_funcs.get_func(ea)
+        except KeyError:
+            pass
+    return len(eas)
+
+
+def setup_get_many_bytes(buf):
+    db = idb.from_buffer(buf)
+    api = idb.IDAPython(db)
+    # the largest segment with flags.
+    segs = sorted(api.idautils.Segments(), key=lambda s: api.idc.SegEnd(s) - s, reverse=True)
+    for start in segs:
+        try:
+            db.id1.get_segment(start)
+        except KeyError:
+            continue
+        return api, start, api.idc.SegEnd(start) - start
+    raise ValueError('no segment with flags')
+
+
+def run_get_many_bytes(state):
+    api, start, size = state
+    api.idc.GetManyBytes(start, size)
+    return size
+
+
+def setup_flowcharts(buf):
+    db = idb.from_buffer(buf)
+    api = idb.IDAPython(db)
+    return api, list(api.idautils.Functions())
+
+
+def run_flowcharts(state):
+    api, fvas = state
+    n = 0
+    for fva in fvas:
+        try:
+            fc = api.idaapi.FlowChart(api.ida_funcs.get_func(fva))
+        except KeyError:
+            continue
+        n += len(list(fc))
+    return n
+
+
+def setup_disassembly(buf):
+    db = idb.from_buffer(buf)
+    eas = get_code_heads(db)
+    db = idb.from_buffer(buf)
+    return idb.IDAPython(db), eas
+
+
+def run_disassembly(state):
+    api, eas = state
+    for ea in eas:
+        try:
+            api.idc.GetDisasm(ea)
+        except KeyError:
+            # earlier releases fail to size the last instruction of a segment.
+            pass
+    return len(eas)
+
+
+BENCHMARKS = [
+    ('open', setup_open, run_open),
+    ('id0 scan', setup_db, run_id0_scan),
+    ('supval', setup_supval, run_supval),
+    ('functions', setup_db, run_functions),
+    ('get_func', setup_get_func, run_get_func),
+    ('GetManyBytes', setup_get_many_bytes, run_get_many_bytes),
+    ('FlowChart', setup_flowcharts, run_flowcharts),
+    ('disassembly', setup_disassembly, run_disassembly),
+]
+
+
+def run_benchmark(buf, setup, run, rounds):
+    '''
+    Returns:
+      Tuple[List[float], int]: the duration of each round, in seconds, and the items processed per round.
+    '''
+    durations = []
+    items = 0
+    for _ in range(rounds):
+        state = setup(buf)
+        gc.collect()
+        ta = time.time()
+        items = run(state)
+        tb = time.time()
+        durations.append(tb - ta)
+    return durations, items
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    return {
+        'min': durations[0],
+        'max': durations[-1],
+        'mean': sum(durations) / len(durations),
+        'median': durations[len(durations) // 2],
+    }
+
+
+def compare(results, baseline, threshold):
+    '''
+    log the change in median duration of each benchmark against the baseline.
+
+    Returns:
+      int: the number of benchmarks that regressed by more than the threshold.
+    '''
+    previous = {(r['database'], r['name']): r for r in baseline['results']}
+    regressions = 0
+    for result in results['results']:
+        prev = previous.get((result['database'], result['name']))
+        if prev is None:
+            continue
+
+        ratio = result['median'] / max(prev['median'], 1e-9)
+        marker = ''
+        if ratio > 1 + threshold:
+            marker = '  REGRESSION'
+            regressions += 1
+        logger.info('%-16s %-14s %8.4fs -> %8.4fs (%.2fx)%s',
+                    result['database'], result['name'], prev['median'], result['median'], ratio, marker)
+    return regressions
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Benchmark the parser hot paths.")
+    parser.add_argument("idbpaths", type=str, nargs="*",
+                        help="Paths to input idb files, default: the 32- and 64-bit test fixtures")
+    parser.add_argument("-b", "--benchmark", type=str, action="append",
+                        help="Run only the benchmark with this name, may be repeated")
+    parser.add_argument("-r", "--rounds", type=int, default=3,
+                        help="Number of rounds per benchmark")
+    parser.add_argument("-o", "--output", type=str,
+                        help="Path to which to write the JSON results")
+    parser.add_argument("--compare", type=str,
+                        help="Path to JSON results from a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Fraction by which a benchmark may slow before it's reported as a regression")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable debug logging")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Disable all output but errors")
+    args = parser.parse_args(args=argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+        logging.getLogger().setLevel(logging.DEBUG)
+    elif args.quiet:
+        logging.basicConfig(level=logging.ERROR)
+        logging.getLogger().setLevel(logging.ERROR)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        logging.getLogger().setLevel(logging.INFO)
+        logging.getLogger('idb.netnode').setLevel(logging.ERROR)
+        logging.getLogger('idb.fileformat').setLevel(logging.ERROR)
+
+    benchmarks = BENCHMARKS
+    if args.benchmark:
+        benchmarks = [b for b in BENCHMARKS if b[0] in args.benchmark]
+        if not benchmarks:
+            logger.error('no benchmarks match: %s', ', '.join(args.benchmark))
+            return -1
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'rounds': args.rounds,
+        'results': [],
+    }
+
+    for path in args.idbpaths or DEFAULT_IDBS:
+        database = os.path.basename(path)
+        with open(path, 'rb') as f:
+            buf = f.read()
+
+        for name, setup, run in benchmarks:
+            try:
+                durations, items = run_benchmark(buf, setup, run, args.rounds)
+            except Exception as e:
+                logger.warning('%s %s: failed: %s', database, name, e)
+                continue
+
+            result = {
+                'database': database,
+                'name': name,
+                'items': items,
+                'durations': durations,
+            }
+            result.update(summarize(durations))
+            results['results'].append(result)
+
+            logger.info('%-16s %-14s median: %8.4fs  items: %8d  (%.0f/s)',
+                        database, name, result['median'], items, items / max(result['median'], 1e-9))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
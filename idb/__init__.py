@@ -20,22 +20,51 @@ else:
 
 
 @contextlib.contextmanager
-def from_file(path):
+def from_file(path, stats=False, threadsafe=False):
+    '''
+    open the database at the given path.
+
+    by default, a database should be queried from one thread at a time.
+    in thread-safe mode, many threads may query the same opened database at once,
+     sharing its decoded pages and derived indexes, rather than opening it once per thread:
+
+      - b-tree pages are decoded under striped locks, and are immutable once cached,
+      - derived indexes, like the function table, are built once, under a lock,
+      - each thread uses its own disassemblers, and the instruction caches are locked, and
+      - cursors, from `db.id0.find()` and friends, belong to the thread that created them.
+
+    the database is read-only, so no other locking is needed.
+
+    Example::
+
+        with idb.from_file('ls.idb', threadsafe=True) as db:
+            pool = multiprocessing.pool.ThreadPool(8)
+            names = pool.map(lambda fva: idb.IDAPython(db).idc.GetFunctionName(fva), fvas)
+
+    Args:
+      path (str): the path to the database.
+      stats (bool): collect counters and timings of the parser operations. see `idb.stats`.
+      threadsafe (bool): support queries from many threads at once.
+    '''
     # break import cycle
     import idb.fileformat
 
     with open(path, 'rb') as f:
         buf = memview(f.read())
-        db = idb.fileformat.IDB(buf)
+        db = idb.fileformat.IDB(buf, stats=stats, threadsafe=threadsafe)
         db.vsParse(buf)
+        db.path = path
         yield db
 
 
-def from_buffer(buf):
+def from_buffer(buf, stats=False, threadsafe=False):
+    '''
+    open the database with the given contents. see `from_file` for the options.
+    '''
     # break import cycle
     import idb.fileformat
 
     buf = memview(buf)
-    db = idb.fileformat.IDB(buf)
+    db = idb.fileformat.IDB(buf, stats=stats, threadsafe=threadsafe)
     db.vsParse(buf)
     return db
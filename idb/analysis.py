@@ -1,4 +1,6 @@
 import types
+import array
+import bisect
 import struct
 import logging
 import binascii
@@ -6,6 +8,16 @@ import datetime
 import itertools
 from collections import namedtuple
 
+try:
+    from collections.abc import Mapping
+    from collections.abc import ItemsView
+    from collections.abc import ValuesView
+except ImportError:
+    # py2.7
+    from collections import Mapping
+    from collections import ItemsView
+    from collections import ValuesView
+
 import six
 import vstruct
 from vstruct.primitives import v_str
@@ -16,6 +28,7 @@ from vstruct.primitives import v_uint32
 from vstruct.primitives import v_uint64
 
 import idb
+import idb.stats
 import idb.netnode
 
 
@@ -84,6 +97,59 @@ def as_cast(V):
     return inner
 
 
+if six.PY2:
+    def _as_indexable(buf):
+        '''
+        fetch a view of the given buffer that indexes to integers, copying only if necessary.
+        on py2, only a bytearray does this.
+        '''
+        if isinstance(buf, bytearray):
+            return buf
+        return bytearray(buf)
+else:
+    def _as_indexable(buf):
+        '''
+        fetch a view of the given buffer that indexes to integers, copying only if necessary.
+        on py3, bytes, bytearrays, and memoryviews all do this.
+        '''
+        return buf
+
+
+def _unpack_dd(buf, offset):
+    # buf must index to integers, see `_as_indexable`.
+    header = buf[offset]
+    if header & 0x80 == 0:
+        return header, 1
+    elif header & 0xC0 != 0xC0:
+        return ((header & 0x7F) << 8) + buf[offset + 1], 2
+    elif header & 0xE0 == 0xE0:
+        hi = (buf[offset + 1] << 8) + buf[offset + 2]
+        low = (buf[offset + 3] << 8) + buf[offset + 4]
+        return (hi << 16) + low, 5
+    else:
+        hi = ((header & 0x3F) << 8) + buf[offset + 1]
+        low = (buf[offset + 2] << 8) + buf[offset + 3]
+        return (hi << 16) + low, 4
+
+
+def _unpack_dw(buf, offset):
+    # buf must index to integers, see `_as_indexable`.
+    header = buf[offset]
+    if header & 0x80 == 0:
+        return header, 1
+    elif header & 0xC0 != 0xC0:
+        return ((header << 8) + buf[offset + 1]) & 0x7FFF, 2
+    else:
+        return (buf[offset + 1] << 8) + buf[offset + 2], 3
+
+
+def _unpack_dq(buf, offset):
+    # buf must index to integers, see `_as_indexable`.
+    dw1, d1 = _unpack_dd(buf, offset)
+    dw2, d2 = _unpack_dd(buf, offset + d1)
+    return (dw2 << 32) + dw1, d1 + d2
+
+
 def unpack_dd(buf, offset=0):
     '''
     unpack up to 32-bits using the IDA-specific data packing format.
@@ -96,105 +162,181 @@ def unpack_dd(buf, offset=0):
       (int, int): the parsed dword, and the number of bytes consumed.
 
     Raises:
-      KeyError: if the bounds of the region are exceeded.
+      IndexError: if the bounds of the region are exceeded.
     '''
-    if offset != 0:
-        # this isn't particularly fast... but its more readable.
-        buf = buf[offset:]
-
-    header = six.indexbytes(buf, 0x0)
-    if header & 0x80 == 0:
-        return header, 1
-    elif header & 0xC0 != 0xC0:
-        return ((header & 0x7F) << 8) + six.indexbytes(buf, 0x1), 2
-    else:
-        if header & 0xE0 == 0xE0:
-            hi = (six.indexbytes(buf, 0x1) << 8) + six.indexbytes(buf, 0x2)
-            low = (six.indexbytes(buf, 0x3) << 8) + six.indexbytes(buf, 0x4)
-            size = 5
-        else:
-            hi = (((header & 0x3F) << 8) + six.indexbytes(buf, 0x1))
-            low = (six.indexbytes(buf, 0x2) << 8) + six.indexbytes(buf, 0x3)
-            size = 4
-        return (hi << 16) + low, size
+    return _unpack_dd(_as_indexable(buf), offset)
 
 
 def unpack_dw(buf, offset=0):
     '''
     unpack word.
     '''
-    if offset != 0:
-        buf = buf[offset:]
-
-    header = six.indexbytes(buf, 0x0)
-    if header & 0x80 == 0:
-        return header, 1
-    elif header & 0xC0 != 0xC0:
-        return ((header << 8) + six.indexbytes(buf, 0x1)) & 0x7FFF, 2
-    else:
-        return (six.indexbytes(buf, 0x1) << 8) + six.indexbytes(buf, 0x2), 3
+    return _unpack_dw(_as_indexable(buf), offset)
 
 
 def unpack_dq(buf, offset=0):
     '''
     unpack qword.
     '''
-    if offset != 0:
-        buf = buf[offset:]
+    return _unpack_dq(_as_indexable(buf), offset)
 
-    dw1, d1 = unpack_dd(buf)
-    dw2, d2 = unpack_dd(buf, offset=d1)
-    return (dw2 << 32) + dw1, d1 + d2
+
+def _decode(buf, unpack_fn, values):
+    buf = _as_indexable(buf)
+    offset = 0
+    end = len(buf)
+    while offset < end:
+        val, size = unpack_fn(buf, offset)
+        values.append(val)
+        offset += size
+    return values
+
+
+# the typecode of the smallest array item that holds a 32-bit word.
+# `L` is 64 bits on most 64-bit platforms, other than Windows.
+DWORD_TYPECODE = 'I' if array.array('I').itemsize >= 4 else 'L'
+
+
+def _make_word_array(wordsize):
+    '''
+    create an empty, compact array for words of the given size, like addresses.
+    py2 arrays don't support 64-bit integers, so there this falls back to a list.
+    '''
+    if wordsize == 4:
+        return array.array(DWORD_TYPECODE)
+    elif wordsize == 8:
+        if six.PY2:
+            return []
+        return array.array('Q')
+    else:
+        raise RuntimeError('unexpected wordsize')
+
+
+def decode_dds(buf):
+    '''
+    decode an entire stream of packed dwords in one call.
+
+    Args:
+      buf (bytes): the region to parse.
+
+    Returns:
+      array.array: the unpacked dwords.
+
+    Raises:
+      IndexError: if the final value is truncated.
+    '''
+    return _decode(buf, _unpack_dd, _make_word_array(4))
+
+
+def decode_dqs(buf):
+    '''
+    decode an entire stream of packed qwords in one call.
+
+    Args:
+      buf (bytes): the region to parse.
+
+    Returns:
+      Union[array.array, List[int]]: the unpacked qwords.
+        py2 arrays don't support 64-bit integers, so there this is a list.
+
+    Raises:
+      IndexError: if the final value is truncated.
+    '''
+    return _decode(buf, _unpack_dq, _make_word_array(8))
+
+
+def decode_words(buf, wordsize):
+    '''
+    decode an entire stream of packed words of the given size, like addresses.
+    '''
+    if wordsize == 4:
+        return decode_dds(buf)
+    elif wordsize == 8:
+        return decode_dqs(buf)
+    else:
+        raise RuntimeError('unexpected wordsize')
 
 
 def unpack_dds(buf):
-    offset = 0
-    while offset < len(buf):
-        val, size = unpack_dd(buf, offset=offset)
+    for val in decode_dds(buf):
         yield val
-        offset += size
 
 
 def unpack_dqs(buf):
-    offset = 0
-    while offset < len(buf):
-        val, size = unpack_dq(buf, offset=offset)
+    for val in decode_dqs(buf):
         yield val
-        offset += size
 
 
 class Unpacker:
     def __init__(self, buf, wordsize, offset=0, should_log=False):
         self.offset = offset
         self.wordsize = wordsize
-        self.buf = buf
+        self.buf = _as_indexable(buf)
         self.should_log = should_log
 
     def _do_unpack(self, unpack_fn):
-        v, delta = unpack_fn(self.buf, offset=self.offset)
+        v, delta = unpack_fn(self.buf, self.offset)
         if self.should_log:
             logger.debug('%s at %x: %x', unpack_fn.__name__, self.offset, v)
         self.offset += delta
         return v
 
     def dd(self):
-        return self._do_unpack(unpack_dd)
+        return self._do_unpack(_unpack_dd)
 
     def dq(self):
-        return self._do_unpack(unpack_dq)
+        return self._do_unpack(_unpack_dq)
 
     def dw(self):
-        return self._do_unpack(unpack_dw)
+        return self._do_unpack(_unpack_dw)
 
     def addr(self):
         if self.wordsize == 4:
-            return self._do_unpack(unpack_dd)
+            return self._do_unpack(_unpack_dd)
         elif self.wordsize == 8:
-            return self._do_unpack(unpack_dq)
+            return self._do_unpack(_unpack_dq)
         else:
             raise RuntimeError('unexpected wordsize')
 
 
+def get_cached(db, key, factory):
+    '''
+    fetch a derived index over the given database, building it on first use.
+    the database is read-only, so the index remains valid for the lifetime of the database.
+
+    Args:
+      db (idb.IDB): the database.
+      key (str): the name of the index.
+      factory (Callable[[idb.IDB], any]): builds the index from the database.
+
+    Returns:
+      any: the index.
+
+    Example::
+
+        funcs = get_cached(db, 'function table', FunctionTable)
+    '''
+    if db._cache_lock is not None and key not in db.caches:
+        # built indexes are never replaced, so only the construction is locked.
+        with db._cache_lock:
+            return _get_cached(db, key, factory)
+    return _get_cached(db, key, factory)
+
+
+def _get_cached(db, key, factory):
+    try:
+        v = db.caches[key]
+    except KeyError:
+        if db._stats is not None:
+            db._stats.incr('caches.misses')
+        v = factory(db)
+        db.caches[key] = v
+    else:
+        if db._stats is not None:
+            db._stats.incr('caches.hits')
+    return v
+
+
 Field = namedtuple('Field', ['name', 'tag', 'index', 'cast', 'minver'])
 # namedtuple default args.
 # via: https://stackoverflow.com/a/18348004/87207
@@ -217,6 +359,100 @@ NODES = IndexType('nodes')
 VARIABLE_INDEXES = (ALL, ADDRESSES, NUMBERS, NODES)
 
 
+class _FieldItemsView(ItemsView):
+    def __iter__(self):
+        # a single range scan, rather than a point lookup per key.
+        for entry in self._mapping._get_entries():
+            yield entry.parsed_key.index, self._mapping._cast(entry.value)
+
+
+class _FieldValuesView(ValuesView):
+    def __iter__(self):
+        for entry in self._mapping._get_entries():
+            yield self._mapping._cast(entry.value)
+
+
+# the number of entries to classify at once when scanning a field with variable indices.
+FIELD_BATCH_SIZE = 0x400
+
+
+class FieldMapping(Mapping):
+    '''
+    a lazy, read-only mapping from index to value for a field with variable indices.
+
+    lookups are point queries against the B-tree,
+     iteration is an ordered range scan over the field's tag,
+     and values are parsed only when they are accessed.
+
+    Example::
+
+        funcs = Functions(db).functions
+        assert 0x401000 in funcs
+        assert funcs[0x401000].startEA == 0x401000
+    '''
+
+    def __init__(self, analysis, field):
+        self.analysis = analysis
+        self.field = field
+
+    def _cast(self, buf):
+        if self.field.cast is None:
+            return bytes(buf)
+        else:
+            return self.field.cast(bytes(buf), wordsize=self.analysis.idb.wordsize)
+
+    def _get_entries(self):
+        entries = self.analysis.netnode.supentries(tag=self.field.tag)
+        # classify the indices of the scan in batches,
+        #  rather than one segment lookup per entry.
+        for batch in chunks(entries, FIELD_BATCH_SIZE):
+            indexes = [entry.parsed_key.index for entry in batch]
+            mask = self.analysis._classify_indexes(self.field.index, indexes)
+            for entry, matches in zip(batch, mask):
+                if matches:
+                    yield entry
+
+    def _get_raw(self, index):
+        if not isinstance(index, six.integer_types):
+            raise KeyError(index)
+
+        if not self.analysis._classify_indexes(self.field.index, [index])[0]:
+            raise KeyError(index)
+
+        return self.analysis.netnode.supval(index, tag=self.field.tag)
+
+    def __getitem__(self, index):
+        stats = self.analysis.idb._stats
+        if stats is None:
+            return self._cast(self._get_raw(index))
+
+        with idb.stats.timer(stats, self.analysis._get_timer_name(self.field)):
+            return self._cast(self._get_raw(index))
+
+    def __contains__(self, index):
+        try:
+            self._get_raw(index)
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        for entry in self._get_entries():
+            yield entry.parsed_key.index
+
+    def __len__(self):
+        return sum(1 for _ in self._get_entries())
+
+    def items(self):
+        return _FieldItemsView(self)
+
+    def values(self):
+        return _FieldValuesView(self)
+
+    def __repr__(self):
+        return 'FieldMapping(%s)' % (self.field.name)
+
+
 class _Analysis(object):
     '''
     this is basically a metaclass for analyzers of IDA Pro netnode namespaces (named nodeid).
@@ -243,11 +479,7 @@ class _Analysis(object):
         '''
         does the given index fall within a segment?
         '''
-        try:
-            self.idb.id1.get_segment(index)
-            return True
-        except KeyError:
-            return False
+        return self.idb.id1.contains_address(index)
 
     def _is_node(self, index):
         '''
@@ -266,10 +498,46 @@ class _Analysis(object):
         '''
         return (not self._is_address(index)) and (not self._is_node(index))
 
+    def _classify_indexes(self, index_type, indexes):
+        '''
+        decide which of the given indices match the given index type, in one batch.
+
+        Args:
+          index_type (int): one of the variable index types, like `ADDRESSES`.
+          indexes (List[int]): the indices to classify, ideally in sorted order.
+
+        Returns:
+          List[bool]: for each index, True if it matches the index type.
+
+        Raises:
+          ValueError: if the index type is not a variable index type.
+        '''
+        if index_type == ALL:
+            return [True] * len(indexes)
+
+        if self.idb.wordsize == 4:
+            nodebase = 0xFF000000
+        elif self.idb.wordsize == 8:
+            nodebase = 0xFF00000000000000
+        else:
+            raise RuntimeError('unexpected wordsize')
+
+        if index_type == NODES:
+            return [index & nodebase == nodebase for index in indexes]
+
+        are_addresses = self.idb.id1.classify_addresses(indexes)
+        if index_type == ADDRESSES:
+            return are_addresses
+        elif index_type == NUMBERS:
+            return [(not is_address) and (index & nodebase != nodebase)
+                    for index, is_address in zip(indexes, are_addresses)]
+        else:
+            raise ValueError('unexpected index')
+
     def __getattr__(self, key):
         '''
         for the given field name, fetch the value from the appropriate netnode.
-        if the field matches multiple indices, then return a mapping from index to value.
+        if the field matches multiple indices, then return a lazy mapping from index to value.
 
         Example::
 
@@ -289,7 +557,8 @@ class _Analysis(object):
         Returns:
           any: if a parser was provided, then the parsed data.
             otherwise, the bytes associatd with the field.
-            if the field matches multiple indices, then the result is mapping from index to value.
+            if the field matches multiple indices, then the result is a read-only `FieldMapping`
+             from index to value. values are parsed on access.
 
         Raises:
           KeyError: if the field does not exist.
@@ -299,38 +568,29 @@ class _Analysis(object):
 
         field = self._fields_by_name[key]
         if field.index in VARIABLE_INDEXES:
+            return FieldMapping(self, field)
 
-            if field.index == ADDRESSES:
-                nfilter = self._is_address
-            elif field.index == NUMBERS:
-                nfilter = self._is_number
-            elif field.index == NODES:
-                nfilter = self._is_node
-            elif field.index == ALL:
-                nfilter = lambda x: True
-            else:
-                raise ValueError('unexpected index')
-
-            # indexes are variable, so map them to the values
-            ret = {}
-            for sup in self.netnode.supentries(tag=field.tag):
-                if not nfilter(sup.parsed_key.index):
-                    continue
-
-                if field.cast is None:
-                    ret[sup.parsed_key.index] = bytes(sup.value)
-                else:
-                    v = field.cast(bytes(sup.value), wordsize=self.idb.wordsize)
-                    ret[sup.parsed_key.index] = v
-            return ret
+        stats = self.idb._stats
+        if stats is None:
+            return self._get_value(field)
+
+        with idb.stats.timer(stats, self._get_timer_name(field)):
+            return self._get_value(field)
+
+    def _get_value(self, field):
+        # normal field with an explicit index
+        v = self.netnode.supval(field.index, tag=field.tag)
+        if field.cast is None:
+            return bytes(v)
         else:
-            # normal field with an explicit index
-            v = self.netnode.supval(field.index, tag=field.tag)
-            if field.cast is None:
-                return bytes(v)
-            else:
-                return field.cast(bytes(v),
-                                  wordsize=self.idb.wordsize)
+            return field.cast(bytes(v),
+                              wordsize=self.idb.wordsize)
+
+    def _get_timer_name(self, field):
+        if isinstance(self.nodeid, six.string_types):
+            return 'analysis.%s.%s' % (self.nodeid, field.name)
+        else:
+            return 'analysis.%x.%s' % (self.nodeid, field.name)
 
     def get_field_tag(self, name):
         '''
@@ -543,9 +803,10 @@ class FileRegion(vstruct.VStruct):
         self.rva = v_uint32()
 
 
-class FileRegionV70:
+class FileRegionV70(object):
+    __slots__ = ('start', 'end', 'rva')
+
     def __init__(self, buf, wordsize):
-        self.buf = buf
         u = Unpacker(buf, wordsize=wordsize)
         self.start = u.addr()
         self.end = self.start + u.addr()
@@ -567,11 +828,16 @@ FileRegions = Analysis('$ fileregions', [
 ])
 
 
-class func_t:
+class func_t(object):
     FUNC_TAIL = 0x00008000
 
+    # records are not retained with their source buffer, nor a per-instance dict,
+    #  since there may be very many of them.
+    __slots__ = ('startEA', 'endEA', 'flags',
+                 'frame', 'frsize', 'frregs', 'argsize',
+                 'owner', 'refqty')
+
     def __init__(self, buf, wordsize):
-        self.buf = buf
         u = Unpacker(buf, wordsize=wordsize)
 
         self.startEA = u.addr()
@@ -599,7 +865,8 @@ class func_t:
                 pass
         else:
             try:
-                self.owner = self.startEA - u.addr()
+                # the delta wraps around when the owner follows the tail.
+                self.owner = (self.startEA - u.addr()) & ((1 << (8 * wordsize)) - 1)
                 self.refqty = u.dd()
             except IndexError:
                 # see warning note above
@@ -617,6 +884,81 @@ Functions = Analysis('$ funcs', [
 ])
 
 
+class FunctionTable(object):
+    '''
+    a compact, columnar table of the functions and function tails in a database,
+     ordered by start address.
+
+    each column is an array with one entry per function,
+     so the table costs a few words per function rather than a record object per function.
+
+    Example::
+
+        funcs = FunctionTable(db)
+        i = funcs.index(0x401000)
+        assert funcs.ends[i] == 0x401020
+    '''
+    __slots__ = ('starts', 'ends', 'flags', 'owners')
+
+    def __init__(self, db):
+        self.starts = _make_word_array(db.wordsize)
+        self.ends = _make_word_array(db.wordsize)
+        self.flags = array.array('H')
+        # for a function tail, the start address of the function that owns it.
+        # for a function, its own start address.
+        self.owners = _make_word_array(db.wordsize)
+
+        # the scan is ordered by address, so the columns are sorted by start address.
+        for func in Functions(db).functions.values():
+            self.starts.append(func.startEA)
+            self.ends.append(func.endEA)
+            self.flags.append(func.flags)
+            if func.owner is None:
+                self.owners.append(func.startEA)
+            else:
+                self.owners.append(func.owner)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def index(self, ea):
+        '''
+        find the row of the function or function tail that starts at the given address.
+
+        Returns:
+          int: the row index.
+
+        Raises:
+          KeyError: if no function starts at the given address.
+        '''
+        i = bisect.bisect_left(self.starts, ea)
+        if i == len(self.starts) or self.starts[i] != ea:
+            raise KeyError(ea)
+        return i
+
+    def find(self, ea):
+        '''
+        find the row of the function or function tail that contains the given address.
+        this is a binary search, since functions and tails do not overlap.
+
+        Returns:
+          int: the row index.
+
+        Raises:
+          KeyError: if no function or function tail contains the given address.
+        '''
+        i = bisect.bisect_right(self.starts, ea) - 1
+        if i < 0 or ea >= self.ends[i]:
+            raise KeyError(ea)
+        return i
+
+    def is_tail(self, i):
+        '''
+        is the function at the given row a function tail?
+        '''
+        return is_flag_set(self.flags[i], func_t.FUNC_TAIL)
+
+
 class PString(vstruct.VStruct):
     '''
     short pascal string, prefixed with single byte length.
@@ -873,19 +1215,16 @@ class Function:
         last_ea = 0
         last_length = 0
 
-        if self.idb.wordsize == 4:
-            unpacker = unpack_dds
-        elif self.idb.wordsize == 8:
-            unpacker = unpack_dqs
-        else:
-            raise RuntimeError('unexpected wordsize')
-
-        for delta, length in pairs(unpacker(v)):
+        values = decode_words(v, self.idb.wordsize)
+        for delta, length in zip(values[0::2], values[1::2]):
             ea = last_ea + last_length + delta
             yield Chunk(ea, length)
             last_ea = ea
             last_length = length
 
+        if len(values) % 2 != 0:
+            raise ValueError('unexpected trailing chunk value')
+
     # S-0x1000: sp change points
     # S-0x4000: register variables
     # S-0x5000: local labels
@@ -896,14 +1235,8 @@ class Function:
         v = self.netnode.supval(tag='S', index=0x1000)
         offset = self.nodeid
 
-        if self.idb.wordsize == 4:
-            unpacker = unpack_dds
-        elif self.idb.wordsize == 8:
-            unpacker = unpack_dqs
-        else:
-            raise RuntimeError('unexpected wordsize')
-
-        for (delta, change) in pairs(unpacker(v)):
+        values = decode_words(v, self.idb.wordsize)
+        for delta, change in zip(values[0::2], values[1::2]):
             offset += delta
             if change & 1:
                 change = change >> 1
@@ -912,19 +1245,37 @@ class Function:
 
             yield StackChangePoint(offset, change)
 
+        if len(values) % 2 != 0:
+            raise ValueError('unexpected trailing stack change point value')
+
 
 Xref = namedtuple('Xref', ['src', 'dst', 'type'])
 
 
 def _get_xrefs(db, tag, src=None, dst=None, types=None):
-    if not src and not dst:
+    # note: zero is a valid address.
+    if src is None and dst is None:
         raise ValueError('one of src or dst must be provided')
 
-    nn = idb.netnode.Netnode(db, src or dst)
+    ea = src if src is not None else dst
+
+    index = db.caches.get('xref index')
+    if index is not None:
+        # the xref index has been enabled, see `enable_xref_index`.
+        neighbors, xtypes = index.get_adjacency(tag).get(ea)
+        for neighbor, xtype in zip(neighbors, xtypes):
+            if (types and xtype in types) or (not types):
+                if src is not None:
+                    yield Xref(src, neighbor, xtype)
+                else:  # have dst
+                    yield Xref(neighbor, dst, xtype)
+        return
+
+    nn = idb.netnode.Netnode(db, ea)
     try:
         for entry in nn.charentries(tag=tag):
             if (types and entry.value in types) or (not types):
-                if src:
+                if src is not None:
                     yield Xref(src, entry.parsed_key.index, entry.value)
                 else:  # have dst
                     yield Xref(entry.parsed_key.index, dst, entry.value)
@@ -992,6 +1343,274 @@ def get_drefs_from(db, ea, types=None):
     return _get_xrefs(db, src=ea, tag='d', types=types)
 
 
+class XrefEdges(object):
+    '''
+    a compact, columnar list of cross-references, as parallel arrays of source, destination, and type.
+
+    Example::
+
+        edges = get_all_xrefs(db).code
+        for xref in edges:
+            print('%x -> %x' % (xref.src, xref.dst))
+    '''
+    __slots__ = ('srcs', 'dsts', 'types')
+
+    def __init__(self, wordsize):
+        self.srcs = _make_word_array(wordsize)
+        self.dsts = _make_word_array(wordsize)
+        self.types = array.array('l')
+
+    def __len__(self):
+        return len(self.srcs)
+
+    def __iter__(self):
+        for src, dst, type in zip(self.srcs, self.dsts, self.types):
+            yield Xref(src, dst, type)
+
+    def append(self, src, dst, type):
+        self.srcs.append(src)
+        self.dsts.append(dst)
+        self.types.append(type)
+
+
+AllXrefs = namedtuple('AllXrefs', ['code', 'data'])
+
+
+def _scan_xrefs(db, start, end, edges_by_tag):
+    '''
+    collect the cross-reference records of the netnodes in the range [start, end) with one ordered scan.
+
+    Args:
+      db (idb.IDB): the database.
+      start (int): the least netnode address to include. default: 0.
+      end (int): the netnode address at which to stop, exclusive.
+        default: continue through all the netnodes, including those that aren't addresses.
+      edges_by_tag (Dict[str, XrefEdges]): where to add the records of each of the tags `x`, `X`, `d`, and `D`.
+        for the "to" tags (`X` and `D`), the netnode is the destination of the reference.
+    '''
+    wordsize = db.wordsize
+    if wordsize == 4:
+        wordformat = 'I'
+    elif wordsize == 8:
+        wordformat = 'Q'
+    else:
+        raise RuntimeError('unexpected wordsize')
+
+    if start is None:
+        start = 0
+
+    keyformat = '>' + wordformat + 'x' + wordformat
+    keylength = 1 + wordsize + 1 + wordsize
+    tag_offset = 1 + wordsize
+    edges_by_tag = {ord(tag): (edges, tag in 'XD') for tag, edges in edges_by_tag.items()}
+
+    start_key = b'.' + struct.pack('>' + wordformat, start)
+    if end is None:
+        # the least key greater than all the netnode keys.
+        end_key = b'/'
+    else:
+        end_key = b'.' + struct.pack('>' + wordformat, end)
+    for entry in db.id0.iterate(start_key, end_key):
+        key = bytes(entry.key)
+        if len(key) != keylength:
+            continue
+
+        try:
+            edges, is_to = edges_by_tag[six.indexbytes(key, tag_offset)]
+        except KeyError:
+            continue
+
+        value = entry.value
+        if len(value) != 1:
+            # the xref type is a single byte.
+            # some netnodes that aren't addresses use these tags for other data.
+            continue
+
+        ea, other = struct.unpack_from(keyformat, key, 1)
+        if is_to:
+            edges.append(other, ea, idb.netnode.as_int(value))
+        else:
+            edges.append(ea, other, idb.netnode.as_int(value))
+
+
+def get_all_xrefs(db, start=None, end=None):
+    '''
+    extract the code and data cross-references from the addresses in the range [start, end).
+    this does one ordered scan over the B-tree, rather than a search per address,
+     so its the way to fetch all the edges of a call graph or reachability analysis.
+
+    only the "from" records (tags `x` and `d`) are read,
+     since IDA records each reference both from its source and to its destination.
+
+    Args:
+      db (idb.IDB): the database.
+      start (int): the least source address to include. default: 0.
+      end (int): the source address at which to stop, exclusive.
+        default: continue through all the netnodes, including those that aren't addresses.
+
+    Returns:
+      AllXrefs: the `code` and `data` references, as `XrefEdges` ordered by source address.
+    '''
+    code = XrefEdges(db.wordsize)
+    data = XrefEdges(db.wordsize)
+    _scan_xrefs(db, start, end, {'x': code, 'd': data})
+    return AllXrefs(code, data)
+
+
+RangeCrefs = namedtuple('RangeCrefs', ['outgoing', 'incoming'])
+
+
+def get_range_crefs(db, start, end):
+    '''
+    extract the code references from, and to, the addresses in the range [start, end),
+     with one ordered scan over the B-tree.
+    the sources of the incoming references may lie anywhere.
+
+    Example::
+
+        crefs = get_range_crefs(db, func.startEA, func.endEA)
+        for xref in crefs.incoming:
+            print('%x -> %x' % (xref.src, xref.dst))
+
+    Returns:
+      RangeCrefs: the `outgoing` references, as `XrefEdges` ordered by source address,
+        and the `incoming` references, ordered by destination address.
+    '''
+    outgoing = XrefEdges(db.wordsize)
+    incoming = XrefEdges(db.wordsize)
+    _scan_xrefs(db, start, end, {'x': outgoing, 'X': incoming})
+    return RangeCrefs(outgoing, incoming)
+
+
+class XrefAdjacency(object):
+    '''
+    a compressed sparse row (CSR) adjacency of cross-references.
+
+    the sorted addresses that have references are in `keys`,
+     and the neighbors and types of the references of `keys[i]` are the contiguous runs
+     `neighbors[offsets[i]:offsets[i + 1]]` and `types[offsets[i]:offsets[i + 1]]`.
+    so, a neighbor query is a binary search and a couple of array slices.
+    '''
+    __slots__ = ('keys', 'offsets', 'neighbors', 'types')
+
+    def __init__(self, wordsize, keys, neighbors, types):
+        '''
+        Args:
+          wordsize (int): the size of an address.
+          keys (Sequence[int]): the address for each reference, in sorted order.
+          neighbors (Sequence[int]): the other end of each reference.
+          types (Sequence[int]): the type of each reference.
+        '''
+        self.keys = _make_word_array(wordsize)
+        self.offsets = array.array('L')
+        self.neighbors = _make_word_array(wordsize)
+        self.neighbors.extend(neighbors)
+        self.types = array.array('l', types)
+
+        last = None
+        for i, key in enumerate(keys):
+            if key != last:
+                self.keys.append(key)
+                self.offsets.append(i)
+                last = key
+        self.offsets.append(len(self.neighbors))
+
+    def __len__(self):
+        return len(self.neighbors)
+
+    def get(self, ea):
+        '''
+        fetch the references of the given address.
+
+        Returns:
+          Tuple[Sequence[int], Sequence[int]]: the neighbors and types of the references.
+            these are empty if the address has no references.
+        '''
+        i = bisect.bisect_left(self.keys, ea)
+        if i == len(self.keys) or self.keys[i] != ea:
+            return self.neighbors[0:0], self.types[0:0]
+
+        lo = self.offsets[i]
+        hi = self.offsets[i + 1]
+        return self.neighbors[lo:hi], self.types[lo:hi]
+
+
+def _make_adjacencies(wordsize, edges):
+    '''
+    build the forward and reverse adjacencies for the given edges.
+
+    Returns:
+      Tuple[XrefAdjacency, XrefAdjacency]: the references from, and the references to, each address.
+    '''
+    # the edges come ordered by source, and then destination.
+    forward = XrefAdjacency(wordsize, edges.srcs, edges.dsts, edges.types)
+
+    # order the reverse edges like the `X` and `D` records: by destination, and then source.
+    order = sorted(range(len(edges)), key=lambda i: (edges.dsts[i], edges.srcs[i]))
+    reverse = XrefAdjacency(wordsize,
+                            [edges.dsts[i] for i in order],
+                            [edges.srcs[i] for i in order],
+                            [edges.types[i] for i in order])
+    return forward, reverse
+
+
+class XrefIndex(object):
+    '''
+    in-memory forward and reverse adjacencies for the code and data cross-references
+     of an entire database, built with a single scan of the B-tree.
+
+    to use this index to answer the `get_*refs_*` queries (and `idautils.CodeRefsTo` etc.),
+     use `enable_xref_index`.
+    '''
+    __slots__ = ('code_from', 'code_to', 'data_from', 'data_to')
+
+    def __init__(self, db):
+        xrefs = get_all_xrefs(db)
+        self.code_from, self.code_to = _make_adjacencies(db.wordsize, xrefs.code)
+        self.data_from, self.data_to = _make_adjacencies(db.wordsize, xrefs.data)
+
+    def get_adjacency(self, tag):
+        '''
+        fetch the adjacency that corresponds to the given xref netnode tag.
+
+        Args:
+          tag (str): one of `x`, `X`, `d`, or `D`.
+
+        Returns:
+          XrefAdjacency: the adjacency.
+
+        Raises:
+          ValueError: if the tag is not an xref tag.
+        '''
+        if tag == 'x':
+            return self.code_from
+        elif tag == 'X':
+            return self.code_to
+        elif tag == 'd':
+            return self.data_from
+        elif tag == 'D':
+            return self.data_to
+        else:
+            raise ValueError('unexpected xref tag')
+
+
+def enable_xref_index(db):
+    '''
+    build the cross-reference index for the given database,
+     and use it to answer subsequent xref queries, rather than searching the B-tree.
+    this is worthwhile when doing many queries, like in graph algorithms.
+
+    Example::
+
+        enable_xref_index(db)
+        assert list(get_crefs_to(db, 0x401000)) == [...]
+
+    Returns:
+      XrefIndex: the index.
+    '''
+    return get_cached(db, 'xref index', XrefIndex)
+
+
 # under v6.95, this works.
 class Fixup(vstruct.VStruct):
     def __init__(self, wordsize):
@@ -1025,9 +1644,10 @@ class Fixup(vstruct.VStruct):
                 (self.type))
 
 
-class FixupV70:
+class FixupV70(object):
+    __slots__ = ('type', 'unk1', 'unk2', 'offset')
+
     def __init__(self, buf, wordsize):
-        self.buf = buf
         u = Unpacker(buf, wordsize=wordsize)
 
         # tbh, don't really know what these fields are...
@@ -1057,6 +1677,104 @@ Fixups = Analysis('$ fixups', [
 ])
 
 
+class FixupIndex(object):
+    '''
+    a sorted index of the fixup addresses in a database, with the length of each fixup.
+    queries are binary searches, rather than scans of the `$ fixups` netnode.
+
+    Example::
+
+        fixups = FixupIndex(db)
+        assert fixups.get_next(0x401000) == 0x401004
+        assert fixups.get_length(0x401004) == 4
+    '''
+    __slots__ = ('addresses', 'lengths')
+
+    def __init__(self, db):
+        self.addresses = _make_word_array(db.wordsize)
+        # the length of each fixup, or 0 if the fixup type is not yet supported.
+        self.lengths = array.array('B')
+
+        try:
+            fixups = Fixups(db)
+            field = fixups._fields_by_name['fixups']
+            # like `idaapi.get_next_fixup_ea`, consider all indices, not just those that are mapped.
+            for entry in fixups.netnode.supentries(tag=field.tag):
+                self.addresses.append(entry.parsed_key.index)
+                try:
+                    length = field.cast(bytes(entry.value), wordsize=db.wordsize).get_fixup_length()
+                except NotImplementedError:
+                    length = 0
+                self.lengths.append(length)
+        except KeyError:
+            # there are no fixups in this database.
+            return
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __contains__(self, ea):
+        i = bisect.bisect_left(self.addresses, ea)
+        return i < len(self.addresses) and self.addresses[i] == ea
+
+    def get_next(self, ea):
+        '''
+        find the first fixup at or after the given address.
+
+        Raises:
+          KeyError: if there are no fixups at or after the given address.
+        '''
+        i = bisect.bisect_left(self.addresses, ea)
+        if i == len(self.addresses):
+            raise KeyError(ea)
+        return self.addresses[i]
+
+    def get_prev(self, ea):
+        '''
+        find the last fixup before the given address.
+
+        Raises:
+          KeyError: if there are no fixups before the given address.
+        '''
+        i = bisect.bisect_left(self.addresses, ea)
+        if i == 0:
+            raise KeyError(ea)
+        return self.addresses[i - 1]
+
+    def get_range(self, start, end):
+        '''
+        fetch the addresses of the fixups in the range [start, end).
+
+        Returns:
+          List[int]: the sorted fixup addresses.
+        '''
+        lo = bisect.bisect_left(self.addresses, start)
+        hi = bisect.bisect_left(self.addresses, end)
+        return list(self.addresses[lo:hi])
+
+    def contains(self, ea, size):
+        '''
+        is there a fixup in the range [ea, ea + size)?
+        '''
+        i = bisect.bisect_left(self.addresses, ea)
+        return i < len(self.addresses) and self.addresses[i] < ea + size
+
+    def get_length(self, ea):
+        '''
+        fetch the length of the fixup at the given address.
+
+        Returns:
+          int: the length, or 0 if the fixup type is not yet supported.
+
+        Raises:
+          KeyError: if there is no fixup at the given address.
+        '''
+        i = bisect.bisect_left(self.addresses, ea)
+        if i == len(self.addresses) or self.addresses[i] != ea:
+            raise KeyError(ea)
+        return self.lengths[i]
+
+
 def parse_seg_strings(buf, wordsize=None):
     strings = []
     offset = 0x0
@@ -1078,9 +1796,12 @@ SegStrings = Analysis('$ segstrings', [
 ])
 
 
-class Seg:
+class Seg(object):
+    __slots__ = ('startEA', 'endEA', 'name_index', 'sclass', 'orgbase',
+                 'flags', 'align', 'comb', 'perm', 'bitness', 'type', 'sel',
+                 'defsr', 'color')
+
     def __init__(self, buf, wordsize):
-        self.buf = buf
         u = Unpacker(buf, wordsize=wordsize)
 
         self.startEA = u.addr()
@@ -1139,6 +1860,87 @@ Segments = Analysis('$ segs', [
 ])
 
 
+class SegmentTable(object):
+    '''
+    a compact, columnar table of the segments in a database, ordered by start address.
+    the segments don't overlap, so this is also an interval index over them.
+
+    Example::
+
+        segs = SegmentTable(db)
+        i = segs.index(0x401000)
+        assert segs.bitness[i] == 1
+
+    Example::
+
+        seg = SegmentTable(db).get_segment(0x401010)
+        assert seg.startEA == 0x401000
+    '''
+    __slots__ = ('starts', 'ends', 'flags', 'bitness', 'name_indexes', 'segments')
+
+    def __init__(self, db):
+        self.starts = _make_word_array(db.wordsize)
+        self.ends = _make_word_array(db.wordsize)
+        self.flags = array.array('L')
+        self.bitness = array.array('B')
+        # index into `$ segstrings` array of strings.
+        self.name_indexes = _make_word_array(db.wordsize)
+        # the parsed Seg instances, for the less common attributes.
+        self.segments = []
+
+        # the scan is ordered by address, so the columns are sorted by start address.
+        for seg in Segments(db).segments.values():
+            self.segments.append(seg)
+            self.starts.append(seg.startEA)
+            self.ends.append(seg.endEA)
+            self.flags.append(seg.flags)
+            self.bitness.append(seg.bitness)
+            self.name_indexes.append(seg.name_index)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def index(self, ea):
+        '''
+        find the row of the segment that starts at the given address.
+
+        Returns:
+          int: the row index.
+
+        Raises:
+          KeyError: if no segment starts at the given address.
+        '''
+        i = bisect.bisect_left(self.starts, ea)
+        if i == len(self.starts) or self.starts[i] != ea:
+            raise KeyError(ea)
+        return i
+
+    def find(self, ea):
+        '''
+        find the row of the segment that contains the given address.
+
+        Returns:
+          int: the row index.
+
+        Raises:
+          KeyError: if no segment contains the given address.
+        '''
+        i = bisect.bisect_right(self.starts, ea) - 1
+        if i < 0 or ea >= self.ends[i]:
+            raise KeyError(ea)
+        return i
+
+    def get_segment(self, ea):
+        '''
+        Returns:
+          Seg: the segment that contains the given address.
+
+        Raises:
+          KeyError: if no segment contains the given address.
+        '''
+        return self.segments[self.find(ea)]
+
+
 Imports = Analysis('$ imports', [
     # index: entry number, value: node id
     Field('lib_netnodes', 'A', NUMBERS, idb.netnode.as_uint),
@@ -1205,7 +2007,7 @@ def enumerate_entrypoints(db):
 
     ordinals = ents.ordinals
     forwarded_symbols = ents.forwarded_symbols
-    names = ents.function_names
+    names = dict(ents.function_names)
     names.update(ents.main_entry_name)
 
     for index, addr in ents.functions.items():
@@ -0,0 +1,345 @@
+'''
+run a task over many databases, fanned out across a pool of worker processes.
+
+each worker process opens many databases in turn, so the interpreter startup and import costs
+ are paid once per worker rather than once per database.
+workers are recycled after a number of databases, which bounds the memory they accumulate,
+ and each database is processed with a timeout, so a failure is isolated to its own result.
+
+results are streamed as JSON lines, one per database, in order of completion::
+
+    {"path": "a.idb", "result": "..."}
+    {"path": "b.idb", "error": "ValueError: bad signature"}
+
+Example::
+
+    $ python -m idb.batch --task md5 'corpus/**/*.idb'
+
+Example::
+
+    $ python -m idb.batch --task mypackage.features:extract --workers 32 --timeout 60 --list idbs.txt
+
+a task is a callable that accepts an opened `idb.IDB` and its path,
+ and returns a JSON-serializable value.
+'''
+import sys
+import glob
+import json
+import signal
+import logging
+import argparse
+import importlib
+import multiprocessing
+
+import six
+
+import idb
+import idb.analysis
+
+
+logger = logging.getLogger(__name__)
+
+
+# recycle each worker process after it has processed this many databases.
+MAX_TASKS_PER_WORKER = 0x40
+
+
+def get_md5(db, path):
+    '''
+    fetch the MD5 of the input file, as done by `scripts/extract_md5.py`.
+    '''
+    return idb.analysis.Root(db).md5
+
+
+def get_functions(db, path):
+    '''
+    fetch the start address and name of each function.
+    '''
+    api = idb.IDAPython(db)
+    return [[fva, api.idc.GetFunctionName(fva)] for fva in api.idautils.Functions()]
+
+
+def get_segments(db, path):
+    '''
+    fetch the start address, end address, and name of each segment.
+    '''
+    api = idb.IDAPython(db)
+    return [[start, api.idc.SegEnd(start), api.idc.SegName(start)] for start in api.idautils.Segments()]
+
+
+# the tasks available by name.
+TASKS = {
+    'md5': get_md5,
+    'functions': get_functions,
+    'segments': get_segments,
+}
+
+
+def get_task(task):
+    '''
+    resolve a task by name, either from `TASKS`, or as a `module:function` reference.
+
+    Args:
+      task (Union[str, callable]): the task name or reference, or a callable, which is returned as-is.
+
+    Returns:
+      callable: the task.
+
+    Raises:
+      ValueError: if the task cannot be found.
+    '''
+    if callable(task):
+        return task
+
+    if task in TASKS:
+        return TASKS[task]
+
+    if ':' not in task:
+        raise ValueError('unknown task: ' + task)
+
+    modname, _, funcname = task.partition(':')
+    try:
+        return getattr(importlib.import_module(modname), funcname)
+    except (ImportError, AttributeError):
+        raise ValueError('failed to import task: ' + task)
+
+
+class TaskTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise TaskTimeout()
+
+
+def _cancel_alarm():
+    signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def dump_result(result):
+    '''
+    serialize the given result as a line of JSON, like written by `main`.
+
+    Raises:
+      TypeError: if the result is not JSON-serializable.
+      ValueError: if the result is not JSON-serializable.
+    '''
+    return json.dumps(result, sort_keys=True)
+
+
+def process_file(path, task, timeout=None):
+    '''
+    open the given database and run the task over it.
+    any failure is captured in the result, rather than raised,
+     including a task result that isn't JSON-serializable (see `dump_result`).
+
+    the timeout relies on SIGALRM, so it must be called from the main thread of a process,
+     and is ignored on platforms without it.
+    otherwise, the failure to install the handler is captured in the result.
+    the caller's SIGALRM handler is restored afterwards.
+
+    Args:
+      path (str): the path to the database.
+      task (Union[str, callable]): the task, see `get_task`.
+      timeout (float): the number of seconds after which to give up, or None to wait indefinitely.
+
+    Returns:
+      Dict[str, Any]: the path, and either the task result or an error message.
+    '''
+    use_alarm = timeout is not None and hasattr(signal, 'setitimer')
+    # the caller's SIGALRM handler, once replaced.
+    installed = False
+    old_handler = None
+
+    try:
+        if use_alarm:
+            # raises ValueError off the main thread.
+            old_handler = signal.signal(signal.SIGALRM, _on_alarm)
+            installed = True
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+
+        with idb.from_file(path) as db:
+            result = get_task(task)(db, path)
+        # cancel the alarm first, so it can't fire outside the task, such as in the handlers below.
+        if installed:
+            _cancel_alarm()
+
+        result = {'path': path, 'result': result}
+        # fail here, rather than when the result is written out, or pickled by the pool.
+        dump_result(result)
+        return result
+    except TaskTimeout:
+        if installed:
+            _cancel_alarm()
+        logger.warning('timed out: %s', path)
+        return {'path': path, 'error': 'timeout after %ss' % (timeout)}
+    except Exception as e:
+        if installed:
+            _cancel_alarm()
+        logger.warning('failed: %s: %s', path, e)
+        logger.debug('failure details:', exc_info=True)
+        return {'path': path, 'error': '%s: %s' % (e.__class__.__name__, e)}
+    finally:
+        if installed:
+            _cancel_alarm()
+            # the handler is None when it wasn't installed from Python.
+            signal.signal(signal.SIGALRM, old_handler if old_handler is not None else signal.SIG_DFL)
+
+
+def _init_worker(max_memory):
+    if max_memory is None:
+        return
+
+    try:
+        import resource
+    except ImportError:
+        logger.warning('memory limits are not supported on this platform')
+        return
+
+    # allocations beyond this raise MemoryError, which fails just the current database.
+    resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+
+
+def _process_file_worker(args):
+    return process_file(*args)
+
+
+def run(paths, task, workers=None, timeout=None,
+        max_tasks_per_worker=MAX_TASKS_PER_WORKER, max_memory=None):
+    '''
+    run the task over each of the given databases, fanned out across a pool of worker processes.
+
+    when the task is a callable, rather than a name, it must be picklable,
+     such as a module-level function.
+
+    Example::
+
+        for result in run(['a.idb', 'b.idb'], 'md5'):
+            print(result['path'], result.get('result'))
+
+    Args:
+      paths (Iterable[str]): the paths to the databases.
+      task (Union[str, callable]): the task, see `get_task`.
+      workers (int): the number of processes, by default, the number of CPUs.
+        use 1 to run in this process.
+      timeout (float): the number of seconds to allow for each database.
+      max_tasks_per_worker (int): recycle each worker after this many databases.
+      max_memory (int): the address space limit for each worker, in bytes, where supported.
+
+    Yields:
+      Dict[str, Any]: the result for each database, in order of completion.
+    '''
+    # fail early on unknown task names, rather than once per database.
+    get_task(task)
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    if workers <= 1:
+        for path in paths:
+            yield process_file(path, task, timeout=timeout)
+        return
+
+    pool = multiprocessing.Pool(processes=workers,
+                                initializer=_init_worker,
+                                initargs=(max_memory, ),
+                                maxtasksperchild=max_tasks_per_worker)
+    try:
+        jobs = ((path, task, timeout) for path in paths)
+        for result in pool.imap_unordered(_process_file_worker, jobs):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def expand_paths(patterns):
+    '''
+    generate the paths that match the given glob patterns.
+    paths without wildcards are passed through as-is, so that missing files are reported as failures.
+    '''
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            for path in sorted(glob.glob(pattern, recursive=True) if six.PY3 else glob.glob(pattern)):
+                yield path
+        else:
+            yield pattern
+
+
+def read_paths(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Run a task over many IDA Pro databases.")
+    parser.add_argument("idbpaths", type=str, nargs="*",
+                        help="Paths or glob patterns of input idb files")
+    parser.add_argument("--list", type=str,
+                        help="File with one idb path per line, or - for stdin")
+    parser.add_argument("--task", type=str, default="md5",
+                        help="Task name (%s) or module:function reference" % (", ".join(sorted(TASKS.keys()))))
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes, default: number of CPUs")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Seconds to allow for each idb")
+    parser.add_argument("--max-tasks-per-worker", type=int, default=MAX_TASKS_PER_WORKER,
+                        help="Recycle each worker after this many idbs")
+    parser.add_argument("--max-memory", type=int, default=None,
+                        help="Address space limit for each worker, in MB")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable debug logging")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Disable all output but errors")
+    args = parser.parse_args(args=argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+        logging.getLogger().setLevel(logging.DEBUG)
+    elif args.quiet:
+        logging.basicConfig(level=logging.ERROR)
+        logging.getLogger().setLevel(logging.ERROR)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        logging.getLogger().setLevel(logging.INFO)
+        logging.getLogger('idb.netnode').setLevel(logging.ERROR)
+        logging.getLogger('idb.fileformat').setLevel(logging.ERROR)
+
+    paths = list(expand_paths(args.idbpaths))
+    if args.list == '-':
+        paths.extend(read_paths(sys.stdin))
+    elif args.list:
+        with open(args.list, 'r') as f:
+            paths.extend(read_paths(f))
+
+    if not paths:
+        parser.error('no input idb files')
+
+    try:
+        results = run(paths, args.task,
+                      workers=args.workers,
+                      timeout=args.timeout,
+                      max_tasks_per_worker=args.max_tasks_per_worker,
+                      max_memory=args.max_memory * 1024 * 1024 if args.max_memory else None)
+        failures = 0
+        for result in results:
+            if 'error' in result:
+                failures += 1
+            sys.stdout.write(dump_result(result) + '\n')
+            sys.stdout.flush()
+    except ValueError as e:
+        logger.error('%s', e)
+        return -1
+
+    if failures:
+        logger.info('failed to process %d of %d idbs', failures, len(paths))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
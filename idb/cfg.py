@@ -0,0 +1,409 @@
+'''
+a per-database store of function control flow graphs.
+
+FlowChart recovers basic blocks by walking the B-tree, which is relatively expensive.
+when the same CFGs are needed many times, such as by several feature extractors,
+ enable the cache so that each graph is recovered once, and optionally persist it
+ to a sidecar file so that subsequent runs over the same database load it instantly.
+
+Example::
+
+    cache = idb.cfg.enable_cfg_cache(db, path='ls.idb.cfg.json')
+    api = idb.IDAPython(db)
+    for fva in api.idautils.Functions():
+        fc = api.idaapi.FlowChart(api.ida_funcs.get_func(fva))
+        ...
+    cache.save()
+'''
+import os
+import json
+import mmap
+import array
+import hashlib
+import logging
+import multiprocessing
+
+import idb.analysis
+
+
+logger = logging.getLogger(__name__)
+
+
+# bump this when the layout of the sidecar file changes.
+CFG_CACHE_VERSION = 1
+
+
+def get_database_identity(db):
+    '''
+    compute a stable identifier for the contents of the given database.
+    sidecar files are only loaded when this matches.
+
+    Returns:
+      str: the hex md5 of the database file.
+    '''
+    return idb.analysis.get_cached(db, 'database identity',
+                                   lambda db: hashlib.md5(db.buf).hexdigest())
+
+
+class CFG(object):
+    '''
+    the compact basic block graph of a function.
+    blocks are stored in order of their start address,
+     and the successors of block `i` are `succs[offsets[i]:offsets[i+1]]`, as block indices.
+
+    like `idaapi.BasicBlock`, the end of a block is the address of its last instruction.
+    '''
+    __slots__ = ('startEA', 'starts', 'ends', 'offsets', 'succs')
+
+    def __init__(self, wordsize, startEA, blocks, edges):
+        '''
+        Args:
+          wordsize (int): the database word size.
+          startEA (int): the function start address.
+          blocks (Iterable[Tuple[int, int]]): pairs of (block start, block end).
+          edges (Iterable[Tuple[int, int]]): pairs of (source block start, destination block start).
+        '''
+        blocks = sorted(blocks)
+        indexes = {start: i for i, (start, _) in enumerate(blocks)}
+
+        self.startEA = startEA
+        self.starts = idb.analysis._make_word_array(wordsize)
+        self.starts.extend(start for start, _ in blocks)
+        self.ends = idb.analysis._make_word_array(wordsize)
+        self.ends.extend(end for _, end in blocks)
+
+        succs = [[] for _ in blocks]
+        for src, dst in edges:
+            succs[indexes[src]].append(indexes[dst])
+
+        self.offsets = array.array(idb.analysis.DWORD_TYPECODE, [0])
+        self.succs = array.array(idb.analysis.DWORD_TYPECODE)
+        for dsts in succs:
+            self.succs.extend(sorted(dsts))
+            self.offsets.append(len(self.succs))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getstate__(self):
+        # pickle as the raw arrays, such as when returned from worker processes.
+        return (self.startEA, self.starts, self.ends, self.offsets, self.succs)
+
+    def __setstate__(self, state):
+        self.startEA, self.starts, self.ends, self.offsets, self.succs = state
+
+    def get_blocks(self):
+        '''
+        Returns:
+          List[Tuple[int, int]]: pairs of (block start, block end), ordered by start.
+        '''
+        return list(zip(self.starts, self.ends))
+
+    def get_edges(self):
+        '''
+        Returns:
+          List[Tuple[int, int]]: pairs of (source block start, destination block start).
+        '''
+        edges = []
+        for i in range(len(self.starts)):
+            for j in self.succs[self.offsets[i]:self.offsets[i + 1]]:
+                edges.append((self.starts[i], self.starts[j]))
+        return edges
+
+    @classmethod
+    def from_flowchart(cls, db, startEA, fc):
+        '''
+        collect the blocks and edges of a recovered `idaapi.FlowChart`.
+        '''
+        blocks = [(bb.startEA, bb.endEA) for bb in fc]
+        edges = [(src, dst) for src, dsts in fc.succs.items() for dst in dsts]
+        return cls(db.wordsize, startEA, blocks, edges)
+
+    def serialize(self):
+        return {
+            'blocks': [list(block) for block in self.get_blocks()],
+            'edges': [list(edge) for edge in self.get_edges()],
+        }
+
+    @classmethod
+    def deserialize(cls, db, startEA, doc):
+        return cls(db.wordsize, startEA,
+                   [tuple(block) for block in doc['blocks']],
+                   [tuple(edge) for edge in doc['edges']])
+
+
+class CFGCache(object):
+    '''
+    a store of `CFG` instances for a database, keyed by function start address.
+    use `enable_cfg_cache` to have `idaapi.FlowChart` consult it.
+    '''
+
+    def __init__(self, db, path=None):
+        '''
+        Args:
+          db (idb.IDB): the database.
+          path (str): optional sidecar file used by `.load()` and `.save()`.
+        '''
+        self.idb = db
+        self.path = path
+        # computed on demand, since hashing the database is only needed for a sidecar file.
+        self._identity = None
+        self.cfgs = {}
+
+    @property
+    def identity(self):
+        '''
+        the identity of the database, see `get_database_identity`.
+        sidecar files are only loaded when this matches.
+        '''
+        if self._identity is None:
+            self._identity = get_database_identity(self.idb)
+        return self._identity
+
+    @identity.setter
+    def identity(self, identity):
+        self._identity = identity
+
+    def __contains__(self, fva):
+        return fva in self.cfgs
+
+    def __len__(self):
+        return len(self.cfgs)
+
+    def get(self, fva):
+        '''
+        Returns:
+          CFG: the cached graph for the function, or None.
+        '''
+        return self.cfgs.get(fva)
+
+    def add(self, cfg):
+        self.cfgs[cfg.startEA] = cfg
+
+    def clear(self):
+        self.cfgs.clear()
+
+    def load(self, path=None):
+        '''
+        merge the graphs from the given sidecar file into this cache.
+        files from another database or format version are ignored.
+
+        Returns:
+          bool: True if the file was loaded.
+
+        Raises:
+          ValueError: if no path is provided.
+        '''
+        path = path or self.path
+        if path is None:
+            raise ValueError('path required')
+
+        try:
+            with open(path, 'rb') as f:
+                doc = json.loads(f.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            logger.warning('failed to read cfg cache: %s', path)
+            return False
+
+        if doc.get('version') != CFG_CACHE_VERSION:
+            logger.info('ignoring cfg cache with unexpected version: %s', path)
+            return False
+
+        if doc.get('identity') != self.identity:
+            logger.info('ignoring cfg cache for a different database: %s', path)
+            return False
+
+        for fva, cfgdoc in doc['functions'].items():
+            fva = int(fva, 0x10)
+            self.cfgs[fva] = CFG.deserialize(self.idb, fva, cfgdoc)
+
+        logger.debug('loaded %d cfgs from %s', len(doc['functions']), path)
+        return True
+
+    def save(self, path=None):
+        '''
+        write the graphs in this cache to the given sidecar file.
+        the file is written to a temporary path first, so a failed write leaves the old file intact.
+
+        Raises:
+          ValueError: if no path is provided.
+        '''
+        path = path or self.path
+        if path is None:
+            raise ValueError('path required')
+
+        doc = {
+            'version': CFG_CACHE_VERSION,
+            'identity': self.identity,
+            'functions': {'%x' % fva: cfg.serialize() for fva, cfg in self.cfgs.items()},
+        }
+
+        tmppath = path + '.tmp'
+        with open(tmppath, 'wb') as f:
+            f.write(json.dumps(doc, sort_keys=True).encode('utf-8'))
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmppath, path)
+
+
+def enable_cfg_cache(db, path=None):
+    '''
+    have `idaapi.FlowChart` keep the graphs it recovers, and reuse them on later calls.
+    when a sidecar path is given, and the file exists, its graphs are loaded first.
+
+    Args:
+      db (idb.IDB): the database.
+      path (str): optional sidecar file, saved via `CFGCache.save()`.
+
+    Returns:
+      CFGCache: the cache.
+    '''
+    cache = db.caches.get('cfg cache')
+    if cache is None:
+        cache = CFGCache(db, path=path)
+        db.caches['cfg cache'] = cache
+    elif path is not None:
+        cache.path = path
+
+    if path is not None and os.path.exists(path):
+        cache.load(path)
+
+    return cache
+
+
+def get_cfg(db, fva):
+    '''
+    fetch the graph for the function that starts at the given address,
+     recovering it when its not cached.
+    the cfg cache is consulted only if it has been enabled, see `enable_cfg_cache`.
+
+    Returns:
+      CFG: the graph.
+
+    Raises:
+      KeyError: if the function does not exist.
+    '''
+    # break import cycle
+    import idb.idapython
+
+    cache = db.caches.get('cfg cache')
+    if cache is not None:
+        cfg = cache.get(fva)
+        if cfg is not None:
+            return cfg
+
+    api = idb.idapython.IDAPython(db)
+    func = api.ida_funcs.get_func(fva)
+    fc = api.idaapi.FlowChart(func)
+    if cache is not None:
+        # the flowchart added the graph to the cache.
+        return cache.get(func.startEA)
+    return CFG.from_flowchart(db, func.startEA, fc)
+
+
+# number of functions handed to a worker process at a time.
+BUILD_BATCH_SIZE = 0x20
+
+# the database opened by this worker process. see `_init_worker`.
+_worker_db = None
+
+
+def _init_worker(path):
+    global _worker_db
+
+    # map the file rather than reading it, so the workers share the page cache.
+    # the mapping remains valid once the file is closed.
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _worker_db = idb.from_buffer(buf)
+    _worker_db.path = path
+
+
+def _build_cfgs(db, fvas):
+    '''
+    recover the graphs for the given functions.
+    functions whose graph can't be recovered are left out.
+
+    Returns:
+      List[CFG]: the graphs.
+    '''
+    # break import cycle
+    import idb.idapython
+
+    api = idb.idapython.IDAPython(db)
+    cfgs = []
+    for fva in fvas:
+        try:
+            func = api.ida_funcs.get_func(fva)
+            fc = api.idaapi.FlowChart(func)
+        except KeyError:
+            logger.debug('failed to recover cfg: %x', fva)
+            continue
+        cfgs.append(CFG.from_flowchart(db, func.startEA, fc))
+    return cfgs
+
+
+def _build_cfgs_worker(fvas):
+    return _build_cfgs(_worker_db, fvas)
+
+
+def build_all_flowcharts(db, workers=None):
+    '''
+    recover the graphs for all the functions in the database,
+     partitioning the functions across a pool of worker processes.
+    each worker maps the database file, so it must have been opened via `idb.from_file`.
+    functions whose graph can't be recovered, such as those that flow outside the loaded segments,
+     are left out.
+
+    when the cfg cache is enabled, the graphs are added to it.
+
+    Example::
+
+        with idb.from_file('ls.idb') as db:
+            cfgs = build_all_flowcharts(db, workers=8)
+            print(cfgs[0x804A100].get_blocks())
+
+    Args:
+      db (idb.IDB): the database.
+      workers (int): the number of processes, by default, the number of CPUs.
+        use 1 to build in this process.
+
+    Returns:
+      Dict[int, CFG]: the graphs, by function start address.
+
+    Raises:
+      ValueError: if workers are requested and the database was not loaded from a file.
+    '''
+    # break import cycle
+    import idb.idapython
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    api = idb.idapython.IDAPython(db)
+    fvas = list(api.idautils.Functions())
+
+    if workers <= 1 or len(fvas) <= BUILD_BATCH_SIZE:
+        cfgs = _build_cfgs(db, fvas)
+    else:
+        if db.path is None:
+            raise ValueError('database must be loaded from a file')
+
+        batches = [fvas[i:i + BUILD_BATCH_SIZE] for i in range(0, len(fvas), BUILD_BATCH_SIZE)]
+        pool = multiprocessing.Pool(processes=workers, initializer=_init_worker, initargs=(db.path, ))
+        try:
+            cfgs = []
+            for batch in pool.imap_unordered(_build_cfgs_worker, batches):
+                cfgs.extend(batch)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    ret = {cfg.startEA: cfg for cfg in cfgs}
+
+    cache = db.caches.get('cfg cache')
+    if cache is not None:
+        for cfg in cfgs:
+            cache.add(cfg)
+
+    return ret
@@ -0,0 +1,430 @@
+'''
+export the contents of a database as columnar tables, for loading into analytical engines.
+
+the tables are:
+  - functions: start, end, flags, owner, name, for the functions and function tails (see `func_t`),
+  - segments: start, end, name, flags, perm, bitness, type, sel,
+  - names: address, name,
+  - comments: address, repeatable, comment,
+  - xrefs: src, dst, type, kind ('code' or 'data'),
+  - imports: library, name, address, and
+  - entrypoints: name, address, ordinal, forwarded_symbol.
+
+the functions, segments, names, comments, and xrefs are collected in one ordered scan
+ over the netnodes of the B-tree, rather than a search per address,
+ since these are the tables that grow with the size of the database.
+the imports and entry points are small, and come from `enumerate_imports` and `enumerate_entrypoints`.
+
+the tables are written as Apache Parquet files, one per table, when pyarrow is installed,
+ or as a single NumPy .npz archive, with an array named `<table>.<column>` for each column.
+in an .npz archive, missing strings are empty and missing numbers are -1,
+ since the arrays have no nulls.
+
+Example::
+
+    $ python -m idb.export ls.idb ls/
+    $ python -m idb.export --format npz ls.idb ls.npz
+
+Example::
+
+    with idb.from_file('ls.idb') as db:
+        tables = idb.export.get_tables(db)
+        print(len(tables['functions']))
+        idb.export.write_npz(tables, 'ls.npz')
+'''
+import os
+import sys
+import array
+import struct
+import logging
+import argparse
+import collections
+
+import six
+
+import idb
+import idb.netnode
+import idb.analysis
+import idb.idapython
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# column types, named like the NumPy dtypes.
+# `addr` is an unsigned integer the size of an address.
+ADDR = 'addr'
+U8 = 'u1'
+U16 = 'u2'
+U32 = 'u4'
+I64 = 'i8'
+BOOL = 'bool'
+STR = 'str'
+
+# the columns of each table, in order.
+SCHEMA = collections.OrderedDict([
+    ('functions', (('start', ADDR), ('end', ADDR), ('flags', U16), ('owner', ADDR), ('name', STR))),
+    ('segments', (('start', ADDR), ('end', ADDR), ('name', STR), ('flags', U32), ('perm', U32),
+                  ('bitness', U32), ('type', U32), ('sel', U32))),
+    ('names', (('address', ADDR), ('name', STR))),
+    ('comments', (('address', ADDR), ('repeatable', BOOL), ('comment', STR))),
+    ('xrefs', (('src', ADDR), ('dst', ADDR), ('type', U8), ('kind', STR))),
+    ('imports', (('library', STR), ('name', STR), ('address', ADDR))),
+    ('entrypoints', (('name', STR), ('address', ADDR), ('ordinal', I64), ('forwarded_symbol', STR))),
+])
+
+# the array.array typecodes for the numeric column types.
+# columns of other types, which may have missing values, are lists.
+ARRAY_TYPECODES = {
+    U8: 'B',
+    U16: 'H',
+    U32: idb.analysis.DWORD_TYPECODE,
+}
+
+
+class Table(object):
+    '''
+    a set of named columns of equal length.
+    numeric columns are arrays, so a table costs a few words per row, rather than a record object per row.
+
+    Example::
+
+        names = Table(SCHEMA['names'], wordsize=4)
+        names.append(0x401000, 'start')
+        assert names.columns['name'][0] == 'start'
+    '''
+    __slots__ = ('types', 'columns')
+
+    def __init__(self, schema, wordsize):
+        '''
+        Args:
+          schema (Sequence[Tuple[str, str]]): the name and type of each column.
+          wordsize (int): the size of an address.
+        '''
+        # map from column name to column type.
+        self.types = collections.OrderedDict()
+        # map from column name to values.
+        self.columns = collections.OrderedDict()
+        for name, type in schema:
+            if type == ADDR:
+                type = 'u%d' % (wordsize)
+                column = idb.analysis._make_word_array(wordsize)
+            elif type in ARRAY_TYPECODES:
+                column = array.array(ARRAY_TYPECODES[type])
+            else:
+                column = []
+            self.types[name] = type
+            self.columns[name] = column
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def append(self, *values):
+        for column, value in zip(self.columns.values(), values):
+            column.append(value)
+
+
+def _get_nodeid(db, name):
+    '''
+    Returns:
+      int: the node id of the netnode with the given name, or None if it doesn't exist.
+    '''
+    try:
+        return idb.netnode.Netnode(db, name).nodeid
+    except KeyError:
+        return None
+
+
+def _has_comment(db, ea):
+    '''
+    is the comment flag set for the given address, like `ida_bytes.get_cmt` checks?
+    '''
+    try:
+        flags = db.id1.get_flags(ea)
+    except KeyError:
+        return False
+    return flags & idb.idapython.FLAGS.FF_COMM > 0
+
+
+def _get_function_name(names, func, wordsize):
+    if idb.analysis.is_flag_set(func.flags, idb.analysis.func_t.FUNC_TAIL):
+        return None
+
+    try:
+        return names[func.startEA]
+    except KeyError:
+        # like `idc.GetFunctionName`.
+        if wordsize == 4:
+            return 'sub_%04x' % (func.startEA)
+        else:
+            return 'sub_%08x' % (func.startEA)
+
+
+def get_tables(db, visit=None):
+    '''
+    extract the contents of the given database as columnar tables, see `SCHEMA`.
+    the names, comments, and xrefs are those of addresses, not of the internal netnodes.
+    unlike `Xref.type`, the xref type is unsigned.
+
+    Args:
+      db (idb.IDB): the database.
+      visit (Callable[[bytes, bytes], None]): if provided, called with the key and value
+        of each netnode record, in order, during the scan.
+
+    Returns:
+      Dict[str, Table]: the tables, by name.
+    '''
+    wordsize = db.wordsize
+    if wordsize == 4:
+        wordformat = '>I'
+    elif wordsize == 8:
+        wordformat = '>Q'
+    else:
+        raise RuntimeError('unexpected wordsize')
+
+    tables = collections.OrderedDict()
+    for name, schema in SCHEMA.items():
+        tables[name] = Table(schema, wordsize)
+
+    nodebase = idb.netnode.Netnode.get_nodebase(db)
+    funcs_nodeid = _get_nodeid(db, '$ funcs')
+    segs_nodeid = _get_nodeid(db, '$ segs')
+    segstrings = idb.analysis.SegStrings(db).strings if segs_nodeid is not None else []
+
+    tag_offset = 1 + wordsize
+    # the length of a netnode key with a tag, and with a tag and index.
+    tag_keylength = 1 + wordsize + 1
+    index_keylength = 1 + wordsize + 1 + wordsize
+    name_tag = ord(idb.netnode.TAGS.NAME)
+    supval_tag = ord(idb.netnode.TAGS.SUPVAL)
+    code_tag = ord('x')
+    data_tag = ord('d')
+
+    # map from address to name, to name the functions.
+    # the address netnodes sort before the `$ funcs` netnode, so these are complete when the functions are read.
+    names = {}
+    functions = []
+    segments = []
+
+    for entry in db.id0.iterate(b'.', b'/'):
+        key = bytes(entry.key)
+        if visit is not None:
+            visit(key, entry.value)
+
+        if len(key) == tag_keylength:
+            has_index = False
+        elif len(key) == index_keylength:
+            has_index = True
+        else:
+            continue
+
+        nodeid = struct.unpack_from(wordformat, key, 1)[0]
+        tag = six.indexbytes(key, tag_offset)
+
+        if nodeid & nodebase == nodebase:
+            if not has_index or tag != supval_tag:
+                continue
+
+            if nodeid == funcs_nodeid:
+                # like `Functions`, which only includes functions at addresses with flags.
+                index = struct.unpack_from(wordformat, key, tag_offset + 1)[0]
+                if db.id1.contains_address(index):
+                    functions.append(idb.analysis.func_t(entry.value, wordsize))
+            elif nodeid == segs_nodeid:
+                segments.append(idb.analysis.Seg(entry.value, wordsize))
+            continue
+
+        if not has_index:
+            if tag == name_tag:
+                name = idb.netnode.as_string(entry.value)
+                names[nodeid] = name
+                tables['names'].append(nodeid, name)
+            continue
+
+        if tag == supval_tag:
+            # supval 0 is the comment, and supval 1 is the repeatable comment.
+            index = struct.unpack_from(wordformat, key, tag_offset + 1)[0]
+            if index in (0, 1) and _has_comment(db, nodeid):
+                tables['comments'].append(nodeid, index == 1, idb.netnode.as_string(entry.value))
+        elif tag == code_tag or tag == data_tag:
+            value = entry.value
+            if len(value) != 1:
+                # see `get_all_xrefs`.
+                continue
+            dst = struct.unpack_from(wordformat, key, tag_offset + 1)[0]
+            tables['xrefs'].append(nodeid, dst, idb.netnode.as_uint(value),
+                                   'code' if tag == code_tag else 'data')
+
+    for func in functions:
+        tables['functions'].append(func.startEA, func.endEA, func.flags,
+                                   func.startEA if func.owner is None else func.owner,
+                                   _get_function_name(names, func, wordsize))
+
+    for seg in segments:
+        name = segstrings[seg.name_index] if seg.name_index < len(segstrings) else None
+        tables['segments'].append(seg.startEA, seg.endEA, name,
+                                  seg.flags, seg.perm, seg.bitness, seg.type, seg.sel)
+
+    try:
+        for imp in idb.analysis.enumerate_imports(db):
+            tables['imports'].append(imp.library, imp.function_name, imp.function_address)
+    except KeyError:
+        logger.debug('no imports')
+
+    try:
+        for ent in idb.analysis.enumerate_entrypoints(db):
+            tables['entrypoints'].append(ent.name, ent.address, ent.ordinal, ent.forwarded_symbol)
+    except KeyError:
+        logger.debug('no entry points')
+
+    return tables
+
+
+def write_parquet(tables, path):
+    '''
+    write the given tables as Apache Parquet files, named `<table>.parquet`, into the given directory.
+
+    Raises:
+      RuntimeError: if pyarrow is not installed.
+    '''
+    if pyarrow is None:
+        raise RuntimeError('pyarrow is not installed')
+
+    arrow_types = {
+        'u1': pyarrow.uint8(),
+        'u2': pyarrow.uint16(),
+        'u4': pyarrow.uint32(),
+        'u8': pyarrow.uint64(),
+        I64: pyarrow.int64(),
+        BOOL: pyarrow.bool_(),
+        STR: pyarrow.string(),
+    }
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    for name, table in tables.items():
+        t = pyarrow.Table.from_arrays(
+            [pyarrow.array(table.columns[column], type=arrow_types[type])
+             for column, type in table.types.items()],
+            names=list(table.types.keys()))
+        pyarrow.parquet.write_table(t, os.path.join(path, name + '.parquet'))
+        logger.debug('wrote table: %s (%d rows)', name, len(table))
+
+
+def _as_ndarray(column, type):
+    if type == STR:
+        return numpy.array([v if v is not None else '' for v in column], dtype=numpy.str_)
+    elif type == I64:
+        return numpy.array([v if v is not None else -1 for v in column], dtype=numpy.int64)
+    elif type == BOOL:
+        return numpy.array(column, dtype=numpy.bool_)
+    elif len(column) == 0:
+        return numpy.zeros(0, dtype=type)
+    else:
+        # a view of the array contents, rather than a copy, when the item sizes match.
+        return numpy.frombuffer(column, dtype=column.typecode).astype(type, copy=False)
+
+
+def write_npz(tables, path):
+    '''
+    write the given tables as a NumPy .npz archive, with an array named `<table>.<column>` for each column.
+
+    Raises:
+      RuntimeError: if numpy is not installed.
+    '''
+    if numpy is None:
+        raise RuntimeError('numpy is not installed')
+
+    arrays = collections.OrderedDict()
+    for name, table in tables.items():
+        for column, type in table.types.items():
+            arrays[name + '.' + column] = _as_ndarray(table.columns[column], type)
+
+    with open(path, 'wb') as f:
+        numpy.savez(f, **arrays)
+
+
+def get_default_format():
+    '''
+    Returns:
+      str: 'parquet' when pyarrow is installed, or 'npz'.
+
+    Raises:
+      RuntimeError: if neither pyarrow nor numpy is installed.
+    '''
+    if pyarrow is not None:
+        return 'parquet'
+    elif numpy is not None:
+        return 'npz'
+    else:
+        raise RuntimeError('export requires pyarrow or numpy')
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Export the contents of an IDA Pro database as columnar tables.")
+    parser.add_argument("idbpath", type=str,
+                        help="Path to input idb file")
+    parser.add_argument("output", type=str,
+                        help="Path to output directory (parquet) or file (npz)")
+    parser.add_argument("--format", type=str, choices=('parquet', 'npz'),
+                        help="Output format, default: parquet if pyarrow is installed, else npz")
+    parser.add_argument("--tables", type=str,
+                        help="Comma separated names of the tables to write, default: all")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable debug logging")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Disable all output but errors")
+    args = parser.parse_args(args=argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+        logging.getLogger().setLevel(logging.DEBUG)
+    elif args.quiet:
+        logging.basicConfig(level=logging.ERROR)
+        logging.getLogger().setLevel(logging.ERROR)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        logging.getLogger().setLevel(logging.INFO)
+
+    names = args.tables.split(',') if args.tables else list(SCHEMA.keys())
+    for name in names:
+        if name not in SCHEMA:
+            logger.error('unknown table: %s', name)
+            return -1
+
+    output_format = args.format or get_default_format()
+
+    with idb.from_file(args.idbpath) as db:
+        tables = get_tables(db)
+    tables = collections.OrderedDict((name, tables[name]) for name in names)
+
+    if output_format == 'parquet':
+        write_parquet(tables, args.output)
+    else:
+        write_npz(tables, args.output)
+
+    for name, table in tables.items():
+        logger.info('%s: %d rows', name, len(table))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
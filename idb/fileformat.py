@@ -3,9 +3,11 @@ lots of inspiration from: https://github.com/nlitsme/pyidbutil
 '''
 import abc
 import zlib
+import bisect
 import struct
 import logging
 import functools
+import threading
 from collections import namedtuple
 
 import vstruct
@@ -16,6 +18,7 @@ from vstruct.primitives import v_uint32
 from vstruct.primitives import v_uint64
 
 import idb
+import idb.stats
 import idb.netnode
 
 
@@ -85,6 +88,10 @@ class COMPRESSION_METHOD:
     ZLIB = 2
 
 
+# the layout of `FileHeader`, as a `struct` format, for the writers in `idb.synth` and `idb.shared`.
+FILE_HEADER_FORMAT = '<4sHQQIIHQQQIIIIIQI'
+
+
 class SectionHeader(vstruct.VStruct):
     def __init__(self):
         vstruct.VStruct.__init__(self)
@@ -99,6 +106,10 @@ class SectionHeader(vstruct.VStruct):
             self.is_compressed = True
 
 
+# the layout of `SectionHeader`, as a `struct` format.
+SECTION_HEADER_FORMAT = '<BQ'
+
+
 class Section(vstruct.VStruct):
     def __init__(self):
         vstruct.VStruct.__init__(self)
@@ -243,6 +254,9 @@ class Page(vstruct.VStruct):
 
     def _load_entries(self):
         if not self._entries:
+            # build the entries aside, and then publish them at once,
+            #  so a concurrent reader never sees a partial list.
+            entries = []
             key = b''
             for i in range(self.entry_count):
                 if self.is_leaf():
@@ -257,8 +271,9 @@ class Page(vstruct.VStruct):
 
                     entry = BranchEntry(int(ptr.page))
                     entry.vsParse(self.contents, offset=ptr.offset - SIZEOF_ENTRY)
-                self._entries.append(entry)
+                entries.append(entry)
                 key = entry.key
+            self._entries = entries
 
     def get_entries(self):
         '''
@@ -470,10 +485,13 @@ class RoundDownMatchStrategy(FindStrategy):
                     if i == 0:
                         # need to handle this at the branch node, or
                         #  if this is the only node, bubbles up.
+                        # pop the final path entry, cause we know its not here
+                        cursor.path = cursor.path[:-1]
                         raise KeyError(key)
                     else:
                         cursor.entry = page.get_entry(i - 1)
                         cursor.entry_number = i - 1
+                        return
             entry_number = page.entry_count - 1
             cursor.entry = page.get_entry(entry_number)
             cursor.entry_number = entry_number
@@ -488,7 +506,11 @@ class RoundDownMatchStrategy(FindStrategy):
                     if i == 0:
                         # may raise KeyError, and its meant to bubble all the
                         # way up.
-                        return self._find(cursor, page.ppointer, key)
+                        try:
+                            return self._find(cursor, page.ppointer, key)
+                        except KeyError:
+                            cursor.path = cursor.path[:-1]
+                            raise
                     else:
                         try:
                             entry = page.get_entry(i - 1)
@@ -591,6 +613,10 @@ class Cursor(object):
         Raises:
           IndexError: if the entry does not exist. the cursor is in an unknown state afterwards.
         '''
+        stats = self.index._stats
+        if stats is not None:
+            stats.incr('id0.cursor steps')
+
         current_page = self.path[-1]
         if current_page.is_leaf():
             if self.entry_number == current_page.entry_count - 1:
@@ -653,6 +679,10 @@ class Cursor(object):
         Raises:
           IndexError: if the entry does not exist. the cursor is in an unknown state afterwards.
         '''
+        stats = self.index._stats
+        if stats is not None:
+            stats.incr('id0.cursor steps')
+
         current_page = self.path[-1]
         if current_page.is_leaf():
             if self.entry_number == 0:
@@ -727,6 +757,10 @@ class Cursor(object):
         return self.entry.value
 
 
+# the number of locks over the b-tree page cache, when thread-safe.
+PAGE_LOCK_STRIPES = 0x10
+
+
 class ID0(vstruct.VStruct):
     '''
     a b-tree index.
@@ -750,6 +784,22 @@ class ID0(vstruct.VStruct):
         self.signature = v_bytes(size=0x09)
 
         self._page_cache = {}
+        # set by the database when stats are enabled. see `idb.stats`.
+        self._stats = None
+        # the locks that guard page loads, when thread-safe. see `.enable_threadsafe()`.
+        self._page_locks = None
+
+    def enable_threadsafe(self):
+        '''
+        guard the page cache so that many threads may search the index at once.
+
+        a page is decoded by one thread at a time, under a lock chosen by its page number,
+         and its entries are fully loaded before it is published to the cache,
+         so a cached page is never modified again.
+        cursors are not shared: each `.find()` returns a new cursor, which should stay on its thread.
+        '''
+        if self._page_locks is None:
+            self._page_locks = [threading.Lock() for _ in range(PAGE_LOCK_STRIPES)]
 
     def get_page_buffer(self, page_number):
         if page_number < 1:
@@ -761,12 +811,31 @@ class ID0(vstruct.VStruct):
     def get_page(self, page_number):
         page = self._page_cache.get(page_number, None)
         if page is not None:
+            if self._stats is not None:
+                self._stats.incr('id0.page cache hits')
             return page
 
+        if self._page_locks is not None:
+            with self._page_locks[page_number % PAGE_LOCK_STRIPES]:
+                # another thread may have loaded the page while we waited.
+                page = self._page_cache.get(page_number, None)
+                if page is not None:
+                    return page
+                return self._load_page(page_number)
+
+        return self._load_page(page_number)
+
+    def _load_page(self, page_number):
+        if self._stats is not None:
+            self._stats.incr('id0.page loads')
+
         buf = self.get_page_buffer(page_number)
         page = Page(self.page_size, page_number)
         page.vsParse(buf)
 
+        if self._page_locks is not None:
+            page._load_entries()
+
         self._page_cache[page_number] = page
         return page
 
@@ -785,6 +854,9 @@ class ID0(vstruct.VStruct):
         Raises:
           KeyError: if the match failes to find a result.
         '''
+        if self._stats is not None:
+            self._stats.incr('id0.find.' + strategy.__name__)
+
         c = Cursor(self)
         s = strategy()
         s.find(c, key)
@@ -814,6 +886,44 @@ class ID0(vstruct.VStruct):
         '''
         return self.find(None, strategy=MAX_KEY)
 
+    def iterate(self, start=None, end=None):
+        '''
+        generate the entries with keys in the range [start, end), in key order.
+        this is a single ordered traversal, rather than a search per key.
+
+        Args:
+          start (bytes): the least key to include. default: the minimum key.
+          end (bytes): the key at which to stop, exclusive. default: continue to the maximum key.
+
+        Yields:
+          Union[BranchEntry, LeafEntry]: the b-tree entries, each with `key` and `value` fields.
+        '''
+        if start is None:
+            cursor = self.get_min()
+        else:
+            try:
+                cursor = self.find(start, strategy=ROUND_DOWN_MATCH)
+            except KeyError:
+                # all the keys are greater than the start key.
+                cursor = self.get_min()
+            else:
+                if bytes(cursor.key) < start:
+                    try:
+                        cursor.next()
+                    except IndexError:
+                        return
+
+        while True:
+            entry = cursor.entry
+            if end is not None and bytes(entry.key) >= end:
+                return
+            yield entry
+
+            try:
+                cursor.next()
+            except IndexError:
+                return
+
     def validate(self):
         if self.signature != b'B-tree v2':
             raise ValueError('bad signature')
@@ -870,6 +980,12 @@ class ID1(vstruct.VStruct):
         self.padding = v_bytes()
         self.buffer = v_bytes()
 
+        # the segments ordered by start address, and their bounds as plain integers,
+        #  so that lookups can binary search rather than scan.
+        self._sorted_segments = []
+        self._segment_starts = []
+        self._segment_ends = []
+
     SegmentDescriptor = namedtuple('SegmentDescriptor', ['bounds', 'offset'])
 
     def pcb_segment_count(self):
@@ -886,6 +1002,11 @@ class ID1(vstruct.VStruct):
             segment_length = 4 * segment_byte_count  # each flag entry is a uint32 on all platforms
             self.segments.append(ID1.SegmentDescriptor(segment, offset))
             offset += segment_length
+
+        self._sorted_segments = sorted(self.segments, key=lambda s: s.bounds.start)
+        self._segment_starts = [s.bounds.start for s in self._sorted_segments]
+        self._segment_ends = [s.bounds.end for s in self._sorted_segments]
+
         offset = 0x14 + (self.segment_count * (2 * self.wordsize))
         padsize = ID1.PAGE_SIZE - offset
         self['padding'].vsSetLength(padsize)
@@ -893,6 +1014,18 @@ class ID1(vstruct.VStruct):
     def pcb_page_count(self):
         self['buffer'].vsSetLength(ID1.PAGE_SIZE * self.page_count)
 
+    def _find_segment_index(self, ea):
+        '''
+        find the index into the sorted segments of the segment that contains the given address.
+
+        Returns:
+          int: the index, or -1 if the given address is not in a segment.
+        '''
+        i = bisect.bisect_right(self._segment_starts, ea) - 1
+        if i >= 0 and ea < self._segment_ends[i]:
+            return i
+        return -1
+
     def get_segment(self, ea):
         '''
         find the segment that contains the given effective address.
@@ -903,10 +1036,53 @@ class ID1(vstruct.VStruct):
         Raises:
           KeyError: if the given address is not in a segment.
         '''
-        for segment in self.segments:
-            if segment.bounds.start <= ea < segment.bounds.end:
-                return segment
-        raise KeyError(ea)
+        i = self._find_segment_index(ea)
+        if i == -1:
+            raise KeyError(ea)
+        return self._sorted_segments[i]
+
+    def contains_address(self, ea):
+        '''
+        does the given effective address fall within a segment?
+
+        Returns:
+          bool: True if the address is in a segment.
+        '''
+        return self._find_segment_index(ea) != -1
+
+    def classify_addresses(self, eas):
+        '''
+        for a batch of effective addresses, decide which fall within a segment.
+
+        this is much cheaper than calling `get_segment` for each address,
+         particularly when the addresses are sorted, such as when they come from a B-tree scan,
+         since consecutive addresses usually fall within the same segment.
+
+        Arguments:
+          eas (Iterable[int]): the effective addresses.
+
+        Returns:
+          List[bool]: for each address, True if it falls within a segment.
+        '''
+        starts = self._segment_starts
+        ends = self._segment_ends
+
+        ret = []
+        # bounds of the segment that matched most recently.
+        start = end = 0
+        for ea in eas:
+            if start <= ea < end:
+                ret.append(True)
+                continue
+
+            i = bisect.bisect_right(starts, ea) - 1
+            if i >= 0 and ea < ends[i]:
+                start = starts[i]
+                end = ends[i]
+                ret.append(True)
+            else:
+                ret.append(False)
+        return ret
 
     def get_next_segment(self, ea):
         '''
@@ -922,15 +1098,16 @@ class ID1(vstruct.VStruct):
           IndexError: if no more segments are found after the given segment.
           KeyError: if the given effective address does not fall within a segment.
         '''
-        for i, segment in enumerate(self.segments):
-            if segment.bounds.start <= ea < segment.bounds.end:
-                if i == len(self.segments):
-                    # this is the last segment, there are no more.
-                    raise IndexError(ea)
-                else:
-                    # there's at least one more, and that's the next one.
-                    return self.segments[i + 1]
-        raise KeyError(ea)
+        i = self._find_segment_index(ea)
+        if i == -1:
+            raise KeyError(ea)
+
+        if i == len(self._sorted_segments) - 1:
+            # this is the last segment, there are no more.
+            raise IndexError(ea)
+        else:
+            # there's at least one more, and that's the next one.
+            return self._sorted_segments[i + 1]
 
     def get_flags(self, ea):
         '''
@@ -949,10 +1126,41 @@ class ID1(vstruct.VStruct):
         Raises:
           KeyError: if the given address does not fall within a segment.
         '''
-        seg = self.get_segment(ea)
-        offset = seg.offset + 4 * (ea - seg.bounds.start)
+        i = self._find_segment_index(ea)
+        if i == -1:
+            raise KeyError(ea)
+
+        offset = self._sorted_segments[i].offset + 4 * (ea - self._segment_starts[i])
         return struct.unpack_from('<I', self.buffer, offset)[0]
 
+    def get_flags_range(self, start, end):
+        '''
+        Fetch the flags for each address in the range [start, end) at once.
+
+        Arguments:
+          start (int): the first effective address.
+          end (int): the effective address at which to stop, exclusive.
+
+        Returns:
+          Tuple[int]: the flags for each address in the range.
+
+        Raises:
+          KeyError: if the start address does not fall within a segment.
+          IndexError: if the range extends beyond the segment.
+        '''
+        i = self._find_segment_index(start)
+        if i == -1:
+            raise KeyError(start)
+
+        if end > self._segment_ends[i]:
+            raise IndexError((start, end))
+
+        if end <= start:
+            return ()
+
+        offset = self._sorted_segments[i].offset + 4 * (start - self._segment_starts[i])
+        return struct.unpack_from('<%dI' % (end - start), self.buffer, offset)
+
     def validate(self):
         if self.signature != b'VA*\x00':
             raise ValueError('bad signature')
@@ -1059,7 +1267,13 @@ SECTIONS = [
 
 
 class IDB(vstruct.VStruct):
-    def __init__(self, buf):
+    def __init__(self, buf, stats=False, threadsafe=False):
+        '''
+        Args:
+          buf (bytes): the contents of the database file.
+          stats (bool): collect counters and timings of the parser operations. see `idb.stats`.
+          threadsafe (bool): support queries from many threads at once. see `idb.from_file`.
+        '''
         vstruct.VStruct.__init__(self)
         # we use a memoryview since we'll take a bunch of read-only subslices.
         self.buf = idb.memview(buf)
@@ -1077,6 +1291,21 @@ class IDB(vstruct.VStruct):
         self.til = None  # type: TIL
         self.id2 = None  # type: NotImplemented
 
+        # the file from which the database was loaded, if any. set by `idb.from_file`.
+        self.path = None
+
+        # derived indexes over the database, like the function table,
+        #  built on first use and keyed by name. see `idb.analysis.get_cached`.
+        self.caches = {}
+
+        # the instrumentation counters, or None when disabled.
+        self._stats = idb.stats.Stats() if stats else None
+
+        self.threadsafe = threadsafe
+        # guards the construction of the derived indexes, when thread-safe.
+        # reentrant, since some indexes are built from others.
+        self._cache_lock = threading.RLock() if threadsafe else None
+
         # these are the only true vstruct fields for this struct.
         self.header = FileHeader()
 
@@ -1105,6 +1334,9 @@ class IDB(vstruct.VStruct):
             section.vsParse(sectionbuf)
             self.sections.append(section)
 
+            if self._stats is not None and section.header.is_compressed:
+                self._stats.incr('sections.bytes decompressed', len(section.contents))
+
         for i, sectiondef in enumerate(SECTIONS):
             if i > len(self.sections):
                 logger.debug('missing section: %s', sectiondef.name)
@@ -1127,6 +1359,37 @@ class IDB(vstruct.VStruct):
             object.__setattr__(self, sectiondef.name, s)
             logger.debug('parsed section: %s', sectiondef.name)
 
+        if self.id0 is not None:
+            self.id0._stats = self._stats
+            if self.threadsafe:
+                self.id0.enable_threadsafe()
+
+    def stats(self):
+        '''
+        fetch the counters and timings collected since the database was opened,
+         or since the last call to `.reset_stats()`.
+        see `idb.stats` for the names.
+
+        Example::
+
+            with idb.from_file('ls.idb', stats=True) as db:
+                ...
+                print(db.stats()['counters']['id0.page loads'])
+
+        Returns:
+          Dict[str, Dict[str, Union[int, float]]]: the counters and timings, or None when stats are disabled.
+        '''
+        if self._stats is None:
+            return None
+        return self._stats.as_dict()
+
+    def reset_stats(self):
+        '''
+        zero the counters and timings, when stats are enabled.
+        '''
+        if self._stats is not None:
+            self._stats.reset()
+
     def validate(self):
         self.header.validate()
         self.id0.validate()
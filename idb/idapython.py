@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 import logging
+import threading
 import collections
 
 import six
 
+import idb.cfg
 import idb.netnode
 import idb.analysis
 
@@ -355,6 +357,70 @@ class ida_netnode:
         return idb.netnode.Netnode(self.idb, *args, **kwargs)
 
 
+# the text of a decoded instruction, from a capstone handle without instruction details.
+# this has the same fields as the corresponding members of `capstone.CsInsn`.
+LiteInsn = collections.namedtuple('LiteInsn', ['address', 'size', 'mnemonic', 'op_str'])
+
+# an instruction generated by `idc.iter_function_instructions`.
+Instruction = collections.namedtuple('Instruction', ['ea', 'size', 'bytes', 'mnemonic'])
+
+
+class _LRUCache(object):
+    '''
+    a mapping that holds at most `capacity` items, evicting the least recently used item.
+    '''
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = collections.OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        try:
+            value = self.items.pop(key)
+        except KeyError:
+            return default
+        # re-insert as the most recently used.
+        self.items[key] = value
+        return value
+
+    def put(self, key, value):
+        self.items.pop(key, None)
+        self.items[key] = value
+        if len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+
+class _LockedLRUCache(_LRUCache):
+    '''
+    an `_LRUCache` that may be used from many threads at once.
+    '''
+
+    def __init__(self, capacity):
+        super(_LockedLRUCache, self).__init__(capacity)
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            return super(_LockedLRUCache, self).get(key, default=default)
+
+    def put(self, key, value):
+        with self.lock:
+            return super(_LockedLRUCache, self).put(key, value)
+
+    def clear(self):
+        with self.lock:
+            return super(_LockedLRUCache, self).clear()
+
+
 class idc:
 
     SEGPERM_EXEC   = 1  # Execute
@@ -369,14 +435,44 @@ class idc:
     SFL_LOADER   = 0x10  # is the segment created by the loader?
     SFL_HIDETYPE = 0x20  # hide segment type (do not print it in the listing)
 
+    # the maximum number of decoded instructions to keep around.
+    INSN_CACHE_SIZE = 0x10000
+    # the maximum number of functions to remember as decoded, see `_disassemble`.
+    SWEPT_CACHE_SIZE = 0x1000
+    # the number of bytes handed to capstone at a time by `_sweep_range`.
+    # capstone decodes all the instructions in the bytes it's given before yielding the first,
+    #  so this bounds the work wasted each time the sweep restarts.
+    SWEEP_WINDOW_SIZE = 0x1000
+
     def __init__(self, db, api):
         self.idb = db
         self.api = api
         # these will be the capstone disassemblers, lazily loaded.
         # map from bitness (numbers 16, 32, and 64) to capstone disassembler instance
         self.bit_dis = None
+        # like `bit_dis`, but with instruction details disabled, for queries that only need text.
+        self.bit_dis_lite = None
         # map from tuple (segment start, end address) to capstone disassembler instance
         self.seg_dis = None
+        # the disassembler for each row of the segment table, see `_get_segments`.
+        self.dis_list = None
+        self.dis_lite_list = None
+        # where the above disassembler fields are stored.
+        # capstone handles should not be shared across threads,
+        #  so in thread-safe mode, each thread builds its own.
+        self._dis_state = threading.local() if db.threadsafe else self
+        cache_class = _LockedLRUCache if db.threadsafe else _LRUCache
+        # map from address to decoded capstone instruction.
+        # populated a function at a time, see `_disassemble`.
+        self.insn_cache = cache_class(self.INSN_CACHE_SIZE)
+        # map from address to LiteInsn, see `_disassemble_lite`.
+        self.lite_cache = cache_class(self.INSN_CACHE_SIZE)
+        # the start addresses of the functions already decoded into `insn_cache` and `lite_cache`,
+        #  so that addresses that never land in the caches don't decode their function again.
+        self.swept_cache = cache_class(self.SWEPT_CACHE_SIZE)
+        self.lite_swept_cache = cache_class(self.SWEPT_CACHE_SIZE)
+        # whether capstone decodes from a memoryview, which it does since v5.
+        self.dis_decodes_views = None
 
         # apparently this enum changes with bitness.
         # this is annoying.
@@ -485,11 +581,14 @@ class idc:
     def ScreenEA(self):
         return self.api.ScreenEA
 
+    def _get_segments(self):
+        return idb.analysis.get_cached(self.idb, 'segment table', idb.analysis.SegmentTable)
+
     def _get_segment(self, ea):
-        segs = idb.analysis.Segments(self.idb).segments
-        for seg in segs.values():
-            if seg.startEA <= ea < seg.endEA:
-                return seg
+        try:
+            return self._get_segments().get_segment(ea)
+        except KeyError:
+            return None
 
     def SegStart(self, ea):
         return self._get_segment(ea).startEA
@@ -498,20 +597,21 @@ class idc:
         return self._get_segment(ea).endEA
 
     def FirstSeg(self):
-        segs = idb.analysis.Segments(self.idb).segments
-        for startEA in sorted(segs.keys()):
-            return startEA
+        segs = self._get_segments()
+        if len(segs) > 0:
+            return segs.starts[0]
 
     def NextSeg(self, ea):
-        segs = idb.analysis.Segments(self.idb).segments.values()
-        segs = sorted(segs, key=lambda s: s.startEA)
+        segs = self._get_segments()
+        try:
+            i = segs.find(ea)
+        except KeyError:
+            return None
 
-        for i, seg in enumerate(segs):
-            if seg.startEA <= ea < seg.endEA:
-                if i < len(segs) - 1:
-                    return segs[i + 1].startEA
-                else:
-                    return self.BADADDR
+        if i < len(segs) - 1:
+            return segs.starts[i + 1]
+        else:
+            return self.BADADDR
 
     def SegName(self, ea):
         segstrings = idb.analysis.SegStrings(self.idb).strings
@@ -542,14 +642,10 @@ class idc:
             raise NotImplementedError('segment attribute %d not yet implemented' % (attr))
 
     def MinEA(self):
-        segs = idb.analysis.Segments(self.idb).segments.values()
-        segs = list(sorted(segs, key=lambda s: s.startEA))
-        return segs[0].startEA
+        return self._get_segments().starts[0]
 
     def MaxEA(self):
-        segs = idb.analysis.Segments(self.idb).segments.values()
-        segs = list(sorted(segs, key=lambda s: s.startEA))
-        return segs[-1].endEA
+        return self._get_segments().ends[-1]
 
     def GetFlags(self, ea):
         return self.idb.id1.get_flags(ea)
@@ -632,12 +728,15 @@ class idc:
             return bytes(ret)
 
     def _load_dis(self):
-        if self.seg_dis is not None:
+        state = self._dis_state
+        if getattr(state, 'dis_list', None) is not None:
             return
-        self.bit_dis = {}
-        self.seg_dis = {}
+        state.bit_dis = {}
+        state.bit_dis_lite = {}
+        state.seg_dis = {}
 
         import capstone
+        self.dis_decodes_views = getattr(capstone, 'CS_API_MAJOR', 0) >= 5
 
         PROC_CS_MAP = {
             # this is probably the only platform that is thoroughly tested in python-idb.
@@ -779,54 +878,325 @@ class idc:
         if cs_arch is None:
             raise NotImplementedError('disassembly not supported on arch: ' + procname)
 
-        for seg in idb.analysis.Segments(self.idb).segments.values():
+        segs = self._get_segments()
+        for seg in segs.segments:
             seg_range = (seg.startEA, seg.endEA)
             if seg.bitness == 0:
-                if 16 not in self.bit_dis:
-                    self.bit_dis[16] = capstone.Cs(cs_arch, capstone.CS_MODE_16)
-                    self.bit_dis[16].detail = True
-                self.seg_dis[seg_range] = self.bit_dis[16]
+                if 16 not in state.bit_dis:
+                    state.bit_dis[16] = capstone.Cs(cs_arch, capstone.CS_MODE_16)
+                    state.bit_dis[16].detail = True
+                state.seg_dis[seg_range] = state.bit_dis[16]
             elif seg.bitness == 1:
-                if 32 not in self.bit_dis:
-                    self.bit_dis[32] = capstone.Cs(cs_arch, capstone.CS_MODE_32)
-                    self.bit_dis[32].detail = True
-                self.seg_dis[seg_range] = self.bit_dis[32]
+                if 32 not in state.bit_dis:
+                    state.bit_dis[32] = capstone.Cs(cs_arch, capstone.CS_MODE_32)
+                    state.bit_dis[32].detail = True
+                state.seg_dis[seg_range] = state.bit_dis[32]
             elif seg.bitness == 2:
-                if 64 not in self.bit_dis:
-                    self.bit_dis[64] = capstone.Cs(cs_arch, capstone.CS_MODE_64)
-                    self.bit_dis[64].detail = True
-                self.seg_dis[seg_range] = self.bit_dis[64]
+                if 64 not in state.bit_dis:
+                    state.bit_dis[64] = capstone.Cs(cs_arch, capstone.CS_MODE_64)
+                    state.bit_dis[64].detail = True
+                state.seg_dis[seg_range] = state.bit_dis[64]
             else:
                 raise NotImplementedError('unknown bitness: %d' % (seg.bitness))
 
-    def _disassemble(self, ea):
-        size = self.ItemSize(ea)
-        buf = self.GetManyBytes(ea, size)
-        self._load_dis()
+        lite_dis = {}
+        for bitness, dis in state.bit_dis.items():
+            # detail is off by default.
+            state.bit_dis_lite[bitness] = capstone.Cs(dis.arch, dis.mode)
+            lite_dis[id(dis)] = state.bit_dis_lite[bitness]
+
+        # ordered like the rows of the segment table.
+        state.dis_list = [state.seg_dis[(seg.startEA, seg.endEA)] for seg in segs.segments]
+        state.dis_lite_list = [lite_dis[id(dis)] for dis in state.dis_list]
 
-        dis = None
-        for (seg_start, seg_end), dis in self.seg_dis.items():
-            if seg_start <= ea < seg_end:
-                break
+    def _get_dis(self, ea, lite=False):
+        '''
+        Args:
+          ea (int): the address to disassemble.
+          lite (bool): fetch the handle with instruction details disabled.
 
-        if dis is None:
+        Raises:
+          ValueError: if the address is not in a segment.
+        '''
+        self._load_dis()
+        state = self._dis_state
+
+        try:
+            i = self._get_segments().find(ea)
+        except KeyError:
             raise ValueError('failed to find ea in valid segment: ' + hex(ea))
 
+        if lite:
+            return state.dis_lite_list[i]
+        else:
+            return state.dis_list[i]
+
+    def _decode(self, dis, buf, ea, lite=False):
+        '''
+        generate the instructions decoded from the given buffer.
+        in lite mode, these are LiteInsn instances, otherwise `capstone.CsInsn`.
+        '''
+        if isinstance(buf, memoryview) and not self.dis_decodes_views:
+            buf = buf.tobytes()
+
+        if lite:
+            for insn in dis.disasm_lite(buf, ea):
+                yield LiteInsn._make(insn)
+        else:
+            for insn in dis.disasm(buf, ea):
+                yield insn
+
+    def _read_range(self, start, end):
+        '''
+        fetch the flags and bytes for the range [start, end) at once.
+        like `GetManyBytes`, bytes without a value are NULL.
+
+        Returns:
+          Tuple[Tuple[int], bytes]: the flags and the bytes.
+
+        Raises:
+          KeyError: if the range is not backed by flags.
+          IndexError: if the range is not backed by flags.
+        '''
+        flags = self.idb.id1.get_flags_range(start, end)
+        buf = bytes(bytearray([(f & FLAGS.MS_VAL) if f & FLAGS.FF_IVL else 0x0 for f in flags]))
+        return flags, buf
+
+    def _sweep_range(self, start, flags, buf, lite=False):
+        '''
+        generate the instructions at the code heads in the range fetched by `_read_range`.
+
+        this decodes with a linear sweep, which is restarted at the next code head
+         wherever capstone and the database disagree on an instruction boundary.
+        instructions are decoded from the same bytes as `_disassemble`,
+         so the results are identical.
+
+        Yields:
+          Union[capstone.CsInsn, LiteInsn]: the decoded instructions, LiteInsn only in lite mode.
+
+        Raises:
+          ValueError: if the range is not in a segment.
+        '''
+        end = start + len(flags)
+        dis = self._get_dis(start, lite=lite)
+        # slices of a view aren't copies.
+        # capstone decodes writable buffers in place, so the bytes are copied once, here.
+        view = memoryview(bytearray(buf))
+        window = self.SWEEP_WINDOW_SIZE
+
+        isCode = self.api.ida_bytes.isCode
+        isHead = self.api.ida_bytes.isHead
+        heads = [start + i for i, f in enumerate(flags) if isHead(f)]
+        codes = set([start + i for i, f in enumerate(flags) if isCode(f)])
+
+        # the size of the last item is only known if it ends at the range end.
+        closed = False
+        try:
+            if isHead(self.idb.id1.get_flags(end)):
+                heads.append(end)
+                closed = True
+        except KeyError:
+            pass
+
+        k = 0
+        while k < len(heads) - 1:
+            ea = heads[k]
+            if ea not in codes:
+                k += 1
+                continue
+
+            # when the window is exhausted, the sweep continues from the next head.
+            for insn in self._decode(dis, view[ea - start:ea - start + window], ea, lite=lite):
+                if k >= len(heads) - 1:
+                    break
+                if insn.address != heads[k] or heads[k] not in codes:
+                    break
+                if insn.size != heads[k + 1] - heads[k]:
+                    break
+                yield insn
+                k += 1
+
+            if k < len(heads) - 1 and heads[k] == ea:
+                # the sweep made no progress, so decode just this item.
+                size = heads[k + 1] - ea
+                insn = next(self._decode(dis, view[ea - start:ea - start + size], ea, lite=lite), None)
+                if insn is not None:
+                    yield insn
+                k += 1
+
+        if not closed and heads and heads[-1] in codes:
+            # the last item may extend past the range, such as at the end of a segment,
+            #  so decode it from the bytes that remain.
+            ea = heads[-1]
+            insn = next(self._decode(dis, view[ea - start:ea - start + window], ea, lite=lite), None)
+            if insn is not None:
+                yield insn
+
+    def _disassemble_range(self, start, end, lite=False):
+        '''
+        decode the instructions at the code heads in the range [start, end),
+         and add them to the instruction cache.
+        in lite mode, decode just the instruction text, and add them to the lite cache.
+        see `_sweep_range`.
+
+        Returns:
+          List[Union[capstone.CsInsn, LiteInsn]]: the decoded instructions.
+
+        Raises:
+          KeyError: if the range is not backed by flags.
+          IndexError: if the range is not backed by flags.
+          ValueError: if the range is not in a segment.
+        '''
+        flags, buf = self._read_range(start, end)
+        insns = list(self._sweep_range(start, flags, buf, lite=lite))
+
+        cache = self.lite_cache if lite else self.insn_cache
+        for insn in insns:
+            cache.put(insn.address, insn)
+
+        return insns
+
+    def iter_function_instructions(self, fva):
+        '''
+        generate the instructions of the function that starts at the given address,
+         from its body and then each of its tails.
+
+        the flags and bytes of each chunk are read into memory at once (see `_read_range`),
+         and decoded in a single linear sweep (see `_sweep_range`),
+         so this is much cheaper than walking the instructions via `NextHead` and `GetMnem`.
+        only the decoding is lazy: memory use is bounded by the largest chunk, not by a single instruction.
+        the instructions aren't added to the instruction caches.
+
+        Example::
+
+            for insn in idc.iter_function_instructions(0x401000):
+                print('%x %s' % (insn.ea, insn.mnemonic))
+
+        Args:
+          fva (int): the function start address.
+
+        Yields:
+          Instruction: the address, size, bytes, and mnemonic of each instruction.
+
+        Raises:
+          KeyError: if no function starts at the given address.
+        '''
+        funcs = idb.analysis.get_cached(self.idb, 'function table', idb.analysis.FunctionTable)
+        i = funcs.index(fva)
+        if funcs.is_tail(i):
+            raise KeyError(fva)
+
+        ranges = [(funcs.starts[i], funcs.ends[i])]
         try:
-            op = next(dis.disasm(buf, ea))
+            for chunk in idb.analysis.Function(self.idb, fva).get_chunks():
+                ranges.append((chunk.effective_address, chunk.effective_address + chunk.length))
+        except KeyError:
+            # no tails.
+            pass
+
+        for start, end in ranges:
+            flags, buf = self._read_range(start, end)
+            for insn in self._sweep_range(start, flags, buf, lite=True):
+                offset = insn.address - start
+                yield Instruction(insn.address, insn.size, buf[offset:offset + insn.size], insn.mnemonic)
+
+    def _disassemble(self, ea, lite=False):
+        '''
+        decode the instruction at the given address.
+
+        Args:
+          ea (int): the address of the instruction.
+          lite (bool): decode just the text of the instruction, which is much cheaper.
+
+        Returns:
+          Union[capstone.CsInsn, LiteInsn]: the instruction, a LiteInsn only in lite mode.
+        '''
+        op = self.insn_cache.get(ea)
+        if op is not None:
+            return op
+
+        cache = self.insn_cache
+        swept = self.swept_cache
+        if lite:
+            cache = self.lite_cache
+            swept = self.lite_swept_cache
+            op = cache.get(ea)
+            if op is not None:
+                return op
+
+        # decode the whole function, since callers tend to walk its instructions.
+        # this is done once per function, since some addresses never land in the cache,
+        #  like data within a function, or instructions evicted by a larger function.
+        # those are decoded one at a time, below.
+        try:
+            funcs = idb.analysis.get_cached(self.idb, 'function table', idb.analysis.FunctionTable)
+            i = funcs.find(ea)
+            if funcs.starts[i] not in swept:
+                swept.put(funcs.starts[i], True)
+                self._disassemble_range(funcs.starts[i], funcs.ends[i], lite=lite)
+        except (KeyError, IndexError, ValueError):
+            pass
+        else:
+            op = cache.get(ea)
+            if op is not None:
+                return op
+
+        size = self.ItemSize(ea)
+        buf = self.GetManyBytes(ea, size)
+        dis = self._get_dis(ea, lite=lite)
+
+        try:
+            op = next(self._decode(dis, buf, ea, lite=lite))
         except StopIteration:
             raise RuntimeError('failed to disassemble %s' % (hex(ea)))
         else:
+            cache.put(ea, op)
             return op
 
+    def _disassemble_lite(self, ea):
+        return self._disassemble(ea, lite=True)
+
     def GetMnem(self, ea):
-        op = self._disassemble(ea)
+        op = self._disassemble_lite(ea)
         return op.mnemonic
 
     def GetDisasm(self, ea):
-        op = self._disassemble(ea)
+        op = self._disassemble_lite(ea)
         return '%s\t%s' % (op.mnemonic, op.op_str)
 
+    def GetOpnd(self, ea, n):
+        '''
+        fetch the text of the given operand of the instruction at the given address.
+
+        Args:
+          ea (int): the address of the instruction.
+          n (int): the zero-based operand index.
+
+        Returns:
+          str: the operand text, or the empty string if there is no such operand.
+        '''
+        op = self._disassemble_lite(ea)
+
+        # split on the commas that aren't nested within a memory reference.
+        operands = []
+        depth = 0
+        last = 0
+        for i, c in enumerate(op.op_str):
+            if c in '[{(':
+                depth += 1
+            elif c in ']})':
+                depth -= 1
+            elif c == ',' and depth == 0:
+                operands.append(op.op_str[last:i].strip())
+                last = i + 1
+        if op.op_str:
+            operands.append(op.op_str[last:].strip())
+
+        if n < len(operands):
+            return operands[n]
+        else:
+            return ''
+
     # one instruction or data
     CIC_ITEM = 1
     # function
@@ -1378,7 +1748,7 @@ class ida_funcs:
         get the func_t associated with the given address.
         if the address is not the start of a function (or function tail), then searches
          for a function that contains the given address.
-        note: the range search is pretty slow, since we parse everything on-demand.
+        the search uses an index of function regions built once per database.
         '''
         nn = self.api.ida_netnode.netnode('$ funcs')
         try:
@@ -1388,16 +1758,10 @@ class ida_funcs:
             # according to [1], `get_func` only searches the primary region, and not all chunks?
             #
             # [1]: http://www.openrce.org/reference_library/ida_sdk_lookup/get_func
-            for func in idb.analysis.Functions(self.idb).functions.values():
-                if not (func.startEA <= ea < func.endEA):
-                    continue
-
-                if is_flag_set(func.flags, self.FUNC_TAIL):
-                    return self.get_func(func.owner)
-                else:
-                    return func
-
-            raise KeyError(ea)
+            funcs = idb.analysis.get_cached(self.idb, 'function table', idb.analysis.FunctionTable)
+            i = funcs.find(ea)
+            # for a function tail, this is the function that owns it.
+            return self.get_func(funcs.owners[i])
         else:
             func = idb.analysis.func_t(v, wordsize=self.idb.wordsize)
             if is_flag_set(func.flags, self.FUNC_TAIL):
@@ -1460,6 +1824,28 @@ class BasicBlock(object):
         return 'BasicBlock(startEA: 0x%x, endEA: 0x%x)' % (self.startEA, self.endEA)
 
 
+class _BlockSweep(object):
+    '''
+    basic block boundaries and flow computed by `idaapi._sweep_blocks` for the ranges of a function.
+    addresses that aren't present weren't swept, and should be handled by the general helpers.
+    '''
+
+    def __init__(self):
+        # map from block start to the address of the final instruction in the block.
+        self.ends_by_start = {}
+        # map from the address of the final instruction in a block to the block start.
+        self.starts_by_end = {}
+        # maps from head to the next/previous head, within a swept range.
+        self.next_heads = {}
+        self.prev_heads = {}
+        # map from head to its flags.
+        self.flags = {}
+        # map from head to the flow xrefs from it.
+        self.crefs_from = collections.defaultdict(list)
+        # map from head to the flow xrefs to it, whose sources may lie anywhere.
+        self.crefs_to = collections.defaultdict(list)
+
+
 def is_empty(s):
     for c in s:
         return False
@@ -1503,9 +1889,15 @@ class idaapi:
     # Informational (a derived java class references its base class informationally)
     dr_I = 5
 
+    # the maximum number of functions for which to keep the block sweep around.
+    SWEEP_CACHE_SIZE = 0x100
+
     def __init__(self, db, api):
         self.idb = db
         self.api = api
+        cache_class = _LockedLRUCache if db.threadsafe else _LRUCache
+        # map from function start to its `_BlockSweep`, see `_get_block_sweep`.
+        self.sweep_cache = cache_class(self.SWEEP_CACHE_SIZE)
 
     def _find_bb_end(self, ea):
         '''
@@ -1563,6 +1955,111 @@ class idaapi:
             if not self.api.ida_bytes.isFlow(flags):
                 return last_ea
 
+    def _get_flow_ranges(self, func):
+        '''
+        Returns:
+          List[Tuple[int, int]]: the address ranges [start, end) of the given function and its tails.
+        '''
+        ranges = [(func.startEA, func.endEA)]
+        try:
+            for chunk in idb.analysis.Function(self.idb, func.startEA).get_chunks():
+                ranges.append((chunk.effective_address, chunk.effective_address + chunk.length))
+        except (KeyError, ValueError):
+            # no tails, or we can't parse them.
+            pass
+        return ranges
+
+    def _sweep_blocks(self, func):
+        '''
+        compute the basic block boundaries within the given function and its tails
+         using one linear sweep over their flags and code references,
+         rather than stepping instruction by instruction with `NextHead`/`PrevHead`.
+
+        the boundaries match those found by `_find_bb_start` and `_find_bb_end`:
+         a block ends at an instruction with flow xrefs from it,
+         or when the following instruction is referenced, starts a function, or is not flowed into.
+
+        Returns:
+          _BlockSweep: the boundaries and intra-range flow.
+        '''
+        sweep = _BlockSweep()
+        flow_types = [self.fl_JN, self.fl_JF, self.fl_F]
+        ida_bytes = self.api.ida_bytes
+
+        def is_leader(flags):
+            return ida_bytes.hasRef(flags) or ida_bytes.isFunc(flags) or not ida_bytes.isFlow(flags)
+
+        for start, end in self._get_flow_ranges(func):
+            try:
+                flags = self.idb.id1.get_flags_range(start, end)
+            except (KeyError, IndexError):
+                # the range isn't backed by flags, so the general helpers will have to handle it.
+                continue
+
+            heads = [start + i for i, f in enumerate(flags) if ida_bytes.isHead(f)]
+            if not heads:
+                continue
+
+            crefs = idb.analysis.get_range_crefs(self.idb, start, end)
+            for xref in crefs.outgoing:
+                if xref.type in flow_types:
+                    sweep.crefs_from[xref.src].append(xref)
+            for xref in crefs.incoming:
+                if xref.type in flow_types:
+                    sweep.crefs_to[xref.dst].append(xref)
+
+            for i, ea in enumerate(heads):
+                sweep.flags[ea] = flags[ea - start]
+                if i > 0:
+                    sweep.prev_heads[ea] = heads[i - 1]
+                if i < len(heads) - 1:
+                    sweep.next_heads[ea] = heads[i + 1]
+
+            # whether the first head is a leader may depend on the instruction before the range.
+            block_start = heads[0] if is_leader(sweep.flags[heads[0]]) else None
+            leader = heads[0]
+            for i, ea in enumerate(heads):
+                if ea in sweep.crefs_from:
+                    is_terminal = True
+                elif i < len(heads) - 1:
+                    is_terminal = is_leader(sweep.flags[heads[i + 1]])
+                else:
+                    # the end of the final block may lie beyond the range.
+                    break
+
+                if not is_terminal:
+                    continue
+
+                sweep.ends_by_start[leader] = ea
+                if block_start is not None:
+                    sweep.starts_by_end[ea] = block_start
+
+                if i < len(heads) - 1:
+                    leader = heads[i + 1]
+                    block_start = leader
+
+        return sweep
+
+    def _get_block_sweep(self, ea):
+        '''
+        fetch the block sweep of the function that contains the given address,
+         so that flowcharts that reach into a neighboring function reuse its sweep.
+
+        Returns:
+          _BlockSweep: the sweep, or None if the address is not in a function.
+        '''
+        funcs = idb.analysis.get_cached(self.idb, 'function table', idb.analysis.FunctionTable)
+        try:
+            fva = funcs.owners[funcs.find(ea)]
+        except KeyError:
+            return None
+
+        sweep = self.sweep_cache.get(fva)
+        if sweep is None:
+            sweep = self._sweep_blocks(self.api.ida_funcs.get_func(fva))
+            self.sweep_cache.put(fva, sweep)
+        return sweep
+
     def _get_flow_preds(self, ea):
         # this is basically CodeRefsTo with flow=True.
         # need to fixup the return types, though.
@@ -1618,10 +2115,75 @@ class idaapi:
         # therefore, let's parse the basic blocks ourselves!
 
         class _FlowChart:
-            def __init__(self, db, api, ea):
+            def __init__(self, db, api, func, cfg=None):
                 self.idb = db
+                ea = func.startEA
+
+                if cfg is not None:
+                    self._load_cfg(cfg)
+                    return
+
                 logger.debug('creating flowchart for %x', ea)
 
+                sweep = api.idaapi.sweep_cache.get(ea)
+                if sweep is None:
+                    sweep = api.idaapi._sweep_blocks(func)
+                    api.idaapi.sweep_cache.put(ea, sweep)
+                ida_bytes = api.ida_bytes
+
+                def get_sweep(ea):
+                    # the blocks reached via flow xrefs may lie in other functions.
+                    if ea in sweep.flags:
+                        return sweep
+                    return api.idaapi._get_block_sweep(ea)
+
+                def find_bb_end(ea):
+                    s = get_sweep(ea)
+                    end = s.ends_by_start.get(ea) if s is not None else None
+                    if end is None:
+                        return api.idaapi._find_bb_end(ea)
+                    return end
+
+                def find_bb_start(ea):
+                    s = get_sweep(ea)
+                    start = s.starts_by_end.get(ea) if s is not None else None
+                    if start is None:
+                        return api.idaapi._find_bb_start(ea)
+                    return start
+
+                def get_flow_preds(ea):
+                    s = get_sweep(ea)
+                    if s is None or ea not in s.flags:
+                        for xref in api.idaapi._get_flow_preds(ea):
+                            yield xref
+                        return
+
+                    if ida_bytes.isFlow(s.flags[ea]):
+                        # prev instruction fell through to this insn
+                        if ea in s.prev_heads:
+                            prev_ea = s.prev_heads[ea]
+                        else:
+                            prev_ea = api.idc.PrevHead(ea)
+                        yield idb.analysis.Xref(prev_ea, ea, idaapi.fl_F)
+
+                    for xref in s.crefs_to.get(ea, []):
+                        yield xref
+
+                def get_flow_succs(ea):
+                    s = get_sweep(ea)
+                    if s is None or ea not in s.next_heads:
+                        for xref in api.idaapi._get_flow_succs(ea):
+                            yield xref
+                        return
+
+                    nextea = s.next_heads[ea]
+                    if ida_bytes.isFlow(s.flags[nextea]):
+                        # instruction falls through to next insn
+                        yield idb.analysis.Xref(ea, nextea, idaapi.fl_F)
+
+                    for xref in s.crefs_from.get(ea, []):
+                        yield xref
+
                 # set of startEA
                 seen = set([])
 
@@ -1635,55 +2197,45 @@ class idaapi:
                 # map from startEA to set of startEA
                 succs = collections.defaultdict(lambda: set([]))
 
-                endEA = api.idaapi._find_bb_end(ea)
+                endEA = find_bb_end(ea)
                 logger.debug('found end. %x -> %x', ea, endEA)
                 block = BasicBlock(self, ea, endEA)
                 bbs_by_start[ea] = block
                 bbs_by_end[endEA] = block
 
-                q = [block]
+                q = collections.deque([block])
 
                 while q:
-                    logger.debug('iteration')
-                    logger.debug('queue: [%s]', ', '.join(map(str, q)))
-
-                    block = q[0]
-                    q = q[1:]
-
-                    logger.debug('exploring %s', block)
+                    block = q.popleft()
 
                     if block.startEA in seen:
-                        logger.debug('already seen!')
                         continue
-                    logger.debug('new!')
                     seen.add(block.startEA)
 
-                    for xref in api.idaapi._get_flow_preds(block.startEA):
+                    logger.debug('exploring %s', block)
+
+                    for xref in get_flow_preds(block.startEA):
                         if xref.src not in bbs_by_end:
-                            pred_start = api.idaapi._find_bb_start(xref.src)
+                            pred_start = find_bb_start(xref.src)
                             pred = BasicBlock(self, pred_start, xref.src)
                             bbs_by_start[pred.startEA] = pred
                             bbs_by_end[pred.endEA] = pred
                         else:
                             pred = bbs_by_end[xref.src]
 
-                        logger.debug('pred: %s', pred)
-
                         preds[block.startEA].add(pred.startEA)
                         succs[pred.startEA].add(block.startEA)
                         q.append(pred)
 
-                    for xref in api.idaapi._get_flow_succs(block.endEA):
+                    for xref in get_flow_succs(block.endEA):
                         if xref.dst not in bbs_by_start:
-                            succ_end = api.idaapi._find_bb_end(xref.dst)
+                            succ_end = find_bb_end(xref.dst)
                             succ = BasicBlock(self, xref.dst, succ_end)
                             bbs_by_start[succ.startEA] = succ
                             bbs_by_end[succ.endEA] = succ
                         else:
                             succ = bbs_by_start[xref.dst]
 
-                        logger.debug('succ: %s', succ)
-
                         succs[block.startEA].add(succ.startEA)
                         preds[succ.startEA].add(block.startEA)
                         q.append(succ)
@@ -1692,36 +2244,50 @@ class idaapi:
                 self.succs = succs
                 self.bbs = bbs_by_start
 
+            def _load_cfg(self, cfg):
+                '''
+                populate the flowchart from a graph from the cfg cache.
+                '''
+                self.preds = collections.defaultdict(lambda: set([]))
+                self.succs = collections.defaultdict(lambda: set([]))
+                self.bbs = {}
+                for start, end in cfg.get_blocks():
+                    self.bbs[start] = BasicBlock(self, start, end)
+                for src, dst in cfg.get_edges():
+                    self.succs[src].add(dst)
+                    self.preds[dst].add(src)
+
             def __iter__(self):
                 for bb in self.bbs.values():
                     yield bb
 
-        return _FlowChart(self.idb, self.api, func.startEA)
+        # see `idb.cfg.enable_cfg_cache`.
+        cache = self.idb.caches.get('cfg cache')
+        if cache is None:
+            return _FlowChart(self.idb, self.api, func)
+
+        cfg = cache.get(func.startEA)
+        if cfg is not None:
+            return _FlowChart(self.idb, self.api, func, cfg=cfg)
+
+        fc = _FlowChart(self.idb, self.api, func)
+        cache.add(idb.cfg.CFG.from_flowchart(self.idb, func.startEA, fc))
+        return fc
+
+    def _get_fixups(self):
+        return idb.analysis.get_cached(self.idb, 'fixup index', idb.analysis.FixupIndex)
 
     def get_next_fixup_ea(self, ea):
-        nn = self.api.ida_netnode.netnode('$ fixups')
-        # TODO: this is really bad algorithmically. we should cache.
-        for index in nn.sups(tag='S'):
-            if ea <= index:
-                return index
-        raise KeyError(ea)
+        return self._get_fixups().get_next(ea)
+
+    def get_prev_fixup_ea(self, ea):
+        return self._get_fixups().get_prev(ea)
 
     def contains_fixups(self, ea, size):
-        try:
-            next_fixup = self.get_next_fixup_ea(ea)
-        except KeyError:
-            return False
-        else:
-            if next_fixup < ea + size:
-                return True
-            else:
-                return False
+        return self._get_fixups().contains(ea, size)
 
     def getseg(self, ea):
-        segs = idb.analysis.Segments(self.idb).segments
-        for seg in segs.values():
-            if seg.startEA <= ea < seg.endEA:
-                return seg
+        return self.api.idc._get_segment(ea)
 
     def get_segm_name(self, ea):
         return self.api.idc.SegName(ea)
@@ -1742,7 +2308,7 @@ class idautils:
         return self.api.idc.GetInputMD5()
 
     def Segments(self):
-        return sorted(idb.analysis.Segments(self.idb).segments.keys())
+        return list(self.api.idc._get_segments().starts)
 
     def Functions(self):
         ret = []
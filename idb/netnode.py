@@ -201,6 +201,9 @@ class Netnode(object):
             raise RuntimeError('unexpected wordsize')
 
         if isinstance(nodeid, six.string_types):
+            if self.idb._stats is not None:
+                self.idb._stats.incr('netnode.resolves')
+
             key = make_key(nodeid, wordsize=self.wordsize)
             cursor = self.idb.id0.find(key)
             self.nodeid = as_uint(cursor.value)
@@ -245,6 +248,9 @@ class Netnode(object):
         Yields:
           Entry: an entry (with key and value) under the given tag in this netnode.
         '''
+        if self.idb._stats is not None:
+            self.idb._stats.incr('netnode.scans')
+
         key = make_key(self.nodeid, tag, wordsize=self.wordsize)
 
         cursor = self.idb.id0.find_prefix(key)
@@ -268,6 +274,9 @@ class Netnode(object):
         Returns:
           bytes: the raw data.
         '''
+        if self.idb._stats is not None:
+            self.idb._stats.incr('netnode.values')
+
         key = make_key(self.nodeid, tag, index, wordsize=self.wordsize)
         cursor = self.idb.id0.find(key)
         return bytes(cursor.value)
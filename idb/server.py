@@ -0,0 +1,482 @@
+'''
+serve queries over a pool of opened databases.
+
+opening a large database, and warming its page cache and derived indexes, is expensive.
+this service keeps the most recently used databases open, and answers queries about them
+ over HTTP, so many tools can share the work, rather than each opening the same files.
+
+the front end is the HTTP server from the standard library.
+it accepts connections on the main thread, and queues them for a fixed pool of `--workers` threads,
+ which parse the requests and run the queries against databases opened in thread-safe mode
+ (see `idb.from_file`), so a slow query doesn't block the others.
+when all the workers are busy, and the queue is full, new connections wait in the listen backlog,
+ so the number of threads is bounded, however many clients connect.
+note that the workers share one interpreter, so the parsing of the B-trees is still serialized by the GIL:
+ the pool bounds the resources used, and overlaps I/O, but doesn't spread the parsing across cores.
+to do that, run a server per core, or use `idb.batch` for offline work.
+
+queries are HTTP GET requests, with the query name as the path and its parameters in the query string.
+integers may be decimal or hex, with a `0x` prefix.
+results are JSON documents like `{"result": ...}`, or `{"error": "..."}` with a 4xx/5xx status::
+
+    $ python -m idb.server --port 8080 &
+    $ curl 'http://127.0.0.1:8080/functions?path=/tmp/ls.idb'
+    {"result": [[134518444, ".init_proc"], ...]}
+    $ curl 'http://127.0.0.1:8080/netnode?path=/tmp/ls.idb&nodeid=Root+Node&tag=S&index=1302'
+    {"result": "49a4046a..."}
+
+the queries are:
+
+  - `functions`: the start address and name of each function.
+  - `segments`: the start address, end address, and name of each segment.
+  - `netnode`: the hex value of a netnode entry, given `nodeid` (address or name), `tag`, and `index`,
+     or when no index is given, pairs of index and hex value for each entry with the tag.
+  - `xrefs`: triples of (src, dst, type) for the references to or from `ea`,
+     given `direction` (to, from) and `kind` (code, data).
+  - `bytes`: the hex bytes in the range starting at `ea` of length `size`.
+
+`GET /` lists the queries and the open databases.
+
+the service opens any database named by a request, so by default it only listens on localhost,
+ or a unix socket, and may be restricted to the databases beneath a directory via `--root`.
+'''
+import os
+import sys
+import json
+import logging
+import argparse
+import binascii
+import threading
+import collections
+
+import six
+from six.moves import queue
+from six.moves import socketserver
+from six.moves import BaseHTTPServer
+from six.moves.urllib.parse import urlsplit
+from six.moves.urllib.parse import parse_qs
+
+import idb
+import idb.netnode
+import idb.analysis
+import idb.idapython
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+# the number of databases to keep open.
+DEFAULT_POOL_SIZE = 8
+# the number of threads on which to run queries.
+DEFAULT_WORKERS = 8
+# the number of accepted connections that may wait for a worker, per worker.
+QUEUE_DEPTH = 2
+# the largest range that may be fetched by the `bytes` query.
+MAX_BYTES_SIZE = 0x100000
+
+
+class DatabasePool(object):
+    '''
+    a set of opened databases, keyed by path, that evicts the least recently used database.
+    may be used from many threads at once.
+    '''
+
+    def __init__(self, capacity=DEFAULT_POOL_SIZE, root=None):
+        '''
+        Args:
+          capacity (int): the number of databases to keep open.
+          root (str): if provided, only databases beneath this directory may be opened,
+            and relative paths are resolved against it.
+        '''
+        self.capacity = capacity
+        self.root = os.path.realpath(root) if root else None
+        # map from path to database, least recently used first.
+        self.databases = collections.OrderedDict()
+        # map from path to lock held while the database is opened,
+        #  so that concurrent requests for a new database open it once.
+        self.opening = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, path):
+        '''
+        Returns:
+          str: the canonical path.
+
+        Raises:
+          ValueError: if the path is not beneath the root.
+        '''
+        if self.root is not None:
+            path = os.path.realpath(os.path.join(self.root, path))
+            rel = os.path.relpath(path, self.root)
+            if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+                raise ValueError('path not beneath root')
+            return path
+        return os.path.realpath(path)
+
+    def _open(self, path):
+        with open(path, 'rb') as f:
+            buf = f.read()
+        db = idb.from_buffer(buf, threadsafe=True)
+        db.path = path
+        logger.info('opened: %s', path)
+        return db
+
+    def get(self, path):
+        '''
+        fetch the opened database at the given path, opening it if necessary.
+
+        Raises:
+          ValueError: if the path is not beneath the root.
+          IOError: if the database cannot be read.
+        '''
+        path = self.resolve(path)
+
+        with self.lock:
+            db = self.databases.pop(path, None)
+            if db is not None:
+                # re-insert as the most recently used.
+                self.databases[path] = db
+                return db
+            opening = self.opening.setdefault(path, threading.Lock())
+
+        with opening:
+            with self.lock:
+                db = self.databases.get(path)
+            if db is not None:
+                # opened by another request while we waited.
+                return db
+
+            db = None
+            try:
+                db = self._open(path)
+            finally:
+                with self.lock:
+                    # on failure, too, so the next request tries again.
+                    self.opening.pop(path, None)
+                    if db is not None:
+                        self.databases[path] = db
+                        while len(self.databases) > self.capacity:
+                            evicted, _ = self.databases.popitem(last=False)
+                            logger.info('evicted: %s', evicted)
+            return db
+
+    def get_paths(self):
+        with self.lock:
+            return list(self.databases.keys())
+
+
+def get_api(db):
+    '''
+    fetch the IDAPython instance shared by the queries over the given database,
+     so that its disassembly caches are reused.
+    '''
+    return idb.analysis.get_cached(db, 'idapython', idb.idapython.IDAPython)
+
+
+def get_param(params, name, default=None):
+    try:
+        return params[name]
+    except KeyError:
+        if default is not None:
+            return default
+        raise ValueError('missing parameter: ' + name)
+
+
+def get_int_param(params, name, default=None):
+    v = get_param(params, name, default=default)
+    if isinstance(v, six.integer_types):
+        return v
+    try:
+        return int(v, 0)
+    except ValueError:
+        raise ValueError('invalid integer parameter: ' + name)
+
+
+def query_functions(db, params):
+    api = get_api(db)
+    return [[fva, api.idc.GetFunctionName(fva)] for fva in api.idautils.Functions()]
+
+
+def query_segments(db, params):
+    api = get_api(db)
+    return [[start, api.idc.SegEnd(start), api.idc.SegName(start)] for start in api.idautils.Segments()]
+
+
+def query_netnode(db, params):
+    nodeid = get_param(params, 'nodeid')
+    try:
+        nodeid = int(nodeid, 0)
+    except ValueError:
+        # a named netnode, like `Root Node`.
+        pass
+    tag = get_param(params, 'tag', default=idb.netnode.TAGS.SUPVAL)
+
+    nn = idb.netnode.Netnode(db, nodeid)
+    if 'index' in params:
+        return binascii.hexlify(nn.get_val(get_int_param(params, 'index'), tag=tag)).decode('ascii')
+    else:
+        return [[entry.parsed_key.index, binascii.hexlify(bytes(entry.value)).decode('ascii')]
+                for entry in nn.get_tag_entries(tag=tag)]
+
+
+def query_xrefs(db, params):
+    ea = get_int_param(params, 'ea')
+    direction = get_param(params, 'direction', default='to')
+    kind = get_param(params, 'kind', default='code')
+
+    getters = {
+        ('to', 'code'): idb.analysis.get_crefs_to,
+        ('from', 'code'): idb.analysis.get_crefs_from,
+        ('to', 'data'): idb.analysis.get_drefs_to,
+        ('from', 'data'): idb.analysis.get_drefs_from,
+    }
+    try:
+        getter = getters[(direction, kind)]
+    except KeyError:
+        raise ValueError('unexpected direction or kind')
+
+    return [[xref.src, xref.dst, xref.type] for xref in getter(db, ea)]
+
+
+def query_bytes(db, params):
+    ea = get_int_param(params, 'ea')
+    size = get_int_param(params, 'size')
+    if size < 0 or size > MAX_BYTES_SIZE:
+        raise ValueError('invalid size')
+
+    api = get_api(db)
+    if api.idaapi.getseg(ea) is None:
+        raise KeyError(ea)
+    return binascii.hexlify(api.idc.GetManyBytes(ea, size)).decode('ascii')
+
+
+# the queries available by name.
+QUERIES = {
+    'functions': query_functions,
+    'segments': query_segments,
+    'netnode': query_netnode,
+    'xrefs': query_xrefs,
+    'bytes': query_bytes,
+}
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # the `Server` that answers the queries, set on the subclass created by `Server.start`.
+    idb_server = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        name = url.path.strip('/')
+        params = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+        status, doc = self.idb_server.query(name, params)
+
+        body = json.dumps(doc).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # the client address of a unix socket is not a (host, port) pair.
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug('%s %s', self.address_string(), format % args)
+
+
+class _WorkerPoolMixIn:
+    '''
+    handle the requests accepted by a `socketserver` server on a fixed pool of threads,
+     rather than a thread per connection, like `socketserver.ThreadingMixIn`.
+    the server classes of py2 are old-style, so the subclasses call `_start_workers` and `_stop_workers`
+     from their constructor and `server_close`, rather than rely on `super`.
+    '''
+
+    def _start_workers(self, workers):
+        # the accepted connections, as tuples of (request, client address),
+        #  or None to stop a worker.
+        # once full, the accept loop blocks, and further connections wait in the listen backlog.
+        self.requests = queue.Queue(maxsize=workers * QUEUE_DEPTH)
+        self.workers = []
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name='idb-server-%d' % (i))
+            t.daemon = True
+            t.start()
+            self.workers.append(t)
+
+    def _stop_workers(self):
+        for _ in self.workers:
+            self.requests.put(None)
+        for t in self.workers:
+            t.join()
+        self.workers = []
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+    def _work(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                return
+
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+
+class _TCPServer(_WorkerPoolMixIn, BaseHTTPServer.HTTPServer):
+    def __init__(self, workers, *args, **kwargs):
+        BaseHTTPServer.HTTPServer.__init__(self, *args, **kwargs)
+        self._start_workers(workers)
+
+    def server_close(self):
+        self._stop_workers()
+        BaseHTTPServer.HTTPServer.server_close(self)
+
+
+class _UnixServer(_WorkerPoolMixIn, socketserver.UnixStreamServer):
+    def __init__(self, workers, *args, **kwargs):
+        socketserver.UnixStreamServer.__init__(self, *args, **kwargs)
+        self._start_workers(workers)
+
+    def server_close(self):
+        self._stop_workers()
+        socketserver.UnixStreamServer.server_close(self)
+
+
+class Server(object):
+    '''
+    answers HTTP queries over the databases in a pool.
+
+    Example::
+
+        server = Server(DatabasePool(capacity=4))
+        server.serve_forever(port=8080)
+    '''
+
+    def __init__(self, pool, workers=DEFAULT_WORKERS):
+        '''
+        Args:
+          pool (DatabasePool): the databases to query.
+          workers (int): the number of threads on which to handle requests.
+        '''
+        self.pool = pool
+        self.workers = workers
+
+    def query(self, name, params):
+        '''
+        answer the given query, on the calling thread.
+
+        Returns:
+          Tuple[int, Dict[str, Any]]: the HTTP status and the response document.
+        '''
+        if name == '':
+            return 200, {'result': {'queries': sorted(QUERIES.keys()),
+                                    'databases': self.pool.get_paths()}}
+
+        try:
+            q = QUERIES[name]
+        except KeyError:
+            return 404, {'error': 'unknown query: ' + name}
+
+        try:
+            db = self.pool.get(get_param(params, 'path'))
+            return 200, {'result': q(db, params)}
+        except (KeyError, IndexError) as e:
+            return 404, {'error': 'not found: %s' % (e)}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except (IOError, OSError) as e:
+            return 404, {'error': 'failed to open database: %s' % (e)}
+        except Exception as e:
+            logger.warning('query failed: %s %s: %s', name, params, e)
+            logger.debug('failure details:', exc_info=True)
+            return 500, {'error': '%s: %s' % (e.__class__.__name__, e)}
+
+    def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+        '''
+        bind to the given TCP address, or unix socket path, and start the worker threads.
+        requests are answered once `.serve_forever()` is called on the returned server.
+
+        Returns:
+          socketserver.BaseServer: the bound server. see `.server_address` for the bound address.
+        '''
+        idb_server = self
+
+        class RequestHandler(_RequestHandler):
+            pass
+        RequestHandler.idb_server = idb_server
+
+        if path is not None:
+            return _UnixServer(self.workers, path, RequestHandler)
+        else:
+            return _TCPServer(self.workers, (host, port), RequestHandler)
+
+    def serve_forever(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+        '''
+        listen on the given TCP address, or unix socket path, until interrupted.
+        '''
+        server = self.start(host=host, port=port, path=path)
+        logger.info('listening on %s', path or '%s:%d' % (host, port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Serve queries over IDA Pro databases.")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST,
+                        help="Address on which to listen")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="Port on which to listen")
+    parser.add_argument("--unix", type=str,
+                        help="Path of a unix socket on which to listen, rather than TCP")
+    parser.add_argument("--root", type=str,
+                        help="Only serve the idb files beneath this directory")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help="Number of idb files to keep open")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of threads on which to run queries")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable debug logging")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Disable all output but errors")
+    args = parser.parse_args(args=argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+        logging.getLogger().setLevel(logging.DEBUG)
+    elif args.quiet:
+        logging.basicConfig(level=logging.ERROR)
+        logging.getLogger().setLevel(logging.ERROR)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        logging.getLogger().setLevel(logging.INFO)
+        logging.getLogger('idb.netnode').setLevel(logging.ERROR)
+        logging.getLogger('idb.fileformat').setLevel(logging.ERROR)
+
+    pool = DatabasePool(capacity=args.pool_size, root=args.root)
+    server = Server(pool, workers=args.workers)
+    server.serve_forever(host=args.host, port=args.port, path=args.unix)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+'''
+share one opened database with many worker processes, without copying it into each.
+
+the sections of a database are typically compressed, so each process that opens it
+ would otherwise read and decompress the whole file into its own memory.
+instead, the parent process opens the database once, and writes an uncompressed image of it
+ into shared memory (`multiprocessing.shared_memory`, Python 3.8+), or into a file that's
+ memory mapped (elsewhere, or when a path is given).
+workers attach to the image via a small, picklable handle, and parse it in place:
+ the sections are slices of the shared pages, so only the headers are parsed upfront,
+ and the B-tree pages are decoded lazily, as usual.
+
+a worker keeps the database attached until it exits, or `detach()` is called,
+ so its page cache and derived indexes, like the function table,
+ are shared by all the tasks run by that worker.
+
+Example::
+
+    def get_name(args):
+        handle, fva = args
+        db = idb.shared.attach(handle)
+        return idb.IDAPython(db).idc.GetFunctionName(fva)
+
+    with idb.from_file('big.idb') as db:
+        fvas = idb.IDAPython(db).idautils.Functions()
+        with idb.shared.share(db) as handle:
+            pool = multiprocessing.Pool(8)
+            names = pool.map(get_name, [(handle, fva) for fva in fvas])
+'''
+import os
+import mmap
+import atexit
+import struct
+import logging
+import tempfile
+import contextlib
+from collections import namedtuple
+
+import six
+
+import idb
+import idb.fileformat
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # py2, and py3 before 3.8.
+    shared_memory = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# a reference to a shared database image, passed to the workers.
+#
+#   kind (str): 'shm' for shared memory, or 'mmap' for a memory mapped file.
+#   name (str): the name of the shared memory block, or the path to the image file.
+#   size (int): the size of the image, in bytes.
+#   path (str): the path from which the database was loaded, if any.
+SharedHandle = namedtuple('SharedHandle', ['kind', 'name', 'size', 'path'])
+
+
+def get_image_size(db):
+    '''
+    compute the size of the uncompressed image of the given database.
+
+    Returns:
+      int: the size, in bytes.
+    '''
+    size = struct.calcsize(idb.fileformat.FILE_HEADER_FORMAT)
+    for section in db.sections:
+        if section is None:
+            continue
+        size += struct.calcsize(idb.fileformat.SECTION_HEADER_FORMAT) + len(section.contents)
+    return size
+
+
+def write_image(db, buf):
+    '''
+    write an uncompressed image of the given database into the given buffer.
+    the image is a valid database, with each section stored without compression.
+
+    Args:
+      db (idb.IDB): the opened database.
+      buf (memoryview): the writable destination, at least `get_image_size(db)` bytes long.
+    '''
+    offset = struct.calcsize(idb.fileformat.FILE_HEADER_FORMAT)
+    offsets = []
+    for section in db.sections:
+        if section is None:
+            offsets.append(0x0)
+            continue
+
+        offsets.append(offset)
+        contents = section.contents
+        struct.pack_into(idb.fileformat.SECTION_HEADER_FORMAT, buf, offset,
+                         idb.fileformat.COMPRESSION_METHOD.NONE, len(contents))
+        offset += struct.calcsize(idb.fileformat.SECTION_HEADER_FORMAT)
+        buf[offset:offset + len(contents)] = contents
+        offset += len(contents)
+
+    header = db.header
+    # the checksums are not verified by the parser, so the originals are kept.
+    struct.pack_into(idb.fileformat.FILE_HEADER_FORMAT, buf, 0x0,
+                     bytes(header.signature), header.unk04,
+                     offsets[0], offsets[1],
+                     header.unk16, header.sig2, header.version,
+                     offsets[2], offsets[3], offsets[4],
+                     header.checksum1, header.checksum2, header.checksum3, header.checksum4, header.checksum5,
+                     offsets[5], header.checksum6)
+
+
+@contextlib.contextmanager
+def share(db, path=None):
+    '''
+    place an uncompressed image of the given database where worker processes can attach to it.
+    the image is removed when the context exits, so the workers should be done by then.
+
+    Example::
+
+        with idb.shared.share(db) as handle:
+            pool.map(work, [(handle, fva) for fva in fvas])
+
+    Args:
+      db (idb.IDB): the opened database.
+      path (str): if provided, write the image to this file, and have the workers map it,
+        rather than use shared memory. useful when the image should outlive this process.
+
+    Yields:
+      SharedHandle: the picklable reference from which workers attach.
+    '''
+    size = get_image_size(db)
+
+    if path is None and shared_memory is not None:
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            write_image(db, shm.buf)
+            logger.debug('shared database image: %s (%d bytes)', shm.name, size)
+            yield SharedHandle('shm', shm.name, size, db.path)
+        finally:
+            shm.close()
+            shm.unlink()
+        return
+
+    if path is None:
+        fd, image_path = tempfile.mkstemp(suffix='.idb')
+        os.close(fd)
+    else:
+        image_path = path
+
+    try:
+        with open(image_path, 'w+b') as f:
+            f.truncate(size)
+            m = mmap.mmap(f.fileno(), size)
+            try:
+                write_image(db, memoryview(m) if six.PY3 else m)
+            finally:
+                m.close()
+        logger.debug('shared database image: %s (%d bytes)', image_path, size)
+        yield SharedHandle('mmap', image_path, size, db.path)
+    finally:
+        if path is None:
+            os.remove(image_path)
+
+
+# map from handle to tuple of (shared memory or mmap, database), for the databases attached by this process.
+_attached = {}
+# the mappings detached while slices of them were still referenced.
+# these are kept alive, since closing them would fail, until the process exits.
+_unreleased = []
+
+
+def attach(handle, stats=False, threadsafe=False):
+    '''
+    open the shared database referenced by the given handle, without copying it.
+    the database is cached by this process, so repeated calls return the same instance.
+
+    Args:
+      handle (SharedHandle): the reference from `share()`.
+      stats (bool): collect counters and timings of the parser operations. see `idb.stats`.
+      threadsafe (bool): support queries from many threads at once. see `idb.from_file`.
+
+    Returns:
+      idb.IDB: the opened database.
+
+    Raises:
+      ValueError: if the handle is of an unknown kind.
+      IOError: if the image no longer exists.
+    '''
+    try:
+        return _attached[handle][1]
+    except KeyError:
+        pass
+
+    if handle.kind == 'shm':
+        if shared_memory is None:
+            raise ValueError('shared memory not supported')
+        mem = shared_memory.SharedMemory(name=handle.name)
+        buf = mem.buf[:handle.size]
+    elif handle.kind == 'mmap':
+        with open(handle.name, 'rb') as f:
+            mem = mmap.mmap(f.fileno(), handle.size, access=mmap.ACCESS_READ)
+        # on py2, slices of the mapping are copies, but only of the pages that are decoded.
+        buf = mem
+    else:
+        raise ValueError('unexpected handle kind: ' + handle.kind)
+
+    db = idb.from_buffer(buf, stats=stats, threadsafe=threadsafe)
+    db.path = handle.path
+    _attached[handle] = (mem, db)
+    logger.debug('attached shared database: %s', handle.name)
+    return db
+
+
+def detach(handle):
+    '''
+    drop this process's reference to the shared database referenced by the given handle.
+    the database must not be used afterwards.
+    '''
+    try:
+        mem, db = _attached.pop(handle)
+    except KeyError:
+        return
+
+    del db
+    try:
+        mem.close()
+    except BufferError:
+        # slices of the image are still referenced, such as by an `IDAPython` instance.
+        logger.debug('shared database still referenced: %s', handle.name)
+        _unreleased.append(mem)
+
+
+@atexit.register
+def _detach_all():
+    for handle in list(_attached.keys()):
+        detach(handle)
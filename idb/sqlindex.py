@@ -0,0 +1,249 @@
+'''
+build a SQLite database that indexes the contents of an IDA Pro database, for ad-hoc queries.
+
+the database is walked once, and the tables are:
+  - netnodes: nodeid, tag, idx, key, value, for each netnode record of the B-tree,
+     where `idx` is the word index, or NULL for records without one (like hashvals),
+     and `key` is the raw B-tree key,
+  - fixups: address, length,
+  - info: key, value, with the path, wordsize, and md5 of the input file,
+  - and the tables from `idb.export`: functions, segments, names, comments, xrefs, imports, and entrypoints.
+
+the columns that are commonly searched, like addresses and names, are indexed,
+ so repeated questions are answered by SQLite, rather than by parsing the B-tree each time.
+SQLite integers are signed 64-bit, so values of 2**63 and above, like the node ids of an .i64,
+ are stored as their two's complement.
+
+Example::
+
+    $ python -m idb.sqlindex ls.idb ls.sqlite
+    $ sqlite3 ls.sqlite
+    sqlite> -- which functions reference the import `malloc`?
+    sqlite> SELECT DISTINCT owner.name
+       ...>   FROM imports i
+       ...>   JOIN xrefs x ON x.dst = i.address
+       ...>   JOIN functions f ON f.start <= x.src AND x.src < f.end
+       ...>   JOIN functions owner ON owner.start = f.owner
+       ...>  WHERE i.name = 'malloc';
+
+Example::
+
+    with idb.from_file('ls.idb') as db:
+        idb.sqlindex.build_index(db, 'ls.sqlite')
+'''
+import os
+import sys
+import struct
+import logging
+import sqlite3
+import argparse
+
+import six
+
+import idb
+import idb.export
+import idb.analysis
+
+
+logger = logging.getLogger(__name__)
+
+
+# the number of rows to insert at a time.
+INSERT_BATCH_SIZE = 0x1000
+
+# the indexes to create, as tuples of (table, columns).
+INDEXES = (
+    ('netnodes', ('nodeid', 'tag', 'idx')),
+    ('fixups', ('address', )),
+    ('functions', ('start', )),
+    ('functions', ('name', )),
+    ('segments', ('start', )),
+    ('names', ('address', )),
+    ('names', ('name', )),
+    ('comments', ('address', )),
+    ('xrefs', ('src', )),
+    ('xrefs', ('dst', )),
+    ('imports', ('address', )),
+    ('imports', ('name', )),
+    ('entrypoints', ('address', )),
+)
+
+# the SQLite type of each `idb.export` column type.
+SQL_TYPES = {
+    'u1': 'INTEGER',
+    'u2': 'INTEGER',
+    'u4': 'INTEGER',
+    'u8': 'INTEGER',
+    idb.export.I64: 'INTEGER',
+    idb.export.BOOL: 'INTEGER',
+    idb.export.STR: 'TEXT',
+}
+
+
+def as_signed(v):
+    '''
+    convert the given unsigned 64-bit value into one that fits a SQLite integer.
+    '''
+    if v is not None and v >= 0x8000000000000000:
+        return v - 0x10000000000000000
+    return v
+
+
+def _insert_rows(conn, table, columns, rows):
+    conn.executemany('INSERT INTO %s (%s) VALUES (%s)' % (table, ', '.join(columns), ', '.join('?' * len(columns))),
+                     rows)
+
+
+def _insert_table(conn, name, table):
+    conn.execute('CREATE TABLE %s (%s)' % (name, ', '.join('%s %s' % (column, SQL_TYPES[type])
+                                                           for column, type in table.types.items())))
+
+    columns = []
+    for column, type in table.types.items():
+        values = table.columns[column]
+        if type == 'u8':
+            values = map(as_signed, values)
+        columns.append(values)
+
+    _insert_rows(conn, name, list(table.types.keys()), six.moves.zip(*columns))
+    logger.debug('wrote table: %s (%d rows)', name, len(table))
+
+
+class _NetnodeWriter(object):
+    '''
+    insert the netnode records visited by `idb.export.get_tables` into the `netnodes` table, in batches.
+    '''
+    def __init__(self, conn, wordsize):
+        self.conn = conn
+        self.wordsize = wordsize
+        if wordsize == 4:
+            self.wordformat = '>I'
+        elif wordsize == 8:
+            self.wordformat = '>Q'
+        else:
+            raise RuntimeError('unexpected wordsize')
+        self.count = 0
+        self.rows = []
+
+        conn.execute('CREATE TABLE netnodes (nodeid INTEGER, tag TEXT, idx INTEGER, key BLOB, value BLOB)')
+
+    def visit(self, key, value):
+        # like `idb.netnode.parse_key`, but tolerant of the keys without a tag or word index,
+        #  like the hashvals, which have a string index.
+        nodeid = None
+        tag = None
+        index = None
+        if len(key) >= 1 + self.wordsize:
+            nodeid = as_signed(struct.unpack_from(self.wordformat, key, 1)[0])
+        if len(key) >= 1 + self.wordsize + 1:
+            tag = chr(six.indexbytes(key, 1 + self.wordsize))
+        if len(key) == 1 + self.wordsize + 1 + self.wordsize:
+            index = as_signed(struct.unpack_from(self.wordformat, key, 1 + self.wordsize + 1)[0])
+
+        self.rows.append((nodeid, tag, index, sqlite3.Binary(key), sqlite3.Binary(bytes(value))))
+
+        if len(self.rows) >= INSERT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        _insert_rows(self.conn, 'netnodes', ('nodeid', 'tag', 'idx', 'key', 'value'), self.rows)
+        self.count += len(self.rows)
+        self.rows = []
+
+
+def build_index(db, path):
+    '''
+    write the SQLite index of the given database to the given path.
+
+    Args:
+      db (idb.IDB): the database.
+      path (str): the path of the SQLite database to create.
+
+    Raises:
+      ValueError: if the path already exists.
+    '''
+    if os.path.exists(path):
+        raise ValueError('path already exists')
+
+    conn = sqlite3.connect(path)
+    try:
+        # the file is written once, from scratch, so it needn't survive a crash mid-build.
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+
+        netnodes = _NetnodeWriter(conn, db.wordsize)
+        tables = idb.export.get_tables(db, visit=netnodes.visit)
+        netnodes.flush()
+        logger.debug('wrote table: netnodes (%d rows)', netnodes.count)
+
+        for name, table in tables.items():
+            _insert_table(conn, name, table)
+
+        fixups = idb.analysis.get_cached(db, 'fixup index', idb.analysis.FixupIndex)
+        conn.execute('CREATE TABLE fixups (address INTEGER, length INTEGER)')
+        _insert_rows(conn, 'fixups', ('address', 'length'),
+                     six.moves.zip(map(as_signed, fixups.addresses), fixups.lengths))
+
+        try:
+            md5 = idb.analysis.Root(db).md5
+        except KeyError:
+            md5 = None
+        conn.execute('CREATE TABLE info (key TEXT, value TEXT)')
+        _insert_rows(conn, 'info', ('key', 'value'), [
+            ('path', db.path),
+            ('wordsize', str(db.wordsize)),
+            ('md5', md5),
+        ])
+
+        # indexes are cheaper to build once the rows are in place.
+        for table, columns in INDEXES:
+            conn.execute('CREATE INDEX %s_%s ON %s (%s)' % (table, '_'.join(columns), table, ', '.join(columns)))
+
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Build a SQLite index of an IDA Pro database.")
+    parser.add_argument("idbpath", type=str,
+                        help="Path to input idb file")
+    parser.add_argument("output", type=str, nargs="?",
+                        help="Path to output SQLite file, default: the input path with a .sqlite suffix")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Overwrite the output file, if it exists")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable debug logging")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Disable all output but errors")
+    args = parser.parse_args(args=argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+        logging.getLogger().setLevel(logging.DEBUG)
+    elif args.quiet:
+        logging.basicConfig(level=logging.ERROR)
+        logging.getLogger().setLevel(logging.ERROR)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        logging.getLogger().setLevel(logging.INFO)
+
+    output = args.output or args.idbpath + '.sqlite'
+    if os.path.exists(output):
+        if not args.force:
+            logger.error('output already exists: %s', output)
+            return -1
+        os.remove(output)
+
+    with idb.from_file(args.idbpath) as db:
+        build_index(db, output)
+
+    logger.info('wrote index: %s', output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+'''
+opt-in counters and timers for the b-tree, netnode, and analysis layers.
+
+instrumentation is disabled by default, and then costs a single attribute check per operation.
+when enabled, the counters may be updated from many threads at once, such as in thread-safe mode.
+enable it when opening the database, so that the section parsing is counted too::
+
+    with idb.from_file('ls.idb', stats=True) as db:
+        api = idb.IDAPython(db)
+        list(api.idautils.Functions())
+        print(db.stats())
+        db.reset_stats()
+
+the counters are:
+
+  - `id0.page loads`: b-tree pages parsed from the section, that is, page cache misses.
+  - `id0.page cache hits`: b-tree pages served from the page cache.
+  - `id0.find.<strategy>`: searches of the b-tree, by strategy, like `id0.find.ExactMatchStrategy`.
+  - `id0.cursor steps`: calls to `Cursor.next()` and `Cursor.prev()`.
+  - `sections.bytes decompressed`: the size of the decompressed sections.
+  - `netnode.resolves`: lookups of netnodes by name.
+  - `netnode.values`: fetches of single netnode values, like `supval` and `altval`.
+  - `netnode.scans`: scans over the entries of a netnode tag, like `sups`.
+  - `caches.hits` and `caches.misses`: lookups of the derived indexes, see `idb.analysis.get_cached`.
+
+the timers, in seconds, are:
+
+  - `analysis.<netnode>.<field>`: time spent fetching and parsing each `_Analysis` field.
+'''
+import time
+import threading
+import collections
+
+
+class Stats(object):
+    '''
+    aggregate counts and durations, keyed by name.
+    may be used from many threads at once.
+    '''
+
+    def __init__(self):
+        self.counters = collections.Counter()
+        self.timings = collections.Counter()
+        # `+=` on a counter is a read and then a write, so concurrent updates would be lost.
+        self.lock = threading.Lock()
+
+    def incr(self, name, count=1):
+        with self.lock:
+            self.counters[name] += count
+
+    def add_time(self, name, duration):
+        with self.lock:
+            self.timings[name] += duration
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.timings.clear()
+
+    def as_dict(self):
+        '''
+        Returns:
+          Dict[str, Dict[str, Union[int, float]]]: a snapshot of the counters and timings.
+        '''
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'timings': dict(self.timings),
+            }
+
+
+class timer(object):
+    '''
+    context manager that adds the duration of its body to the given timer,
+     when stats are enabled.
+
+    Example::
+
+        with timer(db._stats, 'analysis.Root Node.md5'):
+            ...
+    '''
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        '''
+        Args:
+          stats (Stats): the stats, or None when disabled.
+          name (str): the name of the timer.
+        '''
+        self.stats = stats
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if self.stats is not None:
+            self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.stats is not None:
+            self.stats.add_time(self.name, time.time() - self.start)
+        return False
@@ -0,0 +1,455 @@
+'''
+write synthetic databases, for exercising the parser at scales beyond the test fixtures.
+
+the databases contain:
+  - an ID0 B-tree v2 index, with a configurable page size, built from any sorted records,
+  - an ID1 section with the flags for a configurable set of segments,
+  - a NAM section with a configurable set of named addresses, and
+  - a minimal TIL section.
+
+by default, the records are supvals of netnodes, one netnode per address,
+ and the flags describe initialized dwords.
+there are no analysis netnodes, like `Root Node` or `$ funcs`, so the higher level analyses don't apply;
+ these are for benchmarking and testing the ID0, ID1, and NAM sections.
+
+the records are streamed to disk, so databases with tens of millions of records may be generated
+ with modest memory.
+
+Example::
+
+    $ python -m idb.synth big.idb --records 10000000 --page-size 0x2000
+
+Example::
+
+    with open('deep.idb', 'wb') as f:
+        idb.synth.write_idb(f, generate_records(100000), page_size=0x100)
+'''
+import os
+import sys
+import array
+import random
+import struct
+import logging
+import argparse
+
+import six
+
+import idb.fileformat
+
+
+logger = logging.getLogger(__name__)
+
+
+# page zero of the ID0 section.
+ID0_HEADER_FORMAT = '<IHIIIB9s'
+# the fixed fields of the ID1 and NAM headers.
+VA_HEADER_FORMAT = '<4sIIII'
+
+PAGE_HEADER_SIZE = 0x6
+SIZEOF_ENTRY = idb.fileformat.SIZEOF_ENTRY
+
+FF_IVL = 0x100
+FF_DATA = 0x400
+FF_TAIL = 0x200
+
+
+def _common_prefix_length(a, b):
+    # the common prefix length is stored in a word.
+    return min(len(os.path.commonprefix([a, b])), 0xFFFF)
+
+
+def _leaf_entry_size(key, value, common_prefix):
+    return SIZEOF_ENTRY + 2 + len(key) - common_prefix + 2 + len(value)
+
+
+def _branch_entry_size(key, value):
+    return SIZEOF_ENTRY + 2 + len(key) + 2 + len(value)
+
+
+class BTreeWriter(object):
+    '''
+    writes the pages of a B-tree v2 index, bottom up, given records in key order.
+
+    leaves are filled greedily, and written as soon as they're full.
+    the record that would overflow a leaf is kept in the new leaf,
+     and the last record of the full leaf is promoted to separate the two, and so on up the tree.
+    '''
+
+    def __init__(self, f, page_size):
+        '''
+        Args:
+          f (file): the file to which to write pages, positioned at page one.
+          page_size (int): the size of each page.
+        '''
+        self.f = f
+        self.page_size = page_size
+        self.capacity = page_size - PAGE_HEADER_SIZE
+        self.page_count = 0
+        self.record_count = 0
+
+    def _write_page(self, ppointer, entries, is_leaf):
+        '''
+        Args:
+          ppointer (int): for a branch page, the child with keys less than the first entry.
+          entries (List[Tuple]): for a leaf, (key, value, common prefix length) triples,
+            for a branch, (key, value, page) triples.
+
+        Returns:
+          int: the page number.
+        '''
+        buf = bytearray(self.page_size)
+        struct.pack_into('<IH', buf, 0x0, ppointer, len(entries))
+
+        offset = PAGE_HEADER_SIZE + SIZEOF_ENTRY * len(entries)
+        for i, (key, value, extra) in enumerate(entries):
+            pointer_offset = PAGE_HEADER_SIZE + SIZEOF_ENTRY * i
+            if is_leaf:
+                struct.pack_into('<HHH', buf, pointer_offset, extra, 0x0, offset)
+                stored_key = key[extra:]
+            else:
+                struct.pack_into('<IH', buf, pointer_offset, extra, offset)
+                stored_key = key
+
+            struct.pack_into('<H', buf, offset, len(stored_key))
+            buf[offset + 2:offset + 2 + len(stored_key)] = stored_key
+            offset += 2 + len(stored_key)
+            struct.pack_into('<H', buf, offset, len(value))
+            buf[offset + 2:offset + 2 + len(value)] = value
+            offset += 2 + len(value)
+
+        if offset > self.page_size:
+            raise RuntimeError('page overflow')
+
+        self.f.write(bytes(buf))
+        self.page_count += 1
+        return self.page_count
+
+    def _write_leaves(self, records):
+        '''
+        Returns:
+          Tuple[List[int], List[Tuple[bytes, bytes]]]: the leaf page numbers, and the records that separate them.
+        '''
+        children = []
+        separators = []
+
+        group = []
+        used = 0
+        last_key = None
+        for key, value in records:
+            key = bytes(key)
+            value = bytes(value)
+            if last_key is not None and key <= last_key:
+                raise ValueError('records must be unique and sorted by key')
+            last_key = key
+            self.record_count += 1
+
+            # keys are stored relative to the previous key in the page, the first in full.
+            common_prefix = _common_prefix_length(group[-1][0], key) if group else 0
+            size = _leaf_entry_size(key, value, common_prefix)
+            if group and used + size > self.capacity:
+                if len(group) < 2:
+                    raise ValueError('page size too small for records')
+                separator_key, separator_value, _ = group.pop()
+                separators.append((separator_key, separator_value))
+                children.append(self._write_page(0, group, True))
+                group = []
+                common_prefix = 0
+                size = _leaf_entry_size(key, value, common_prefix)
+                used = 0
+
+            if size > self.capacity:
+                raise ValueError('record too large for page size')
+
+            group.append((key, value, common_prefix))
+            used += size
+
+        children.append(self._write_page(0, group, True))
+        return children, separators
+
+    def _write_branches(self, children, separators):
+        '''
+        write one level of branch pages over the given pages.
+
+        Returns:
+          Tuple[List[int], List[Tuple[bytes, bytes]]]: the branch page numbers, and the records that separate them.
+        '''
+        pages = []
+        promoted = []
+
+        ppointer = children[0]
+        group = []
+        used = 0
+        for (key, value), child in zip(separators, children[1:]):
+            size = _branch_entry_size(key, value)
+            if size > self.capacity:
+                raise ValueError('record too large for page size')
+
+            if group and used + size > self.capacity:
+                if len(group) < 2:
+                    raise ValueError('page size too small for records')
+                last_key, last_value, last_child = group.pop()
+                promoted.append((last_key, last_value))
+                pages.append(self._write_page(ppointer, group, False))
+                ppointer = last_child
+                group = []
+                used = 0
+
+            group.append((key, value, child))
+            used += size
+
+        pages.append(self._write_page(ppointer, group, False))
+        return pages, promoted
+
+    def write(self, records):
+        '''
+        write the index pages for the given records.
+
+        Args:
+          records (Iterable[Tuple[bytes, bytes]]): the (key, value) records, sorted by key.
+
+        Returns:
+          int: the root page number.
+
+        Raises:
+          ValueError: if the records are not sorted, or don't fit in the page size.
+        '''
+        children, separators = self._write_leaves(records)
+        while len(children) > 1:
+            children, separators = self._write_branches(children, separators)
+        return children[0]
+
+
+def generate_records(count, wordsize=4, base=0x400000, per_node=4, seed=0):
+    '''
+    generate supval records for netnodes at consecutive addresses,
+     with random values of between one and sixteen bytes.
+
+    Yields:
+      Tuple[bytes, bytes]: the records, sorted by key.
+    '''
+    r = random.Random(seed)
+    # values are slices of a pool of random bytes, which is much faster than drawing each byte.
+    pool = bytes(bytearray(r.getrandbits(8) for _ in range(0x1000)))
+    wordformat = 'I' if wordsize == 4 else 'Q'
+    fmt = '>c' + wordformat + 'c' + wordformat
+    for i in range(count):
+        key = struct.pack(fmt, b'.', base + i // per_node, b'S', i % per_node)
+        offset = r.randrange(len(pool) - 0x10)
+        value = pool[offset:offset + r.randint(1, 0x10)]
+        yield key, value
+
+
+def generate_flags(start, end):
+    '''
+    generate the flags for the given range, describing initialized dwords.
+
+    Returns:
+      array.array: the flags.
+    '''
+    flags = array.array('I')
+    for ea in range(start, end):
+        cls = FF_DATA if (ea - start) % 4 == 0 else FF_TAIL
+        flags.append(cls | FF_IVL | ((ea * 0x9E3779B1) >> 24) & 0xFF)
+    return flags
+
+
+def _write_section_header(f, length):
+    f.write(struct.pack(idb.fileformat.SECTION_HEADER_FORMAT, idb.fileformat.COMPRESSION_METHOD.NONE, length))
+
+
+def _write_id0(f, records, page_size):
+    start = f.tell()
+    _write_section_header(f, 0)
+    contents_start = f.tell()
+
+    # page zero is the header, which we'll fill in once the tree is written.
+    f.write(b'\x00' * page_size)
+    writer = BTreeWriter(f, page_size)
+    root = writer.write(records)
+    end = f.tell()
+
+    f.seek(contents_start)
+    f.write(struct.pack(ID0_HEADER_FORMAT,
+                        (writer.page_count + 1) * page_size,
+                        page_size,
+                        root,
+                        writer.record_count,
+                        writer.page_count,
+                        0x0,
+                        b'B-tree v2'))
+    f.seek(start)
+    _write_section_header(f, end - contents_start)
+    f.seek(end)
+    logger.debug('wrote %d records in %d pages', writer.record_count, writer.page_count)
+
+
+def _write_padding(f, length, page_size):
+    if length % page_size:
+        f.write(b'\x00' * (page_size - length % page_size))
+
+
+def _write_id1(f, segments, wordsize):
+    page_size = idb.fileformat.ID1.PAGE_SIZE
+    wordformat = '<I' if wordsize == 4 else '<Q'
+
+    header = struct.calcsize(VA_HEADER_FORMAT) + len(segments) * 2 * wordsize
+    if header > page_size:
+        raise ValueError('too many segments')
+
+    flags_length = sum(4 * (end - start) for start, end in segments)
+    page_count = (flags_length + page_size - 1) // page_size
+    _write_section_header(f, page_size + page_count * page_size)
+
+    f.write(struct.pack(VA_HEADER_FORMAT, b'VA*\x00', 0x3, len(segments), 0x800, page_count))
+    for start, end in segments:
+        f.write(struct.pack(wordformat, start))
+        f.write(struct.pack(wordformat, end))
+    f.write(b'\x00' * (page_size - header))
+
+    for start, end in segments:
+        # in chunks, so that large segments aren't materialized.
+        for chunk in range(start, end, 0x100000):
+            flags = generate_flags(chunk, min(end, chunk + 0x100000))
+            if sys.byteorder != 'little':
+                flags.byteswap()
+            f.write(flags.tobytes() if six.PY3 else flags.tostring())
+    _write_padding(f, flags_length, page_size)
+
+
+def _write_nam(f, names, wordsize):
+    page_size = idb.fileformat.NAM.PAGE_SIZE
+    wordformat = '<I' if wordsize == 4 else '<Q'
+
+    names_length = len(names) * wordsize
+    page_count = (names_length + page_size - 1) // page_size
+    _write_section_header(f, page_size + page_count * page_size)
+
+    header = struct.pack(VA_HEADER_FORMAT, b'VA*\x00', 0x3, 0x1 if names else 0x0, 0x800, page_count)
+    header += struct.pack(wordformat, 0x0)
+    # the number of dwords used by the names.
+    header += struct.pack('<I', names_length // 4)
+    f.write(header)
+    f.write(b'\x00' * (page_size - len(header)))
+
+    for ea in names:
+        f.write(struct.pack(wordformat, ea))
+    _write_padding(f, names_length, page_size)
+
+
+def _write_til(f):
+    contents = b'IDATIL' + b'\x00' * 0x1A
+    _write_section_header(f, len(contents))
+    f.write(contents)
+
+
+def write_idb(f, records, wordsize=4, page_size=0x2000, segments=(), names=()):
+    '''
+    write a synthetic database to the given file.
+
+    Args:
+      f (file): the seekable output file.
+      records (Iterable[Tuple[bytes, bytes]]): the ID0 (key, value) records, sorted by key.
+      wordsize (int): 4 for an .idb, 8 for an .i64.
+      page_size (int): the ID0 page size.
+      segments (Sequence[Tuple[int, int]]): the [start, end) ranges for which to write flags.
+      names (Sequence[int]): the named addresses, sorted.
+
+    Raises:
+      ValueError: if the records are not sorted, or don't fit in the page size.
+    '''
+    if wordsize == 4:
+        signature = b'IDA1'
+    elif wordsize == 8:
+        signature = b'IDA2'
+    else:
+        raise ValueError('unexpected wordsize')
+
+    start = f.tell()
+    f.write(b'\x00' * struct.calcsize(idb.fileformat.FILE_HEADER_FORMAT))
+
+    offsets = []
+    for write in (lambda: _write_id0(f, records, page_size),
+                  lambda: _write_id1(f, segments, wordsize),
+                  lambda: _write_nam(f, names, wordsize),
+                  lambda: _write_til(f)):
+        offsets.append(f.tell() - start)
+        write()
+    end = f.tell()
+
+    id0, id1, nam, til = offsets
+    f.seek(start)
+    # the section checksums are not verified by the parser, so they're left zero.
+    f.write(struct.pack(idb.fileformat.FILE_HEADER_FORMAT,
+                        signature, 0x0,
+                        id0, id1,
+                        0x0, 0xAABBCCDD, 0x6,
+                        nam, 0x0, til,
+                        0x0, 0x0, 0x0, 0x0, 0x0,
+                        0x0, 0x0))
+    f.seek(end)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Write a synthetic IDA Pro database.")
+    parser.add_argument("output", type=str,
+                        help="Path to output idb file")
+    parser.add_argument("--records", type=int, default=1000000,
+                        help="Number of ID0 records")
+    parser.add_argument("--page-size", type=lambda s: int(s, 0), default=0x2000,
+                        help="ID0 page size")
+    parser.add_argument("--wordsize", type=int, choices=(4, 8), default=4,
+                        help="Word size, 4 for an .idb, 8 for an .i64")
+    parser.add_argument("--segments", type=int, default=1,
+                        help="Number of ID1 segments")
+    parser.add_argument("--segment-size", type=lambda s: int(s, 0), default=0x100000,
+                        help="Size of each ID1 segment")
+    parser.add_argument("--names", type=int, default=10000,
+                        help="Number of named addresses")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for the record values")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable debug logging")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Disable all output but errors")
+    args = parser.parse_args(args=argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+        logging.getLogger().setLevel(logging.DEBUG)
+    elif args.quiet:
+        logging.basicConfig(level=logging.ERROR)
+        logging.getLogger().setLevel(logging.ERROR)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        logging.getLogger().setLevel(logging.INFO)
+
+    base = 0x400000
+    # leave a gap between segments.
+    stride = args.segment_size + 0x1000
+    segments = [(base + i * stride, base + i * stride + args.segment_size) for i in range(args.segments)]
+
+    names = []
+    if args.names:
+        total = args.segments * args.segment_size
+        step = max(1, total // args.names)
+        for i in range(0, total, step)[:args.names]:
+            seg = i // args.segment_size
+            names.append(segments[seg][0] + i % args.segment_size)
+
+    records = generate_records(args.records, wordsize=args.wordsize, base=base, seed=args.seed)
+    with open(args.output, 'wb') as f:
+        write_idb(f, records,
+                  wordsize=args.wordsize,
+                  page_size=args.page_size,
+                  segments=segments,
+                  names=names)
+
+    logger.info('wrote %s', args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+'''
+record the latency of the emulated IDAPython API calls.
+
+a `Tracer` wraps the public functions of the shim modules of an `IDAPython` instance,
+ like `idc.GetMnem` and `ida_funcs.get_func`, and records the call count and durations of each.
+calls between shim functions are nested, so the profile can be rendered as a flame graph.
+generators, like `idautils.Functions()`, are timed as they're consumed.
+
+Example::
+
+    api = idb.IDAPython(db)
+    tracer = idb.tracing.Tracer()
+    tracer.install(api)
+    ...
+    for row in tracer.get_report():
+        print(row['name'], row['count'], row['total'])
+
+    # see: https://github.com/brendangregg/FlameGraph
+    with open('trace.folded', 'w') as f:
+        tracer.write_folded(f)
+
+the tracer keeps a single call stack, so it should be used from one thread at a time.
+'''
+import time
+import types
+import random
+import functools
+import collections
+
+
+# the number of durations kept per function, from which percentiles are estimated.
+RESERVOIR_SIZE = 0x10000
+
+
+class FunctionStats(object):
+    '''
+    the call count, and the inclusive and exclusive durations, of a traced function.
+    '''
+    __slots__ = ('count', 'total', 'self_total', 'max', 'samples', '_random')
+
+    def __init__(self):
+        self.count = 0
+        # inclusive of nested shim calls.
+        self.total = 0.0
+        # exclusive of nested shim calls.
+        self.self_total = 0.0
+        self.max = 0.0
+        # a uniform sample of the durations, see `RESERVOIR_SIZE`.
+        self.samples = []
+        self._random = random.Random(0)
+
+    def add(self, duration, self_duration):
+        self.count += 1
+        self.total += duration
+        self.self_total += self_duration
+        if duration > self.max:
+            self.max = duration
+
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(duration)
+        else:
+            i = self._random.randrange(self.count)
+            if i < RESERVOIR_SIZE:
+                self.samples[i] = duration
+
+    def get_percentile(self, p):
+        '''
+        Args:
+          p (float): the percentile, from 0 to 100.
+
+        Returns:
+          float: the duration at the given percentile, in seconds.
+        '''
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+
+
+class _Frame(object):
+    __slots__ = ('name', 'start', 'children')
+
+    def __init__(self, name, start):
+        self.name = name
+        self.start = start
+        # the time spent in nested shim calls.
+        self.children = 0.0
+
+
+class Tracer(object):
+    def __init__(self, clock=time.time):
+        '''
+        Args:
+          clock (Callable[[], float]): the source of timestamps, in seconds.
+        '''
+        self.clock = clock
+        self.functions = collections.defaultdict(FunctionStats)
+        # map from tuple of function names, outermost first, to exclusive duration.
+        self.stacks = collections.defaultdict(float)
+        self._stack = []
+        # the (module, name) pairs wrapped by `.install()`.
+        self._installed = []
+
+    def _enter(self, name):
+        self._stack.append(_Frame(name, self.clock()))
+
+    def _exit(self, record=True):
+        '''
+        Args:
+          record (bool): add the call to the function stats.
+
+        Returns:
+          Tuple[float, float]: the inclusive and exclusive duration of the call.
+        '''
+        end = self.clock()
+        frame = self._stack.pop()
+        duration = end - frame.start
+        self_duration = duration - frame.children
+
+        if record:
+            self.functions[frame.name].add(duration, self_duration)
+        self.stacks[tuple(f.name for f in self._stack) + (frame.name, )] += self_duration
+        if self._stack:
+            self._stack[-1].children += duration
+        return duration, self_duration
+
+    def _trace_generator(self, name, gen):
+        # each step is timed in the context of its consumer,
+        #  and the steps are recorded as a single call once the generator is done.
+        total = 0.0
+        self_total = 0.0
+        try:
+            while True:
+                self._enter(name)
+                try:
+                    v = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    duration, self_duration = self._exit(record=False)
+                    total += duration
+                    self_total += self_duration
+                yield v
+        finally:
+            self.functions[name].add(total, self_total)
+
+    def wrap(self, name, f):
+        '''
+        wrap the given function so its calls are recorded under the given name.
+
+        Returns:
+          callable: the wrapped function.
+        '''
+        @functools.wraps(f)
+        def traced(*args, **kwargs):
+            self._enter(name)
+            try:
+                ret = f(*args, **kwargs)
+            except BaseException:
+                # failed lookups raise KeyError, and these are still calls.
+                self._exit()
+                raise
+
+            if isinstance(ret, types.GeneratorType):
+                self._exit(record=False)
+                return self._trace_generator(name, ret)
+            else:
+                self._exit()
+                return ret
+
+        traced.__wrapped__ = f
+        return traced
+
+    def install(self, api):
+        '''
+        wrap the public functions of each of the shim modules of the given `IDAPython` instance.
+
+        Args:
+          api (idb.IDAPython): the instance to trace.
+        '''
+        for modname, mod in sorted(vars(api).items()):
+            if modname in ('idb', 'ScreenEA') or mod is None:
+                continue
+
+            for name in dir(mod):
+                if name.startswith('_'):
+                    continue
+
+                f = getattr(mod, name)
+                # constants, and classes like `idaapi.BasicBlock`, are left as-is.
+                if isinstance(f, type) or not callable(f):
+                    continue
+
+                setattr(mod, name, self.wrap(modname + '.' + name, f))
+                self._installed.append((mod, name))
+
+    def uninstall(self):
+        '''
+        remove the wrappers added by `.install()`.
+        '''
+        for mod, name in self._installed:
+            try:
+                delattr(mod, name)
+            except AttributeError:
+                continue
+        self._installed = []
+
+    def reset(self):
+        self.functions.clear()
+        self.stacks.clear()
+
+    def get_report(self):
+        '''
+        summarize the latency of each traced function, slowest first.
+
+        Returns:
+          List[Dict[str, Union[str, int, float]]]: for each function, the name, count,
+            total (inclusive) and self (exclusive) seconds, and percentile and max latency in seconds.
+        '''
+        rows = []
+        for name, stats in self.functions.items():
+            rows.append({
+                'name': name,
+                'count': stats.count,
+                'total': stats.total,
+                'self': stats.self_total,
+                'p50': stats.get_percentile(50),
+                'p90': stats.get_percentile(90),
+                'p99': stats.get_percentile(99),
+                'max': stats.max,
+            })
+        return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+    def format_report(self, limit=None):
+        '''
+        Returns:
+          str: the report as a table, for display.
+        '''
+        header = ('function', 'count', 'total(s)', 'self(s)', 'p50(us)', 'p99(us)', 'max(us)')
+        lines = ['%-36s %10s %10s %10s %10s %10s %10s' % header]
+        for row in self.get_report()[:limit]:
+            lines.append('%-36s %10d %10.4f %10.4f %10.1f %10.1f %10.1f' % (
+                row['name'], row['count'], row['total'], row['self'],
+                row['p50'] * 1e6, row['p99'] * 1e6, row['max'] * 1e6))
+        return '\n'.join(lines)
+
+    def write_folded(self, f):
+        '''
+        write the exclusive time of each call stack, in microseconds, in the "folded" format
+         consumed by `flamegraph.pl` and speedscope::
+
+            idc.GetDisasm;idc.GetMnem 1234
+        '''
+        for stack, duration in sorted(self.stacks.items()):
+            f.write('%s %d\n' % (';'.join(stack), int(duration * 1e6)))
@@ -14,6 +14,7 @@ import importlib.util
 import argparse
 
 import idb
+import idb.tracing
 
 
 logger = logging.getLogger(__name__)
@@ -68,6 +69,8 @@ def main(argv=None):
                         help="Disable all output but errors")
     parser.add_argument("--ScreenEA", type=str,
                         help="Prepare value of ScreenEA()")
+    parser.add_argument("--trace", type=str,
+                        help="Record the latency of each API call, and write a flame graph profile to this path")
     args = parser.parse_args(args=argv)
 
     if args.verbose:
@@ -95,6 +98,11 @@ def main(argv=None):
 
         api = idb.IDAPython(db, ScreenEA=screenea)
 
+        tracer = None
+        if args.trace:
+            tracer = idb.tracing.Tracer()
+            tracer.install(api)
+
         hooks = {
             'idc': api.idc,
             'idaapi': api.idaapi,
@@ -118,7 +126,14 @@ def main(argv=None):
                 '__name__': '__main__',
             }
             g.update(hooks)
-            exec(f.read(), g)
+            try:
+                exec(f.read(), g)
+            finally:
+                if tracer is not None:
+                    logger.info('api latency:\n%s', tracer.format_report(limit=0x20))
+                    with open(args.trace, 'w') as trace_file:
+                        tracer.write_folded(trace_file)
+                    logger.info('wrote flame graph profile: %s', args.trace)
 
     return 0
 
@@ -27,6 +27,24 @@ def lpluck(prop, s):
     return list(pluck(prop, s))
 
 
+def test_unpack():
+    # one, two, four, and five byte encodings.
+    buf = b'\x01' + b'\x81\x02' + b'\xC1\x02\x03\x04' + b'\xFF\x01\x02\x03\x04'
+
+    assert idb.analysis.unpack_dd(buf) == (0x1, 1)
+    assert idb.analysis.unpack_dd(buf, offset=1) == (0x102, 2)
+    assert idb.analysis.unpack_dd(buf, offset=3) == (0x1020304, 4)
+    assert idb.analysis.unpack_dd(buf, offset=7) == (0x1020304, 5)
+    assert idb.analysis.unpack_dq(buf, offset=3) == (0x0102030401020304, 9)
+
+    assert list(idb.analysis.decode_dds(buf)) == [0x1, 0x102, 0x1020304, 0x1020304]
+    assert list(idb.analysis.decode_dds(memoryview(buf))) == list(idb.analysis.unpack_dds(buf))
+    assert list(idb.analysis.decode_dqs(buf)) == [0x0000010200000001, 0x0102030401020304]
+
+    with pytest.raises(IndexError):
+        idb.analysis.decode_dds(buf[:-1])
+
+
 @kern32_test()
 def test_root(kernel32_idb, version, bitness, expected):
     root = idb.analysis.Root(kernel32_idb)
@@ -107,6 +125,58 @@ def test_functions(kernel32_idb, version, bitness, expected):
     assert len(funcs) == expected
 
 
+@kern32_test()
+def test_lazy_functions(kernel32_idb, version, bitness, expected):
+    funcs = idb.analysis.Functions(kernel32_idb).functions
+    assert isinstance(funcs, idb.analysis.FieldMapping)
+
+    # point lookups, without enumerating the other functions.
+    assert 0x68901695 in funcs
+    assert 0x68901695 + 1 not in funcs
+    assert funcs[0x68901695].endEA == 0x689016B0
+    assert funcs.get(0x68901695 + 1) is None
+    with pytest.raises(KeyError):
+        _ = funcs[0x68901695 + 1]
+
+    # ordered range scan.
+    addrs = list(funcs.keys())
+    assert addrs == sorted(addrs)
+    assert addrs == [ea for ea, _ in funcs.items()]
+    assert len(funcs) == len(addrs)
+
+
+@kern32_test()
+def test_function_table(kernel32_idb, version, bitness, expected):
+    funcs = idb.analysis.Functions(kernel32_idb).functions
+    table = idb.analysis.FunctionTable(kernel32_idb)
+
+    assert len(table) == len(funcs)
+    assert list(table.starts) == list(funcs.keys())
+
+    i = table.index(0x68901695)
+    assert table.ends[i] == 0x689016B0
+    assert not table.is_tail(i)
+    assert table.owners[i] == 0x68901695
+
+    with pytest.raises(KeyError):
+        table.index(0x68901695 + 1)
+
+
+def test_function_tails(elf_idb):
+    funcs = idb.analysis.Functions(elf_idb).functions
+
+    # this tail precedes the function that owns it.
+    tail = funcs[0x804bf50]
+    assert tail.flags & idb.analysis.func_t.FUNC_TAIL
+    assert tail.owner == 0x804bfb0
+    assert tail.owner in funcs
+
+    table = idb.analysis.FunctionTable(elf_idb)
+    i = table.index(0x804bf50)
+    assert table.is_tail(i)
+    assert table.owners[i] == 0x804bfb0
+
+
 @kern32_test([
     (695, 32, 0x75),
     (695, 64, 0x75),
@@ -282,6 +352,69 @@ def test_xrefs(kernel32_idb, version, bitness, expected):
     assert lpluck('dst', idb.analysis.get_drefs_from(kernel32_idb, security_cookie)) == []
 
 
+@kern32_test()
+def test_all_xrefs(kernel32_idb, version, bitness, expected):
+    xrefs = idb.analysis.get_all_xrefs(kernel32_idb)
+    assert (0x6890169E, 0x68906156) in [(xref.src, xref.dst) for xref in xrefs.code]
+    assert 0x689DB370 in xrefs.data.dsts
+
+    # .text:689016C0 218 A1 70 B3 9D 68                          mov     eax, ___security_cookie
+    xrefs = idb.analysis.get_all_xrefs(kernel32_idb, start=0x689016C0, end=0x689016C5)
+    assert len(xrefs.code) == 0
+    assert list(xrefs.data) == list(idb.analysis.get_drefs_from(kernel32_idb, 0x689016C0))
+
+
+def test_all_xrefs2(elf_idb):
+    xrefs = idb.analysis.get_all_xrefs(elf_idb)
+
+    crefs = []
+    for src in sorted(set(xrefs.code.srcs)):
+        crefs.extend(idb.analysis.get_crefs_from(elf_idb, src))
+    assert list(xrefs.code) == crefs
+
+    drefs = []
+    for src in sorted(set(xrefs.data.srcs)):
+        drefs.extend(idb.analysis.get_drefs_from(elf_idb, src))
+    assert list(xrefs.data) == drefs
+
+
+def test_range_crefs(elf_idb):
+    # a range that includes the function at 0x804bfb0.
+    start, end = 0x804bfb0, 0x804c030
+    crefs = idb.analysis.get_range_crefs(elf_idb, start, end)
+
+    assert list(crefs.outgoing) == list(idb.analysis.get_all_xrefs(elf_idb, start, end).code)
+
+    incoming = []
+    for ea in range(start, end):
+        incoming.extend(idb.analysis.get_crefs_to(elf_idb, ea))
+    assert list(crefs.incoming) == incoming
+    assert (0x805b5d4, 0x804bfb0, 0x11) in incoming
+
+
+def test_xref_index(elf_idb):
+    xrefs = idb.analysis.get_all_xrefs(elf_idb)
+    eas = sorted(set(xrefs.code.srcs) | set(xrefs.code.dsts) |
+                 set(xrefs.data.srcs) | set(xrefs.data.dsts))
+    # and some addresses without references.
+    eas.extend([0x0, 0x1])
+
+    queries = [idb.analysis.get_crefs_to, idb.analysis.get_crefs_from,
+               idb.analysis.get_drefs_to, idb.analysis.get_drefs_from]
+
+    def get_refs():
+        return [[list(query(elf_idb, ea)) for query in queries] for ea in eas]
+
+    expected = get_refs()
+    index = idb.analysis.enable_xref_index(elf_idb)
+    try:
+        assert len(index.code_from) == len(index.code_to) == len(xrefs.code)
+        assert get_refs() == expected
+    finally:
+        # don't change how other tests query the shared fixture.
+        del elf_idb.caches['xref index']
+
+
 @kern32_test([
     (695, 32, None),
     (695, 64, None),
@@ -299,6 +432,33 @@ def test_fixups(kernel32_idb, version, bitness, expected):
     assert fixups[0x68901023 + 2].get_fixup_length() == 0x4
 
 
+@kern32_test()
+def test_fixup_index(kernel32_idb, version, bitness, expected):
+    fixups = idb.analysis.FixupIndex(kernel32_idb)
+
+    # .text:68901023 024 8B 3D 98 B1 9D 68                       mov     edi, dword_689DB198
+    assert 0x68901025 in fixups
+    assert 0x68901024 not in fixups
+    assert fixups.get_length(0x68901025) == 0x4
+    assert fixups.get_next(0x68901023) == 0x68901025
+    assert fixups.get_prev(0x68901034) == 0x68901025
+    assert fixups.get_range(0x6890101E, 0x68901035) == [0x68901025, 0x68901034]
+    assert fixups.contains(0x68901023, 6) is True
+    assert fixups.contains(0x68901026, 0xE) is False
+
+
+def test_fixup_index2(elf_idb):
+    fixups = idb.analysis.FixupIndex(elf_idb)
+    assert len(fixups) == 113
+    assert fixups.get_next(0x0) == 0x8067ffc
+
+    # these fixup types are not yet supported, so their lengths are unknown.
+    assert fixups.get_length(0x8067ffc) == 0
+
+    with pytest.raises(KeyError):
+        fixups.get_prev(0x8067ffc)
+
+
 @kern32_test()
 def test_segments(kernel32_idb, version, bitness, expected):
     segs = idb.analysis.Segments(kernel32_idb).segments
@@ -537,6 +697,23 @@ def test_segments2(elf_idb):
             assert v == getattr(seg, k)
 
 
+def test_segment_table(elf_idb):
+    segs = idb.analysis.Segments(elf_idb).segments
+    table = idb.analysis.SegmentTable(elf_idb)
+
+    assert len(table) == len(segs)
+    assert list(table.starts) == sorted(segs.keys())
+    assert table.ends[table.index(0x80496ac)] == segs[0x80496ac].endEA
+    assert set(table.bitness) == {1}
+
+    for start, seg in segs.items():
+        assert table.find(start) == table.index(start)
+        assert table.get_segment(seg.endEA - 1).startEA == start
+
+    with pytest.raises(KeyError):
+        table.find(0x0)
+
+
 @kern32_test()
 def test_imports(kernel32_idb, version, bitness, expected):
     imports = list(idb.analysis.enumerate_imports(kernel32_idb))
@@ -0,0 +1,72 @@
+import os
+import time
+import signal
+import threading
+
+import idb
+import idb.batch
+
+from fixtures import *
+
+
+def slow_task(db, path):
+    time.sleep(5)
+
+
+def unserializable_task(db, path):
+    return object()
+
+
+def test_batch_run():
+    elfpath = os.path.join(CD, 'data', 'elf', 'ls.idb')
+    binpath = os.path.join(CD, 'data', 'small', 'small.bin')
+    paths = [elfpath, binpath, os.path.join(CD, 'data', 'doesnt-exist.idb')]
+
+    for workers in (1, 2):
+        results = {r['path']: r for r in idb.batch.run(paths, 'md5', workers=workers)}
+        assert len(results) == 3
+        assert results[elfpath]['result'] == '49a4046a610b22753442dc753c04fa8c'
+        # failures are isolated to their own results.
+        assert 'error' in results[binpath]
+        assert 'error' in results[paths[2]]
+
+    results = list(idb.batch.run([elfpath], 'segments', workers=1))
+    assert results[0]['result'][0] == [0x80496ac, 0x80496cf, '.init']
+
+    results = list(idb.batch.run([elfpath], 'idb.batch:get_functions', workers=1))
+    assert len(results[0]['result']) == 322
+
+    results = list(idb.batch.run([elfpath], slow_task, workers=1, timeout=0.5))
+    assert results[0]['error'].startswith('timeout')
+
+    # a result that can't be written out is a failure of its own database.
+    results = list(idb.batch.run([elfpath], unserializable_task, workers=1))
+    assert results[0]['error'].startswith('TypeError')
+    idb.batch.dump_result(results[0])
+
+    with pytest.raises(ValueError):
+        list(idb.batch.run([elfpath], 'doesnt-exist'))
+
+
+@pytest.mark.skipif(not hasattr(signal, 'setitimer'), reason='requires SIGALRM')
+def test_process_file_timeout():
+    elfpath = os.path.join(CD, 'data', 'elf', 'ls.idb')
+
+    def handler(signum, frame):
+        pass
+
+    old = signal.signal(signal.SIGALRM, handler)
+    try:
+        result = idb.batch.process_file(elfpath, 'md5', timeout=60)
+        assert result['result'] == '49a4046a610b22753442dc753c04fa8c'
+        # the caller's handler is restored.
+        assert signal.getsignal(signal.SIGALRM) is handler
+    finally:
+        signal.signal(signal.SIGALRM, old)
+
+    # off the main thread, the failure to set the alarm is captured in the result.
+    results = []
+    t = threading.Thread(target=lambda: results.append(idb.batch.process_file(elfpath, 'md5', timeout=60)))
+    t.start()
+    t.join()
+    assert 'error' in results[0]
@@ -0,0 +1,91 @@
+import os
+
+import idb
+import idb.cfg
+
+from fixtures import *
+
+
+def get_graph(fc):
+    blocks = set([(bb.startEA, bb.endEA) for bb in fc])
+    edges = set([(bb.startEA, succ.startEA) for bb in fc for succ in bb.succs()])
+    return blocks, edges
+
+
+def test_cfg_cache(elf_idb, tmpdir):
+    api = idb.IDAPython(elf_idb)
+    expected = {}
+    for fva in list(api.idautils.Functions())[0x80:0xA0]:
+        try:
+            expected[fva] = get_graph(api.idaapi.FlowChart(api.ida_funcs.get_func(fva)))
+        except KeyError:
+            # some functions flow into addresses outside the loaded segments.
+            continue
+    fvas = sorted(expected.keys())
+    assert len(fvas) > 0
+
+    cache = idb.cfg.enable_cfg_cache(elf_idb)
+    assert len(cache) == 0
+    for fva in fvas:
+        assert get_graph(api.idaapi.FlowChart(api.ida_funcs.get_func(fva))) == expected[fva]
+    assert len(cache) == len(fvas)
+
+    # now served from the cache.
+    for fva in fvas:
+        assert fva in cache
+        assert get_graph(api.idaapi.FlowChart(api.ida_funcs.get_func(fva))) == expected[fva]
+
+    cfg = idb.cfg.get_cfg(elf_idb, fvas[0])
+    assert set(cfg.get_blocks()) == expected[fvas[0]][0]
+    assert set(cfg.get_edges()) == expected[fvas[0]][1]
+
+    path = str(tmpdir.join('ls.idb.cfg.json'))
+    cache.save(path)
+    assert os.path.exists(path)
+
+    cache2 = idb.cfg.CFGCache(elf_idb)
+    assert cache2.load(path) is True
+    assert len(cache2) == len(fvas)
+    for fva in fvas:
+        cfg = cache2.get(fva)
+        assert (set(cfg.get_blocks()), set(cfg.get_edges())) == expected[fva]
+
+    # sidecars for other databases are ignored.
+    cache2.identity = '0' * 32
+    cache2.clear()
+    assert cache2.load(path) is False
+    assert len(cache2) == 0
+
+
+def test_get_cfg(elf_idb):
+    api = idb.IDAPython(elf_idb)
+    fva = 0x804bfb0
+    fc = api.idaapi.FlowChart(api.ida_funcs.get_func(fva))
+
+    cfg = idb.cfg.get_cfg(elf_idb, fva)
+    assert set(cfg.get_blocks()) == set((bb.startEA, bb.endEA) for bb in fc)
+
+    # fetching a graph doesn't turn on caching, nor hash the database.
+    assert 'cfg cache' not in elf_idb.caches
+    assert 'database identity' not in elf_idb.caches
+
+    cache = idb.cfg.enable_cfg_cache(elf_idb)
+    assert 'database identity' not in elf_idb.caches
+    assert idb.cfg.get_cfg(elf_idb, fva) is cache.get(fva)
+
+
+def test_build_all_flowcharts(elf_idb):
+    api = idb.IDAPython(elf_idb)
+    cfgs = idb.cfg.build_all_flowcharts(elf_idb, workers=2)
+    assert len(cfgs) == 175
+
+    for fva in list(cfgs.keys())[:0x10]:
+        fc = api.idaapi.FlowChart(api.ida_funcs.get_func(fva))
+        blocks, edges = get_graph(fc)
+        assert set(cfgs[fva].get_blocks()) == blocks
+        assert set(cfgs[fva].get_edges()) == edges
+
+    # graphs recovered in this process match those from the workers.
+    for fva, cfg in idb.cfg.build_all_flowcharts(elf_idb, workers=1).items():
+        assert cfg.get_blocks() == cfgs[fva].get_blocks()
+        assert cfg.get_edges() == cfgs[fva].get_edges()
@@ -0,0 +1,67 @@
+import idb
+import idb.export
+import idb.analysis
+
+from fixtures import *
+
+
+def test_get_tables(elf_idb):
+    api = idb.IDAPython(elf_idb)
+    tables = idb.export.get_tables(elf_idb)
+
+    functions = tables['functions'].columns
+    assert list(functions['start']) == list(idb.analysis.FunctionTable(elf_idb).starts)
+    assert functions['name'][0] == '.init_proc'
+    assert sum(1 for name in functions['name'] if name is not None) == 322
+    # function tails are not named.
+    assert all(name is None for name, flags in zip(functions['name'], functions['flags']) if flags & 0x8000)
+
+    segments = tables['segments'].columns
+    assert list(zip(segments['start'], segments['name']))[0] == (0x80496ac, '.init')
+    # u4 columns are four bytes per row, even where a C long is eight.
+    assert segments['perm'].itemsize == 4
+
+    names = tables['names'].columns
+    assert set(elf_idb.nam.names()) <= set(names['address'])
+    assert list(zip(names['address'], names['name']))[1] == (0x80496e0, '.__ctype_toupper_loc')
+
+    comments = tables['comments'].columns
+    for ea, repeatable, comment in list(zip(comments['address'], comments['repeatable'], comments['comment']))[:0x40]:
+        assert api.ida_bytes.get_cmt(ea, repeatable) == comment
+
+    xrefs = tables['xrefs']
+    code = [(src, dst) for src, dst, kind in zip(xrefs.columns['src'], xrefs.columns['dst'], xrefs.columns['kind'])
+            if kind == 'code']
+    assert code == [(xref.src, xref.dst) for xref in idb.analysis.get_all_xrefs(elf_idb).code]
+
+    assert len(tables['imports']) == 116
+    assert len(tables['entrypoints']) == 17
+
+
+def test_write_npz(elf_idb, tmpdir):
+    numpy = pytest.importorskip('numpy')
+
+    path = str(tmpdir.join('ls.npz'))
+    tables = idb.export.get_tables(elf_idb)
+    idb.export.write_npz(tables, path)
+
+    arrays = numpy.load(path)
+    assert arrays['functions.start'].dtype == numpy.uint32
+    assert list(arrays['functions.start']) == list(tables['functions'].columns['start'])
+    assert arrays['functions.name'][0] == '.init_proc'
+    # missing values are replaced.
+    assert arrays['entrypoints.ordinal'][0] == -1
+
+
+def test_write_parquet(elf_idb, tmpdir):
+    parquet = pytest.importorskip('pyarrow.parquet')
+
+    path = str(tmpdir.join('ls'))
+    tables = idb.export.get_tables(elf_idb)
+    idb.export.write_parquet(tables, path)
+
+    t = parquet.read_table(os.path.join(path, 'xrefs.parquet'))
+    assert t.num_rows == len(tables['xrefs'])
+    assert t.column('src').to_pylist() == list(tables['xrefs'].columns['src'])
+    t = parquet.read_table(os.path.join(path, 'entrypoints.parquet'))
+    assert t.column('ordinal').to_pylist()[0] is None
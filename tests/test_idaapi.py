@@ -331,8 +331,6 @@ def test_func_t(kernel32_idb, version, bitness, expected):
         flags, api.ida_funcs.FUNC_PURGED_OK) is True
     assert idb.idapython.is_flag_set(flags, api.ida_funcs.FUNC_TAIL) is False
     # also demonstrate finding the func from an address it may contain.
-    # note: this can be a pretty slow search, since we do everything on demand
-    # with no caching.
     assert api.ida_funcs.get_func(0x68901695 + 1).startEA == 0x68901695
 
     # this is the function chunk for DllEntryPoint, but gets resolved to the
@@ -340,6 +338,18 @@ def test_func_t(kernel32_idb, version, bitness, expected):
     assert api.ida_funcs.get_func(0x68906156).startEA == 0x68901695
     assert api.ida_funcs.get_func(0x68906156 + 1).startEA == 0x68901695
 
+    with pytest.raises(KeyError):
+        api.ida_funcs.get_func(0x0)
+
+
+def test_func_t_tail(elf_idb):
+    api = idb.IDAPython(elf_idb)
+
+    # this function tail precedes the function that owns it.
+    assert api.ida_funcs.get_func(0x804bf50).startEA == 0x804bfb0
+    assert api.ida_funcs.get_func(0x804bf50 + 1).startEA == 0x804bfb0
+    assert api.ida_funcs.get_func(0x804bfb0 + 1).startEA == 0x804bfb0
+
 
 @kern32_test()
 def test_find_bb_end(kernel32_idb, version, bitness, expected):
@@ -440,6 +450,30 @@ def test_flow_chart(kernel32_idb, version, bitness, expected):
             assert lpluck('startEA', bb.preds()) == [0x68901695]
 
 
+def test_sweep_blocks(elf_idb):
+    api = idb.IDAPython(elf_idb)
+
+    for fva in list(api.idautils.Functions())[:0x20]:
+        sweep = api.idaapi._sweep_blocks(api.ida_funcs.get_func(fva))
+        assert sweep.ends_by_start
+
+        # the sweep must agree with the instruction-stepping helpers.
+        for start, end in sweep.ends_by_start.items():
+            assert api.idaapi._find_bb_end(start) == end
+        for end, start in sweep.starts_by_end.items():
+            assert api.idaapi._find_bb_start(end) == start
+
+        flow_types = [api.idaapi.fl_JN, api.idaapi.fl_JF, api.idaapi.fl_F]
+        for ea in sweep.flags.keys():
+            assert sweep.crefs_to.get(ea, []) == list(idb.analysis.get_crefs_to(elf_idb, ea, types=flow_types))
+
+    # the sweeps are shared by flowcharts that reach into a neighboring function.
+    sweep = api.idaapi._get_block_sweep(0x804bfb5)
+    assert 0x804bfb5 in sweep.flags
+    assert api.idaapi._get_block_sweep(0x804bfb5) is sweep
+    assert api.idaapi._get_block_sweep(0x0) is None
+
+
 @kern32_test()
 def test_fixups(kernel32_idb, version, bitness, expected):
     api = idb.IDAPython(kernel32_idb)
@@ -462,6 +496,7 @@ def test_fixups(kernel32_idb, version, bitness, expected):
     assert api.idaapi.get_next_fixup_ea(0x68901023) == 0x68901025
     assert api.idaapi.get_next_fixup_ea(0x68901025) == 0x68901025
     assert api.idaapi.get_next_fixup_ea(0x68901025 + 1) == 0x68901034
+    assert api.idaapi.get_prev_fixup_ea(0x68901034) == 0x68901025
 
 
 @kern32_test()
@@ -697,3 +732,136 @@ def test_multi_bitness():
         api = idb.IDAPython(db)
         assert api.idc.GetDisasm(0x0)    == 'xor\tdx, dx'    # 16-bit
         assert api.idc.GetDisasm(0x1000) == 'xor\tedx, edx'  # 32-bit
+
+
+@requires_capstone
+def test_disassemble_range(elf_idb):
+    api = idb.IDAPython(elf_idb)
+
+    # .text:0804BFB0 B8 08 7F 06 08    mov     eax, offset unk_8067F08
+    # .text:0804BFB5 8B 10             mov     edx, [eax]
+    # .text:0804BFB7 85 D2             test    edx, edx
+    assert api.idc.GetMnem(0x804bfb0) == 'mov'
+    assert api.idc.GetDisasm(0x804bfb5) == 'mov\tedx, dword ptr [eax]'
+    assert api.idc.GetOpnd(0x804bfb5, 0) == 'edx'
+    assert api.idc.GetOpnd(0x804bfb5, 1) == 'dword ptr [eax]'
+    assert api.idc.GetOpnd(0x804bfb5, 2) == ''
+
+    # the whole function was decoded on the first query.
+    assert 0x804bfb7 in api.idc.lite_cache
+
+    # the linear sweep agrees with decoding one instruction at a time.
+    func = api.ida_funcs.get_func(0x804bfb0)
+    insns = api.idc._disassemble_range(func.startEA, func.endEA)
+    assert len(insns) > 0
+    for insn in insns:
+        size = api.idc.ItemSize(insn.address)
+        buf = api.idc.GetManyBytes(insn.address, size)
+        op = next(api.idc._get_dis(insn.address).disasm(buf, insn.address))
+        assert (insn.size, insn.mnemonic, insn.op_str) == (op.size, op.mnemonic, op.op_str)
+
+    # the sweep restarts at the next head when it exhausts its window.
+    api.idc.SWEEP_WINDOW_SIZE = 0x10
+    assert api.idc._disassemble_range(func.startEA, func.endEA, lite=True) == \
+        [(op.address, op.size, op.mnemonic, op.op_str) for op in insns]
+
+
+@requires_capstone
+def test_disassemble_once(elf_idb):
+    api = idb.IDAPython(elf_idb)
+    assert api.idc.GetDisasm(0x804bfb5) == 'mov\tedx, dword ptr [eax]'
+
+    calls = []
+    disassemble_range = api.idc._disassemble_range
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return disassemble_range(*args, **kwargs)
+    api.idc._disassemble_range = counted
+
+    # like an instruction evicted from the cache.
+    api.idc.lite_cache.clear()
+    assert api.idc.GetDisasm(0x804bfb5) == 'mov\tedx, dword ptr [eax]'
+    assert api.idc.GetDisasm(0x804bfb7) == 'test\tedx, edx'
+    # the function is decoded once, and then an instruction at a time.
+    assert calls == []
+
+    # but the full instructions are decoded separately.
+    api.idc._disassemble(0x804bfb5)
+    assert len(calls) == 1
+
+
+@requires_capstone
+def test_disassemble_lite(elf_idb):
+    api = idb.IDAPython(elf_idb)
+
+    # text queries don't need instruction details.
+    assert api.idc.GetDisasm(0x804bfb5) == 'mov\tedx, dword ptr [eax]'
+    assert isinstance(api.idc.lite_cache.get(0x804bfb5), idb.idapython.LiteInsn)
+    assert 0x804bfb5 not in api.idc.insn_cache
+
+    op = api.idc._disassemble(0x804bfb5)
+    assert op.mnemonic == 'mov'
+    assert len(op.operands) == 2
+    assert 0x804bfb5 in api.idc.insn_cache
+
+    func = api.ida_funcs.get_func(0x804bfb0)
+    full = api.idc._disassemble_range(func.startEA, func.endEA)
+    lite = api.idc._disassemble_range(func.startEA, func.endEA, lite=True)
+    assert [(op.address, op.size, op.mnemonic, op.op_str) for op in full] == lite
+
+
+@requires_capstone
+def test_iter_function_instructions(elf_idb):
+    api = idb.IDAPython(elf_idb)
+    insns = list(api.idc.iter_function_instructions(0x804bfb0))
+    assert len(insns) == 36
+
+    # .text:0804BFB0 B8 08 7F 06 08    mov     eax, offset unk_8067F08
+    assert insns[0] == (0x804bfb0, 5, b'\xb8\x08\x7f\x06\x08', 'mov')
+    assert insns[1] == (0x804bfb5, 2, b'\x8b\x10', 'mov')
+
+    # followed by the tail at 0x804bf50.
+    eas = [insn.ea for insn in insns]
+    assert 0x804bf50 in eas
+    assert eas.index(0x804bf50) > eas.index(0x804bfb0)
+    assert insns[-1].mnemonic == 'repz ret'
+
+    # nothing is cached.
+    assert 0x804bfb0 not in api.idc.lite_cache
+
+    for insn in insns:
+        assert insn.size == api.idc.ItemSize(insn.ea)
+        assert insn.bytes == api.idc.GetManyBytes(insn.ea, insn.size)
+        assert insn.mnemonic == api.idc.GetMnem(insn.ea)
+
+    with pytest.raises(KeyError):
+        # this is a tail, not a function.
+        list(api.idc.iter_function_instructions(0x804bf50))
+
+
+@requires_capstone
+def test_threadsafe(elf_idb):
+    import multiprocessing.pool
+
+    api = idb.IDAPython(elf_idb)
+    fvas = list(api.idautils.Functions())[:0x40]
+    expected = [(api.idc.GetFunctionName(fva), api.idc.GetDisasm(fva)) for fva in fvas]
+
+    path = os.path.join(CD, 'data', 'elf', 'ls.idb')
+    with idb.from_file(path, threadsafe=True) as db:
+        api = idb.IDAPython(db)
+
+        def query(fva):
+            return api.idc.GetFunctionName(fva), api.idc.GetDisasm(fva)
+
+        pool = multiprocessing.pool.ThreadPool(8)
+        try:
+            assert pool.map(query, fvas) == expected
+        finally:
+            pool.close()
+            pool.join()
+
+        # cached pages are fully decoded before they're shared.
+        for page in db.id0._page_cache.values():
+            assert len(page._entries) == page.entry_count
@@ -1,10 +1,13 @@
 import pytest
+import struct
 import binascii
 
 from fixtures import *
 
 import idb.netnode
+import idb.analysis
 import idb.fileformat
+import idb.stats
 
 
 slow = pytest.mark.skipif(
@@ -455,6 +458,91 @@ def test_cursor_enum_all_desc(kernel32_idb, version, bitness, expected):
     assert kernel32_idb.id0.record_count == count
 
 
+def test_id0_iterate(elf_idb):
+    keys = [bytes(entry.key) for entry in elf_idb.id0.iterate()]
+    assert len(keys) == elf_idb.id0.record_count
+    assert keys == sorted(keys)
+
+    # range bounds that do and don't exist in the index.
+    for start, end in ((keys[100], keys[200]),
+                       (keys[100] + b'\x00', keys[200] + b'\x00')):
+        expected = [key for key in keys if start <= key < end]
+        assert [bytes(entry.key) for entry in elf_idb.id0.iterate(start, end)] == expected
+
+    assert list(elf_idb.id0.iterate(keys[-1] + b'\x00')) == []
+
+
+def test_find_round_down(elf_idb):
+    keys = [bytes(entry.key) for entry in elf_idb.id0.iterate()]
+
+    cursor = elf_idb.id0.find(keys[100] + b'\x00', strategy=idb.fileformat.ROUND_DOWN_MATCH)
+    assert bytes(cursor.key) == keys[100]
+    cursor.next()
+    assert bytes(cursor.key) == keys[101]
+
+    with pytest.raises(KeyError):
+        elf_idb.id0.find(b'', strategy=idb.fileformat.ROUND_DOWN_MATCH)
+
+
+def test_header_formats():
+    # the writers, like `idb.synth` and `idb.shared`, use these to emit what the parser reads.
+    assert struct.calcsize(idb.fileformat.FILE_HEADER_FORMAT) == len(idb.fileformat.FileHeader())
+    assert struct.calcsize(idb.fileformat.SECTION_HEADER_FORMAT) == len(idb.fileformat.SectionHeader())
+
+
+def test_stats(elf_idb):
+    # disabled by default.
+    assert elf_idb.stats() is None
+
+    path = os.path.join(CD, 'data', 'elf', 'ls.idb')
+    with idb.from_file(path, stats=True) as db:
+        assert db.stats() == {'counters': {}, 'timings': {}}
+
+        assert idb.analysis.Root(db).md5 == '49a4046a610b22753442dc753c04fa8c'
+        stats = db.stats()
+        # the root node, resolved once for the version and once for the md5.
+        assert stats['counters']['netnode.resolves'] == 2
+        assert stats['counters']['netnode.values'] == 2
+        assert stats['counters']['id0.find.ExactMatchStrategy'] == 4
+        assert stats['counters']['id0.page loads'] > 0
+        assert 'analysis.Root Node.md5' in stats['timings']
+
+        db.reset_stats()
+        n = len(list(db.id0.iterate()))
+        stats = db.stats()
+        assert stats['counters']['id0.find.MinKeyStrategy'] == 1
+        assert stats['counters']['id0.cursor steps'] == n
+        assert stats['counters']['id0.page loads'] > 0
+
+        # the second scan is served from the page cache.
+        db.reset_stats()
+        assert len(list(db.id0.iterate())) == n
+        stats = db.stats()
+        assert 'id0.page loads' not in stats['counters']
+        assert stats['counters']['id0.page cache hits'] > 0
+
+
+def test_stats_threads():
+    import multiprocessing.pool
+
+    stats = idb.stats.Stats()
+
+    def count(_):
+        for _ in range(0x1000):
+            stats.incr('n')
+            stats.add_time('t', 1)
+
+    pool = multiprocessing.pool.ThreadPool(8)
+    try:
+        pool.map(count, range(8))
+    finally:
+        pool.close()
+        pool.join()
+
+    # no updates are lost.
+    assert stats.as_dict() == {'counters': {'n': 0x8000}, 'timings': {'t': 0x8000}}
+
+
 @kern32_test([
     (695, 32, None),
     (695, 64, None),
@@ -491,6 +579,28 @@ def test_id1_2(elf_idb):
     ]
 
 
+def test_id1_segment_lookup(elf_idb):
+    id1 = elf_idb.id1
+
+    # the gap between the first two segments is not mapped.
+    assert id1.contains_address(0x80496ac)
+    assert id1.contains_address(0x80496cf - 1)
+    assert not id1.contains_address(0x80496cf)
+    assert not id1.contains_address(0x0)
+    assert not id1.contains_address(0x8068344)
+
+    with pytest.raises(KeyError):
+        id1.get_segment(0x80496cf)
+
+    assert id1.get_next_segment(0x80496ac).bounds.start == 0x80496d0
+    with pytest.raises(IndexError):
+        id1.get_next_segment(0x80681e0)
+
+    eas = [0x0, 0x80496ac, 0x80496cf, 0x80496d0, 0x8049de8, 0x8068344 - 1, 0x8068344]
+    assert id1.classify_addresses(eas) == [False, True, False, True, False, True, False]
+    assert id1.classify_addresses(eas) == list(map(id1.contains_address, eas))
+
+
 @kern32_test([
     # collected empirically
     (695, 32, 14252),
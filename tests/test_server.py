@@ -0,0 +1,88 @@
+import json
+import threading
+
+import pytest
+
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.request import urlopen
+
+import idb
+import idb.server
+
+from fixtures import *
+
+
+def query(port, q):
+    '''
+    Returns:
+      Tuple[int, Dict[str, Any]]: the HTTP status and response document.
+    '''
+    try:
+        r = urlopen('http://127.0.0.1:%d/%s' % (port, q))
+    except HTTPError as e:
+        return e.code, json.loads(e.read().decode('utf-8'))
+
+    try:
+        return r.getcode(), json.loads(r.read().decode('utf-8'))
+    finally:
+        r.close()
+
+
+def test_server():
+    pool = idb.server.DatabasePool(capacity=1, root=os.path.join(CD, 'data'))
+    server = idb.server.Server(pool, workers=2)
+
+    srv = server.start(port=0)
+    port = srv.server_address[1]
+    t = threading.Thread(target=srv.serve_forever)
+    t.start()
+
+    try:
+        status, doc = query(port, 'functions?path=elf/ls.idb')
+        assert status == 200
+        assert len(doc['result']) == 322
+        assert doc['result'][0] == [0x80496ac, '.init_proc']
+
+        status, doc = query(port, 'netnode?path=elf/ls.idb&nodeid=Root+Node&index=1302')
+        assert doc['result'] == '49a4046a610b22753442dc753c04fa8c'
+
+        status, doc = query(port, 'bytes?path=elf/ls.idb&ea=0x804bfb0&size=5')
+        assert doc['result'] == 'b8087f0608'
+
+        status, doc = query(port, 'xrefs?path=elf/ls.idb&ea=0x804bfb0&direction=to&kind=code')
+        assert doc['result'] == [[0x805b5d4, 0x804bfb0, 0x11]]
+
+        assert query(port, '')[1]['result']['databases'] == [os.path.join(pool.root, 'elf', 'ls.idb')]
+
+        # the least recently used database is evicted.
+        status, doc = query(port, 'segments?path=elf/ls.i64')
+        assert status == 200
+        assert query(port, '')[1]['result']['databases'] == [os.path.join(pool.root, 'elf', 'ls.i64')]
+
+        assert query(port, 'bytes?path=elf/ls.idb&ea=0x0&size=5')[0] == 404
+        assert query(port, 'bytes?path=elf/ls.idb&ea=zz&size=5')[0] == 400
+        assert query(port, 'nope?path=elf/ls.idb')[0] == 404
+        assert query(port, 'functions?path=elf/doesnt-exist.idb')[0] == 404
+        # a failure to open is not remembered.
+        assert pool.opening == {}
+        assert query(port, 'functions?path=../../setup.py')[0] == 400
+
+        # requests are handled by the fixed pool of workers.
+        assert len(srv.workers) == 2
+    finally:
+        srv.shutdown()
+        t.join()
+        srv.server_close()
+
+
+def test_resolve():
+    pool = idb.server.DatabasePool(root=os.path.join(CD, 'data'))
+    assert pool.resolve('elf/ls.idb') == os.path.join(pool.root, 'elf', 'ls.idb')
+    with pytest.raises(ValueError):
+        pool.resolve('../setup.py')
+    with pytest.raises(ValueError):
+        # a sibling that shares the root as a prefix.
+        pool.resolve('../data2/ls.idb')
+
+    pool = idb.server.DatabasePool(root='/')
+    assert pool.resolve('/tmp/ls.idb') == os.path.realpath('/tmp/ls.idb')
@@ -0,0 +1,44 @@
+import os
+import multiprocessing
+
+import idb
+import idb.shared
+import idb.analysis
+
+from fixtures import *
+
+
+def get_names(args):
+    handle, fvas = args
+    api = idb.IDAPython(idb.shared.attach(handle))
+    return [api.idc.GetFunctionName(fva) for fva in fvas]
+
+
+def test_shared(elf_idb, tmpdir):
+    api = idb.IDAPython(elf_idb)
+    fvas = list(api.idautils.Functions())
+    names = [api.idc.GetFunctionName(fva) for fva in fvas]
+
+    for path in (None, str(tmpdir.join('ls.idb'))):
+        with idb.shared.share(elf_idb, path=path) as handle:
+            assert handle.path == elf_idb.path
+
+            pool = multiprocessing.Pool(processes=2)
+            try:
+                chunks = pool.map(get_names, [(handle, fvas[i::4]) for i in range(4)])
+            finally:
+                pool.close()
+                pool.join()
+            assert sorted(sum(chunks, [])) == sorted(names)
+
+            db = idb.shared.attach(handle)
+            # attached databases are cached by each process.
+            assert idb.shared.attach(handle) is db
+            assert idb.analysis.Root(db).md5 == '49a4046a610b22753442dc753c04fa8c'
+            # the image is uncompressed, so its sections are views of the shared buffer.
+            assert not any(section.header.is_compressed for section in db.sections if section is not None)
+            idb.shared.detach(handle)
+
+        if path is not None:
+            # the image is left in place, when a path is given.
+            assert os.path.getsize(path) == handle.size
@@ -0,0 +1,41 @@
+import sqlite3
+import binascii
+
+import idb
+import idb.netnode
+import idb.analysis
+import idb.sqlindex
+
+from fixtures import *
+
+
+def test_build_index(elf_idb, tmpdir):
+    path = str(tmpdir.join('ls.sqlite'))
+    idb.sqlindex.build_index(elf_idb, path)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT value FROM info WHERE key = 'md5'").fetchone()[0] == '49a4046a610b22753442dc753c04fa8c'
+
+    # the raw netnode records.
+    root = idb.netnode.Netnode(elf_idb, 'Root Node').nodeid
+    value = conn.execute("SELECT value FROM netnodes WHERE nodeid = ? AND tag = 'S' AND idx = 1302", (root, )).fetchone()[0]
+    assert binascii.hexlify(bytes(value)).decode('ascii') == '49a4046a610b22753442dc753c04fa8c'
+
+    assert conn.execute("SELECT address FROM names WHERE name = '.init_proc'").fetchone()[0] == 0x80496ac
+    assert conn.execute('SELECT COUNT(*) FROM functions WHERE name IS NOT NULL').fetchone()[0] == 322
+    assert conn.execute("SELECT src, type FROM xrefs WHERE dst = ? AND kind = 'code'", (0x804bfb0, )).fetchall() == [(0x805b5d4, 0x11)]
+    assert conn.execute('SELECT COUNT(*) FROM fixups').fetchone()[0] == len(idb.analysis.FixupIndex(elf_idb))
+
+    # the thunk that calls the import.
+    assert conn.execute('''
+        SELECT DISTINCT owner.name
+          FROM imports i
+          JOIN xrefs x ON x.dst = i.address
+          JOIN functions f ON f.start <= x.src AND x.src < f.end
+          JOIN functions owner ON owner.start = f.owner
+         WHERE i.name = 'malloc'
+    ''').fetchall() == [('.malloc', )]
+    conn.close()
+
+    with pytest.raises(ValueError):
+        idb.sqlindex.build_index(elf_idb, path)
@@ -0,0 +1,68 @@
+import io
+
+import pytest
+
+import idb
+import idb.netnode
+import idb.synth
+
+from fixtures import *
+
+
+def get_depth(id0):
+    depth = 1
+    page = id0.get_page(id0.root_page)
+    while not page.is_leaf():
+        page = id0.get_page(page.ppointer)
+        depth += 1
+    return depth
+
+
+@pytest.mark.parametrize('wordsize', [4, 8])
+def test_synth_idb(wordsize):
+    records = list(idb.synth.generate_records(0x2000, wordsize=wordsize, base=0x400000))
+    segments = [(0x400000, 0x401000), (0x500000, 0x500100)]
+    names = [0x400000, 0x400010, 0x500000]
+
+    f = io.BytesIO()
+    # small pages, so that the tree is deep.
+    idb.synth.write_idb(f, iter(records), wordsize=wordsize, page_size=0x100,
+                        segments=segments, names=names)
+    db = idb.from_buffer(f.getvalue())
+    assert db.wordsize == wordsize
+
+    assert db.id0.record_count == len(records)
+    assert get_depth(db.id0) >= 3
+    assert [(bytes(e.key), bytes(e.value)) for e in db.id0.iterate()] == records
+
+    for key, value in records[::0x101]:
+        assert bytes(db.id0.find(key).value) == value
+
+    assert bytes(db.id0.get_min().key) == records[0][0]
+    assert bytes(db.id0.get_max().key) == records[-1][0]
+
+    # walk backwards across the leaves and branches.
+    cursor = db.id0.find(records[0x100][0])
+    for key, _ in reversed(records[:0x100]):
+        cursor.prev()
+        assert bytes(cursor.key) == key
+
+    # records are supvals of netnodes at consecutive addresses.
+    assert idb.netnode.Netnode(db, 0x400001).supval(2) == records[6][1]
+
+    assert [s.bounds.start for s in db.id1.segments] == [0x400000, 0x500000]
+    assert db.id1.get_flags(0x500000) & 0x600 == 0x400
+    assert db.id1.get_flags(0x500001) & 0x600 == 0x200
+    flags = db.id1.get_flags_range(0x400000, 0x401000)
+    assert len(flags) == 0x1000
+    assert list(flags) == list(idb.synth.generate_flags(0x400000, 0x401000))
+
+    assert list(db.nam.names()) == names
+
+
+def test_synth_errors():
+    with pytest.raises(ValueError):
+        idb.synth.write_idb(io.BytesIO(), [(b'b', b''), (b'a', b'')])
+
+    with pytest.raises(ValueError):
+        idb.synth.write_idb(io.BytesIO(), [(b'a', b'\x00' * 0x200)], page_size=0x100)
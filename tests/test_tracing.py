@@ -0,0 +1,58 @@
+import six
+
+import idb
+import idb.tracing
+
+from fixtures import *
+
+
+def test_tracer(elf_idb):
+    api = idb.IDAPython(elf_idb)
+    tracer = idb.tracing.Tracer()
+    tracer.install(api)
+
+    fvas = list(api.idautils.Functions())
+    for fva in fvas[:0x10]:
+        assert api.idc.GetFunctionName(fva) != ''
+    with pytest.raises(KeyError):
+        api.ida_funcs.get_func(0x0)
+
+    report = {row['name']: row for row in tracer.get_report()}
+    assert report['idautils.Functions']['count'] == 1
+    assert report['idc.GetFunctionName']['count'] == 0x10
+    # nested calls, and calls that raise, are recorded too.
+    assert report['ida_funcs.get_func']['count'] == 0x11
+
+    row = report['idc.GetFunctionName']
+    assert row['total'] >= row['self'] >= 0
+    assert row['p50'] <= row['p99'] <= row['max']
+
+    f = six.StringIO()
+    tracer.write_folded(f)
+    stacks = dict(line.rsplit(' ', 1) for line in f.getvalue().splitlines())
+    assert 'idc.GetFunctionName;ida_funcs.get_func' in stacks
+    assert 'ida_funcs.get_func' in stacks
+
+    # calls are no longer recorded.
+    tracer.uninstall()
+    assert not hasattr(api.idc.GetFunctionName, '__wrapped__')
+    api.idc.GetFunctionName(fvas[0])
+    assert tracer.get_report() == list(sorted(report.values(), key=lambda row: row['total'], reverse=True))
+
+
+def test_tracer_generators():
+    ticks = iter(range(0x100))
+    tracer = idb.tracing.Tracer(clock=lambda: next(ticks))
+
+    def gen():
+        for i in range(3):
+            yield i
+
+    traced = tracer.wrap('gen', gen)
+    assert list(traced()) == [0, 1, 2]
+
+    # one call, made of four steps of one tick each.
+    report = tracer.get_report()
+    assert len(report) == 1
+    assert report[0]['count'] == 1
+    assert report[0]['total'] == 4